@@ -0,0 +1,77 @@
+'''
+times per-group factor beta lookups: the factor_betas["ID"].isin mask the
+risk functions used to run for every group against a BetaIndex gather
+
+run from the repository root:
+    python -m benchmarks.beta_lookup_benchmark --positions 2000 20000
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.beta_index import BetaIndex
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def synthetic_betas(n_positions: int, n_factors: int, seed: int = 0) -> pd.DataFrame:
+    '''"ID" + factor columns frame shaped like Factors.FactorBetas output'''
+    rng = np.random.default_rng(seed)
+    factor_betas = pd.DataFrame(
+        rng.normal(1, 0.5, size=(n_positions, n_factors)),
+        columns=[f"FACTOR{ix} Index" for ix in range(n_factors)],
+    )
+    factor_betas.insert(
+        0, "ID", [f"TCK{ix:05d} US Equity" for ix in range(n_positions)])
+
+    return factor_betas
+
+
+def run(positions: List[int], n_factors: int, group_size: int, n_groups: int):
+    rng = np.random.default_rng(1)
+    for n_positions in positions:
+        factor_betas = synthetic_betas(n_positions, n_factors)
+        groups = [
+            factor_betas["ID"].values[
+                rng.choice(n_positions, size=min(group_size, n_positions), replace=False)
+            ]
+            for _ in range(n_groups)
+        ]
+
+        start = time.perf_counter()
+        for tickers in groups:
+            factor_betas.loc[factor_betas["ID"].isin(tickers)].values[:, 1:]
+        elapsed_isin = time.perf_counter() - start
+
+        start = time.perf_counter()
+        beta_index = BetaIndex.from_factor_betas(factor_betas)
+        elapsed_build = time.perf_counter() - start
+        start = time.perf_counter()
+        for tickers in groups:
+            beta_index.gather(tickers)
+        elapsed_gather = time.perf_counter() - start
+
+        LOGGER.info(
+            f"{n_positions} betas, {n_groups} groups of {group_size}: "
+            f"isin {1e6 * elapsed_isin / n_groups:.1f}us/group, "
+            f"gather {1e6 * elapsed_gather / n_groups:.1f}us/group "
+            f"(index built once in {1e3 * elapsed_build:.1f}ms)"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="factor beta lookup microbenchmark")
+    parser.add_argument(
+        "--positions", type=int, nargs="+", default=[500, 2000, 20000],
+        help="number of rows in the beta table",
+    )
+    parser.add_argument("--factors", type=int, default=40)
+    parser.add_argument("--group_size", type=int, default=25)
+    parser.add_argument("--groups", type=int, default=500)
+    args = parser.parse_args()
+    run(args.positions, args.factors, args.group_size, args.groups)
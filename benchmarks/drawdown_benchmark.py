@@ -0,0 +1,62 @@
+'''
+times current and maximum drawdown of many return series: the per series
+peak loop pnl_stats.DD_Abs / MDD_Abs ran against one drawdown history of the
+whole return matrix (drawdown_engine), and checks they agree
+
+run from the repository root:
+    python -m benchmarks.drawdown_benchmark --days 750 --series 10 100 1000
+'''
+import logging
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+
+from benchmarks.timing import timed
+from legacy.drawdown_engine import DrawdownStats, drawdowns, last_positive
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def loop_drawdowns(returns: np.ndarray):
+    '''per column peak walk, as DD_Abs and MDD_Abs computed them'''
+    current, maximum = [], []
+    for col in range(returns.shape[1]):
+        NAV = np.cumsum(np.insert(returns[:, col], 0, 1))
+        peak, last, value = -99999, np.nan, 0
+        for i in NAV:
+            if i > peak:
+                peak = i
+            DD = peak - i
+            if DD > 0:
+                last = DD
+            if DD > value:
+                value = DD
+        current.append(last)
+        maximum.append(value)
+
+    return np.array(current), np.array(maximum)
+
+
+def run(days: int, series: List[int], seed: int):
+    rng = np.random.default_rng(seed)
+    for n_series in series:
+        returns = rng.normal(2e-4, 1e-2, (days, n_series))
+        (current, maximum), elapsed_loop = timed(loop_drawdowns, returns)
+        stats, elapsed_matrix = timed(DrawdownStats.of, returns)
+        np.testing.assert_allclose(last_positive(drawdowns(returns)), current, rtol=1e-12)
+        np.testing.assert_allclose(stats.maximum, maximum, rtol=1e-12)
+        LOGGER.info(
+            f"drawdowns: {days} days x {n_series} series, peak loop "
+            f"{elapsed_loop:.3f}s, matrix {elapsed_matrix:.4f}s, results match"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="drawdown statistics benchmark")
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--series", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.days, args.series, args.seed)
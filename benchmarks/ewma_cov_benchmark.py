@@ -0,0 +1,61 @@
+'''
+times ewma.EWMACov over several decays against the legacy VaR.decay_cov
+weighting, and the one-day recursive update against a full recompute; checks
+the recursive update against the batch estimate
+
+run from the repository root:
+    python -m benchmarks.ewma_cov_benchmark --days 500 2500 --factors 40
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.ewma import DECAYS, EWMACov
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def run(days: List[int], n_factors: int, decays: List[float]):
+    rng = np.random.default_rng(0)
+    for n_days in days:
+        returns = rng.normal(0, 0.01, size=(n_days + 1, n_factors))
+
+        start = time.perf_counter()
+        for decay in decays:
+            # VaR.decay_cov: weight matrix + DataFrame.cov per decay
+            nn = np.linspace(start=1, stop=n_days, num=n_days)
+            weights = ((1 - decay) * decay ** (nn - 1)) ** (0.5)
+            weights = np.repeat(weights, n_factors).reshape(n_days, n_factors)
+            (pd.DataFrame(returns[:-1]) * weights).cov()
+        elapsed_legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ewma = EWMACov.from_returns(returns[:-1], decays)
+        elapsed_batch = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ewma.update(returns[-1])
+        elapsed_update = time.perf_counter() - start
+        np.testing.assert_allclose(
+            ewma.cov, EWMACov.from_returns(returns, decays).cov, rtol=1e-10
+        )
+        LOGGER.info(
+            f"{n_days} days x {n_factors} factors x {len(decays)} decays: "
+            f"decay_cov loop {1e3 * elapsed_legacy:.1f}ms, "
+            f"batch {1e3 * elapsed_batch:.1f}ms, "
+            f"one day update {1e6 * elapsed_update:.0f}us (matches batch)"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="EWMA covariance benchmark")
+    parser.add_argument("--days", type=int, nargs="+", default=[500, 2500])
+    parser.add_argument("--factors", type=int, default=40)
+    parser.add_argument("--decays", type=float, nargs="+", default=DECAYS)
+    args = parser.parse_args()
+    run(args.days, args.factors, args.decays)
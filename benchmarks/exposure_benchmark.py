@@ -0,0 +1,60 @@
+'''
+times the long / short / gross / net exposure tables: the per group .loc
+mask loop the exposure report used to run against the one pass
+exposure_engine.group_exposures, and checks they agree
+
+run from the repository root:
+    python -m benchmarks.exposure_benchmark --positions 2000 20000 200000
+'''
+import logging
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.stress_grid_benchmark import FILTERS, synthetic_positions
+from benchmarks.timing import timed
+from legacy.exposure_engine import EXPOSURE_COLUMNS, group_exposures
+from legacy.position_book import PositionBook
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def loop_exposures(position: pd.DataFrame, filter_list: List[str]) -> pd.DataFrame:
+    '''per group masks, as Exposures.filter_exposure_calc computed them'''
+    rows = {}
+    for filter_item in filter_list:
+        for name, group in position.groupby(filter_item):
+            long_exposure = group.loc[group["Exposure"] > 0]["Exposure"].sum()
+            short_exposure = group.loc[group["Exposure"] < 0]["Exposure"].sum()
+            rows[(filter_item, name)] = [
+                long_exposure,
+                short_exposure,
+                long_exposure + abs(short_exposure),
+                long_exposure + short_exposure,
+            ]
+
+    return pd.DataFrame.from_dict(rows, orient="index", columns=EXPOSURE_COLUMNS)
+
+
+def run(positions: List[int]):
+    for n_positions in positions:
+        book = PositionBook.from_positions(synthetic_positions(n_positions))
+        expected, elapsed_loop = timed(loop_exposures, book.position, FILTERS)
+        exposures, elapsed_pass = timed(group_exposures, book, FILTERS)
+        np.testing.assert_allclose(exposures.values, expected.values, rtol=1e-10)
+        n_groups = sum(len(book.groups(filter_item)) for filter_item in FILTERS)
+        LOGGER.info(
+            f"exposures: {n_positions} positions, {n_groups} groups, "
+            f"group loop {elapsed_loop:.3f}s, one pass {elapsed_pass:.4f}s, "
+            f"results match"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="exposure aggregation benchmark")
+    parser.add_argument("--positions", type=int, nargs="+", default=[2000, 20000, 200000])
+    args = parser.parse_args()
+    run(args.positions)
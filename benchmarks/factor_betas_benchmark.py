@@ -0,0 +1,101 @@
+'''
+times Factors.FactorBetas on synthetic prices and checks it against
+Factors.FactorBetasIterative where the loop engine is still affordable
+
+run from the repository root:
+    python -m benchmarks.factor_betas_benchmark --positions 500 5000 20000
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+import legacy.Factors as Factors
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+FACTOR_IDS = [
+    "LD12TRUU Index",
+    "SPX Index",
+    "RIY Index",
+    "RTY Index",
+    "RAG Index",
+    "RAV Index",
+]
+
+
+def synthetic_prices(
+    n_positions: int, n_factors: int, n_days: int, seed: int = 0
+) -> pd.DataFrame:
+    '''factor and position price paths sharing one date index'''
+    rng = np.random.default_rng(seed)
+    factor_ids = FACTOR_IDS + [
+        f"FACTOR{ix} Index" for ix in range(n_factors - 3)
+    ]
+    factor_rets = rng.normal(0.0003, 0.01, size=(n_days, len(factor_ids)))
+    loadings = rng.normal(0.5, 0.5, size=(len(factor_ids), n_positions))
+    position_rets = 0.3 * factor_rets @ loadings + rng.normal(
+        0, 0.015, size=(n_days, n_positions)
+    )
+    prices = 100 * np.exp(np.cumsum(np.hstack([factor_rets, position_rets]), axis=0))
+    # a slice of the book has a shorter history than the factors
+    for col in range(len(factor_ids), prices.shape[1], 17):
+        prices[: rng.integers(10, n_days // 4), col] = np.nan
+    dates = pd.bdate_range("2020-01-01", periods=n_days).strftime("%Y-%m-%d")
+    columns = factor_ids + [f"TCK{ix:05d} US Equity" for ix in range(n_positions)]
+
+    return pd.DataFrame(prices, index=dates, columns=columns)
+
+
+def run(positions: List[int], n_factors: int, n_days: int, reference_max: int):
+    for n_positions in positions:
+        price = synthetic_prices(n_positions, n_factors, n_days)
+        factor_ids = [col for col in price.columns if col.endswith(" Index")]
+        factor_prices = price[factor_ids]
+        position_prices = price[price.columns[len(factor_ids):]]
+
+        start = time.perf_counter()
+        betas = Factors.FactorBetas(factor_prices, position_prices)
+        elapsed = time.perf_counter() - start
+        LOGGER.info(
+            f"FactorBetas: {n_positions} positions x {betas.shape[1] - 1} "
+            f"factors x {n_days} days in {elapsed:.3f}s"
+        )
+        if n_positions > reference_max:
+            continue
+
+        start = time.perf_counter()
+        reference = Factors.FactorBetasIterative(factor_prices, position_prices)
+        elapsed_reference = time.perf_counter() - start
+        assert list(betas.columns) == list(reference.columns)
+        assert (betas["ID"].values == reference["ID"].values).all()
+        np.testing.assert_allclose(
+            betas.iloc[:, 1:].values.astype(float),
+            reference.iloc[:, 1:].values.astype(float),
+            rtol=1e-9,
+            atol=1e-12,
+        )
+        LOGGER.info(
+            f"FactorBetasIterative: {elapsed_reference:.3f}s, results match "
+            f"(speed-up x{elapsed_reference / elapsed:.0f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="FactorBetas benchmark")
+    parser.add_argument(
+        "--positions", type=int, nargs="+", default=[500, 5000, 20000],
+        help="book sizes to time",
+    )
+    parser.add_argument("--factors", type=int, default=40)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument(
+        "--reference_max", type=int, default=500,
+        help="largest book on which the loop engine is run for comparison",
+    )
+    args = parser.parse_args()
+    run(args.positions, args.factors, args.days, args.reference_max)
@@ -0,0 +1,85 @@
+'''
+times the top / bottom N positions of every factor: a full sort_values of
+every factor column, as Exposures.factor_decomp_by_factor_position ran it,
+against the partition of exposure_ranking.FactorExposureMatrix, and checks
+they pick the same exposures in the same order (and the same positions, up
+to ties with the last one picked)
+
+run from the repository root:
+    python -m benchmarks.factor_ranking_benchmark --positions 2000 20000 200000
+'''
+import logging
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.timing import timed
+from legacy.exposure_ranking import FactorExposureMatrix
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+FACTORS = ["Equity", "Size", "Value", "Momentum", "Tech", "Energy", "Financials"]
+
+
+def synthetic_matrix(n_positions: int, seed: int = 0) -> FactorExposureMatrix:
+    '''random exposures with repeated values and a few NaN betas'''
+    rng = np.random.default_rng(seed)
+    exposure = rng.normal(0, 1e-3, n_positions)
+    betas = rng.normal(0, 1, (n_positions, len(FACTORS)))
+    # sector factors: most positions carry no beta at all, so ties are common
+    betas[:, 4:] *= rng.random((n_positions, len(FACTORS) - 4)) < 0.2
+    betas[rng.random(betas.shape) < 0.01] = np.nan
+
+    return FactorExposureMatrix(
+        names=np.array([f"Name {row}" for row in range(n_positions)], dtype=object),
+        factors=pd.Index(FACTORS),
+        values=betas * exposure[:, None],
+        exposure=exposure,
+    )
+
+
+def sorted_tables(matrix: FactorExposureMatrix, n: int):
+    '''per factor stable sorts of the whole column, NaN last'''
+    top, bottom = [], []
+    for col, factor_name in enumerate(matrix.factors):
+        frame = pd.DataFrame(
+            {"Exposure": matrix.values[:, col], "FactorExp": matrix.exposure},
+            index=pd.Index(matrix.names, name=factor_name),
+        )
+        top.append(frame.iloc[np.lexsort((np.arange(len(frame)), -frame["Exposure"].values))][:n])
+        bottom.append(frame.sort_values("Exposure", kind="stable")[:n])
+
+    return top, bottom
+
+
+def run(positions: List[int], n: int):
+    for n_positions in positions:
+        matrix = synthetic_matrix(n_positions)
+        expected, elapsed_sort = timed(sorted_tables, matrix, n)
+        ranked, elapsed_partition = timed(matrix.ranked_tables, n)
+        for expected_tables, ranked_tables in zip(expected, ranked):
+            for expected_table, ranked_table in zip(expected_tables, ranked_tables):
+                np.testing.assert_array_equal(
+                    expected_table["Exposure"].values, ranked_table["Exposure"].values)
+                # rows tied with the last one may be any of the tied positions
+                inside = (
+                    expected_table["Exposure"].values
+                    != expected_table["Exposure"].values[-1:]
+                )
+                assert list(expected_table.index[inside]) == list(ranked_table.index[inside])
+        LOGGER.info(
+            f"factor ranking: {n_positions} positions, {len(FACTORS)} factors, "
+            f"top / bottom {n}, full sort {elapsed_sort:.3f}s, "
+            f"partition {elapsed_partition:.4f}s, results match"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="factor top / bottom N benchmark")
+    parser.add_argument("--positions", type=int, nargs="+", default=[2000, 20000, 200000])
+    parser.add_argument("--n", type=int, default=10)
+    args = parser.parse_args()
+    run(args.positions, args.n)
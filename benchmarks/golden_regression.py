@@ -0,0 +1,102 @@
+'''
+golden output regression: runs main.py on a fixed dataset (the seeded
+synthetic book by default, or a data folder) and diffs every frame handed to
+the report sheet writers against a stored golden set, with per-table
+tolerances. --update stores the run as the new golden set. The set of the
+seeded synthetic book is kept in benchmarks/golden; a change that moves
+report numbers or adds report tables updates it in the same commit, so the
+diff of the csv files shows which cells moved
+
+run from the repository root:
+    python -m benchmarks.golden_regression --update
+    python -m benchmarks.golden_regression --tolerances tolerances.json --workers 4
+
+tolerances.json maps table name patterns (sheet/argument/key, fnmatch) to
+[rtol, atol], first match wins, e.g. {"options_stress/*": [1e-7, 1e-4]}
+'''
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from typing import List
+
+from benchmarks.scaling_benchmark import MAIN
+from benchmarks.synthetic_portfolio import PortfolioSpec, write_inputs
+from src.pipeline.golden import diff_report, diff_tables, read_tables
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+
+def capture_run(folder: str, data: str, holdings_date: str, seed: int, main_args: List[str]) -> str:
+    '''folder of the canonical tables of one main.py run'''
+    if data is None:
+        write_inputs(PortfolioSpec(seed=seed, holdings_date=holdings_date),
+                     os.path.join(folder, "data"))
+    else:
+        shutil.copytree(data, os.path.join(folder, "data"))
+    os.makedirs(os.path.join(folder, "output"), exist_ok=True)
+    tables = os.path.join(folder, "tables")
+    completed = subprocess.run(
+        [
+            sys.executable, MAIN, "--holdings_date", holdings_date, "--no-cache",
+            "--profile", os.path.join(folder, "output", "run_profile.json"),
+            "--golden_dir", tables, *main_args,
+        ],
+        cwd=folder,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"main.py failed:\n{completed.stderr[-4000:]}")
+
+    return tables
+
+
+def run(
+    golden: str, update: bool, data: str, holdings_date: str, seed: int,
+    tolerances: str, main_args: List[str],
+) -> bool:
+    with tempfile.TemporaryDirectory() as folder:
+        tables = capture_run(folder, data, holdings_date, seed, main_args)
+        if update:
+            if os.path.exists(golden):
+                shutil.rmtree(golden)
+            shutil.copytree(tables, golden)
+            LOGGER.info(f"golden set stored in {golden}")
+            return True
+        tolerance_dict = {}
+        if tolerances:
+            with open(tolerances) as file:
+                tolerance_dict = json.load(file)
+        diffs = diff_tables(read_tables(golden), read_tables(tables), tolerance_dict)
+    LOGGER.info(f"golden output diff\n{diff_report(diffs)}")
+
+    return all(diff.ok for diff in diffs)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="golden output regression")
+    parser.add_argument("--golden", type=str, default=GOLDEN, help="golden set folder")
+    parser.add_argument("--update", action="store_true", help="store the run as golden")
+    parser.add_argument(
+        "--data", type=str, default=None,
+        help="input data folder; the seeded synthetic book when not given",
+    )
+    parser.add_argument("--holdings_date", type=str, default=PortfolioSpec.holdings_date)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerances", type=str, default=None, help="json file")
+    args, main_args = parser.parse_known_args()
+    sys.exit(
+        0 if run(
+            args.golden, args.update, args.data, args.holdings_date, args.seed,
+            args.tolerances, main_args,
+        ) else 1
+    )
@@ -0,0 +1,78 @@
+'''
+times reading a wide synthetic prices csv: a cold pandas parse, the first
+ingest into a ColumnarStore and warm loads from the memory-mapped copy,
+selecting a subset of the tickers as main.py does, and checks the selected
+frames agree
+
+run from the repository root:
+    python -m benchmarks.ingest_benchmark --dates 2500 --tickers 2000 5000
+'''
+import logging
+import os
+import tempfile
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.timing import timed
+from src.pipeline.ingest import ColumnarStore
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def synthetic_prices(n_dates: int, n_tickers: int, seed: int = 0) -> pd.DataFrame:
+    '''dates x tickers random walk prices laid out as data/prices.csv'''
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, size=(n_dates, n_tickers))
+    dates = pd.bdate_range("2010-01-01", periods=n_dates).strftime("%Y-%m-%d")
+    columns = [f"TCK{ix:05d} Equity" for ix in range(n_tickers)]
+
+    return pd.DataFrame(
+        100 * np.exp(np.cumsum(returns, axis=0)),
+        index=pd.Index(dates, name="date"),
+        columns=columns,
+    )
+
+
+def run(n_dates: int, tickers: List[int], selected: int):
+    for n_tickers in tickers:
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "prices.csv")
+            synthetic_prices(n_dates, n_tickers).to_csv(path)
+            rng = np.random.default_rng(1)
+            subset = list(
+                rng.choice(
+                    [f"TCK{ix:05d} Equity" for ix in range(n_tickers)],
+                    size=min(selected, n_tickers),
+                    replace=False,
+                )
+            )
+            store = ColumnarStore(root=os.path.join(root, "ingest"))
+
+            def parse():
+                price = pd.read_csv(path)
+                price.set_index(["date"], inplace=True)
+                return price[subset]
+
+            expected, elapsed_parse = timed(parse)
+            _, elapsed_ingest = timed(store.read_prices, path)
+            loaded, elapsed_warm = timed(
+                lambda: store.read_prices(path).frame(subset))
+            pd.testing.assert_frame_equal(loaded, expected, check_names=False)
+            LOGGER.info(
+                f"{n_dates} dates x {n_tickers} tickers, {len(subset)} selected: "
+                f"csv parse {elapsed_parse:.3f}s, first ingest {elapsed_ingest:.3f}s, "
+                f"warm load {elapsed_warm:.3f}s, frames match"
+            )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="columnar ingest benchmark")
+    parser.add_argument("--dates", type=int, default=2500)
+    parser.add_argument("--tickers", type=int, nargs="+", default=[2000, 5000])
+    parser.add_argument("--selected", type=int, default=200)
+    args = parser.parse_args()
+    run(args.dates, args.tickers, args.selected)
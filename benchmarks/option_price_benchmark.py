@@ -0,0 +1,100 @@
+'''
+times helper.black_scholes over a positions x price shocks x vol shocks grid
+and checks helper.option_price against the row by row
+helper.option_price_iterative
+
+run from the repository root:
+    python -m benchmarks.option_price_benchmark --options 1000 10000
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.helper import (
+    black_scholes,
+    option_price,
+    option_price_iterative,
+    put_call_sign,
+)
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+RISK_FREE_RATE = 0.05
+
+
+def synthetic_options(n_options: int, seed: int = 0) -> pd.DataFrame:
+    '''option terms shaped like the option rows of the positions file'''
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "UndlPrice": rng.uniform(20, 200, n_options),
+            "Strike": rng.uniform(20, 200, n_options),
+            "MtyYears": rng.uniform(0.01, 2, n_options),
+            "IVOL_TM": rng.uniform(0.05, 0.9, n_options),
+            "PutCall": rng.choice(["Call", "Put", "C", "P"], n_options),
+        }
+    )
+
+
+def run(options: List[int], n_shocks: int, reference_max: int):
+    shocks = np.linspace(-0.5, 0.5, n_shocks)
+    for n_options in options:
+        option = synthetic_options(n_options)
+        sign = put_call_sign(option["PutCall"])
+
+        start = time.perf_counter()
+        _, greeks = black_scholes(
+            S=option["UndlPrice"].values[:, None, None] * (1 + shocks)[None, :, None],
+            X=option["Strike"].values[:, None, None],
+            T=option["MtyYears"].values[:, None, None],
+            Vol=option["IVOL_TM"].values[:, None, None] * (1 + shocks)[None, None, :],
+            rf=RISK_FREE_RATE,
+            sign=sign[:, None, None],
+            greeks=True,
+        )
+        elapsed = time.perf_counter() - start
+        n_pairs = n_options * n_shocks**2
+        LOGGER.info(
+            f"black_scholes with greeks: {n_options} options x {n_shocks}x{n_shocks} "
+            f"shocks in {elapsed:.3f}s ({n_pairs / elapsed / 1e6:.1f}M pairs/s)"
+        )
+        if n_options > reference_max:
+            continue
+
+        start = time.perf_counter()
+        price = option_price(
+            option["UndlPrice"], option["Strike"], option["MtyYears"],
+            option["IVOL_TM"], RISK_FREE_RATE, option["PutCall"],
+        )
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        reference = option_price_iterative(
+            option["UndlPrice"], option["Strike"], option["MtyYears"],
+            option["IVOL_TM"], RISK_FREE_RATE, option["PutCall"],
+        )
+        elapsed_reference = time.perf_counter() - start
+        np.testing.assert_allclose(price, reference, rtol=1e-12, atol=1e-12)
+        LOGGER.info(
+            f"option_price_iterative: {elapsed_reference:.3f}s, results match "
+            f"(speed-up x{elapsed_reference / elapsed:.0f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="option pricing benchmark")
+    parser.add_argument(
+        "--options", type=int, nargs="+", default=[1000, 10000],
+        help="number of option positions",
+    )
+    parser.add_argument("--shocks", type=int, default=11)
+    parser.add_argument(
+        "--reference_max", type=int, default=1000,
+        help="largest book on which the loop pricer is run for comparison",
+    )
+    args = parser.parse_args()
+    run(args.options, args.shocks, args.reference_max)
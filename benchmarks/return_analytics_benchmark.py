@@ -0,0 +1,92 @@
+'''
+times per fund return analytics of a synthetic NAV file: a per fund loop of
+pandas series statistics, the way pnl_stats built the PNLReport one column
+at a time, against one pass of return_engine over the dates x funds return
+matrix, and checks the statistics both compute agree
+
+run from the repository root:
+    python -m benchmarks.return_analytics_benchmark --funds 10 100 1000
+'''
+import logging
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_portfolio import PortfolioSpec, synthetic_nav
+from benchmarks.timing import timed
+from legacy.pnl_stats import MDD_Abs
+from legacy.return_engine import (
+    ANNUALIZATION_FACTOR,
+    comparative_statistics,
+    fund_returns,
+    return_statistics,
+)
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+BENCHMARK = "SPX Index"
+
+
+def loop_statistics(returns: pd.DataFrame, benchmark: pd.Series) -> pd.DataFrame:
+    '''per fund series statistics, one column at a time'''
+    columns = {}
+    for fund in returns.columns:
+        ret = returns[fund].dropna()
+        bench = benchmark.loc[ret.index]
+        growth = (1 + ret).cumprod().iloc[-1]
+        annualized_return = growth ** (ANNUALIZATION_FACTOR / len(ret)) - 1
+        annualized_volatility = ret.std(ddof=0) * np.sqrt(ANNUALIZATION_FACTOR)
+        up, down = bench > 0, bench < 0
+        columns[fund] = {
+            "Cumulative Return": growth - 1,
+            "Annualized Return": annualized_return,
+            "Sharpe Ratio": annualized_return / annualized_volatility,
+            "Up Days": (ret > 0).sum(),
+            "Largest Down Day": ret.min(),
+            "Maximum Drawdown": MDD_Abs(ret.values),
+            "Beta": ret.cov(bench, ddof=0) / bench.var(ddof=0),
+            "Up Capture": ((1 + ret[up]).cumprod().iloc[-1] - 1)
+            / ((1 + bench[up]).cumprod().iloc[-1] - 1),
+        }
+
+    return pd.DataFrame(columns)
+
+
+def engine_statistics(returns: pd.DataFrame, benchmark: pd.Series) -> pd.DataFrame:
+    statistics = return_statistics(returns)
+    comparative = comparative_statistics(returns, benchmark.to_frame()).xs(
+        BENCHMARK, level="Benchmark")
+
+    return pd.concat([statistics, comparative])
+
+
+def run(funds: List[int], history_days: int, seed: int):
+    for n_funds in funds:
+        spec = PortfolioSpec(n_funds=n_funds, history_days=history_days, seed=seed)
+        returns = fund_returns(synthetic_nav(spec)).iloc[1:]
+        rng = np.random.default_rng(seed)
+        benchmark = pd.Series(
+            rng.normal(4e-4, 1e-2, len(returns)), index=returns.index, name=BENCHMARK)
+        expected, elapsed_loop = timed(loop_statistics, returns, benchmark)
+        statistics, elapsed_engine = timed(engine_statistics, returns, benchmark)
+        np.testing.assert_allclose(
+            statistics.loc[expected.index, expected.columns].values,
+            expected.values.astype(float),
+            rtol=1e-9,
+        )
+        LOGGER.info(
+            f"return analytics: {n_funds} funds x {len(returns)} days, per fund "
+            f"loop {elapsed_loop:.3f}s, one pass {elapsed_engine:.4f}s, results match"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="per fund return analytics benchmark")
+    parser.add_argument("--funds", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=470)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.funds, args.days, args.seed)
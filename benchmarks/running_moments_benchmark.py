@@ -0,0 +1,61 @@
+'''
+times a one day RunningMoments update against the full FactorBetas /
+matrix_cov recompute for growing price histories, and checks the updated
+betas and covariance against the recompute
+
+run from the repository root:
+    python -m benchmarks.running_moments_benchmark --days 500 2500 --positions 2000
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+
+import legacy.Factors as Factors
+import legacy.VaR as VaR
+from benchmarks.factor_betas_benchmark import synthetic_prices
+from legacy.running_moments import RunningMoments
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def run(days: List[int], n_positions: int, n_factors: int):
+    for n_days in days:
+        price = synthetic_prices(n_positions, n_factors, n_days)
+        factor_ids = [col for col in price.columns if col.endswith(" Index")]
+        factor_prices = price[factor_ids]
+        position_prices = price[price.columns[len(factor_ids):]]
+
+        start = time.perf_counter()
+        betas = Factors.FactorBetas(factor_prices, position_prices)
+        cov = VaR.matrix_cov(factor_prices)
+        elapsed_full = time.perf_counter() - start
+
+        moments = RunningMoments.from_prices(
+            factor_prices.iloc[:-1], position_prices.iloc[:-1])
+        start = time.perf_counter()
+        moments.update(factor_prices, position_prices)
+        elapsed_update = time.perf_counter() - start
+        np.testing.assert_allclose(
+            moments.betas().iloc[:, 1:].values.astype(float),
+            betas.iloc[:, 1:].values.astype(float),
+            rtol=1e-8, atol=1e-10,
+        )
+        np.testing.assert_allclose(moments.cov().values, cov.values, rtol=1e-8)
+        LOGGER.info(
+            f"{n_days} days x {n_positions} positions: full recompute "
+            f"{1e3 * elapsed_full:.0f}ms, one day update "
+            f"{1e3 * elapsed_update:.1f}ms, results match"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="running moments benchmark")
+    parser.add_argument("--days", type=int, nargs="+", default=[500, 2500])
+    parser.add_argument("--positions", type=int, default=2000)
+    parser.add_argument("--factors", type=int, default=40)
+    args = parser.parse_args()
+    run(args.days, args.positions, args.factors)
@@ -0,0 +1,132 @@
+'''
+times the whole report pipeline on synthetic books of growing size. Every
+scale gets its own working folder with data/ written by
+benchmarks.synthetic_portfolio; main.py runs there without the result cache
+and its run profile (src.pipeline.profile) is collected into one json file
+per benchmark, optionally compared with an earlier one
+
+run from the repository root:
+    python -m benchmarks.scaling_benchmark --scales 1 10 100 --results scaling.json
+    python -m benchmarks.scaling_benchmark --baseline scaling.json --results new.json
+'''
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.synthetic_portfolio import PortfolioSpec, write_inputs
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def run_scale(spec: PortfolioSpec, folder: str, main_args: List[str]) -> Dict:
+    '''profile of one main.py run on the synthetic book of spec'''
+    positions = write_inputs(spec, os.path.join(folder, "data"))
+    os.makedirs(os.path.join(folder, "output"), exist_ok=True)
+    profile_path = os.path.join(folder, "output", "run_profile.json")
+    completed = subprocess.run(
+        [
+            sys.executable, MAIN, "--holdings_date", spec.holdings_date,
+            "--no-cache", "--profile", profile_path, *main_args,
+        ],
+        cwd=folder,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"main.py failed on {spec}:\n{completed.stderr[-4000:]}")
+    with open(profile_path) as file:
+        profile = json.load(file)
+
+    return {
+        "spec": asdict(spec),
+        "positions": len(positions),
+        "wall": profile["wall"],
+        "peak_rss_mb": profile["peak_rss_mb"],
+        "stages": {
+            stage["name"]: {
+                key: stage[key]
+                for key in ["calls", "wall", "cpu", "peak_rss_mb", "traced_peak_mb"]
+            }
+            for stage in profile["stages"]
+        },
+    }
+
+
+def comparison_table(runs: List[Dict], baseline: List[Dict] = None, limit: int = 25) -> str:
+    '''stage wall seconds by scale, slowest at the largest scale first'''
+    baseline_by_scale = {run["scale"]: run for run in baseline or []}
+    largest = runs[-1]["stages"]
+    names = sorted(largest, key=lambda name: -largest[name]["wall"])[:limit]
+    width = max([len(name) for name in names] + [5])
+    lines = [f"{'stage':<{width}}" + "".join(f"  {run['scale']:>8}x" for run in runs)]
+    for name in ["total"] + names:
+        cells = []
+        for run in runs:
+            wall = run["wall"] if name == "total" else run["stages"].get(name, {}).get("wall")
+            cell = "" if wall is None else f"{wall:9.3f}"
+            base = baseline_by_scale.get(run["scale"])
+            if wall is not None and base is not None:
+                base_wall = (
+                    base["wall"] if name == "total"
+                    else base["stages"].get(name, {}).get("wall")
+                )
+                if base_wall:
+                    cell = f"{wall:6.2f}/{wall / base_wall:.2f}"
+            cells.append(f"  {cell:>9}")
+        lines.append(f"{name:<{width}}" + "".join(cells))
+    if baseline:
+        lines.append("cells are seconds/ratio to the baseline where it has the scale")
+
+    return "\n".join(lines)
+
+
+def run(scales: List[float], seed: int, results: str, baseline: str, main_args: List[str]):
+    runs = []
+    for scale in scales:
+        spec = PortfolioSpec(seed=seed).scaled(scale)
+        with tempfile.TemporaryDirectory() as folder:
+            result = run_scale(spec, folder, main_args)
+        result["scale"] = scale
+        runs.append(result)
+        LOGGER.info(
+            f"scale {scale}x: {result['positions']} positions, "
+            f"{result['wall']:.2f}s, peak rss {result['peak_rss_mb']:.0f}MB"
+        )
+    baseline_runs = None
+    if baseline:
+        with open(baseline) as file:
+            baseline_runs = json.load(file)["runs"]
+    LOGGER.info(f"stage seconds\n{comparison_table(runs, baseline_runs)}")
+    with open(results, "w") as file:
+        json.dump(
+            {
+                "started": datetime.utcnow().isoformat(),
+                "main_args": main_args,
+                "runs": runs,
+            },
+            file,
+            indent=1,
+        )
+    LOGGER.info(f"results written to {results}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="pipeline scaling benchmark")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", type=str, default="scaling_results.json")
+    parser.add_argument("--baseline", type=str, default=None, help="earlier results json")
+    args, main_args = parser.parse_known_args()
+    run(args.scales, args.seed, args.results, args.baseline, main_args)
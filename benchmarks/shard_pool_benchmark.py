@@ -0,0 +1,81 @@
+'''
+times the group reductions of VaR (var_engine.group_sigmas, the isolated
+and excluded group sigmas) and of the stress grid (stress_engine.group_stress) in
+process and sharded over worker processes, and checks the sharded results
+against the in process ones
+
+run from the repository root:
+    python -m benchmarks.shard_pool_benchmark --positions 20000 200000 --workers 4
+'''
+import logging
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.beta_lookup_benchmark import synthetic_betas
+from benchmarks.stress_grid_benchmark import FILTERS, RISK_FREE_RATE, synthetic_positions
+from benchmarks.timing import timed
+from legacy.beta_index import BetaIndex
+from legacy.position_book import PositionBook
+from legacy.stress_engine import group_stress
+from legacy.var_engine import group_sigmas
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def synthetic_cov(n_factors: int, seed: int = 0) -> pd.DataFrame:
+    '''(cash + n_factors) square covariance laid out as VaR.matrix_cov'''
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 0.01, size=(n_factors + 1, n_factors + 1))
+    columns = ["CASH Index"] + [f"FACTOR{ix} Index" for ix in range(n_factors)]
+
+    return pd.DataFrame(loadings @ loadings.T, index=columns, columns=columns)
+
+
+def run(positions: List[int], n_factors: int, workers: int, n_shocks: int):
+    filter_list = ["VaRTicker"] + FILTERS
+    matrix_cov = synthetic_cov(n_factors)
+    price_shocks = np.linspace(-0.2, 0.2, n_shocks)
+    vol_shocks = np.linspace(-0.5, 0.5, n_shocks)
+    for n_positions in positions:
+        book = PositionBook.from_positions(synthetic_positions(n_positions))
+        beta_index = BetaIndex.from_factor_betas(synthetic_betas(n_positions, n_factors))
+        for name, func, args in [
+            ("group_sigmas", group_sigmas, (book, beta_index, matrix_cov, filter_list)),
+            (
+                "group_stress",
+                group_stress,
+                (book, FILTERS, price_shocks, vol_shocks, RISK_FREE_RATE),
+            ),
+        ]:
+            serial, elapsed_serial = timed(func, *args, workers=1)
+            sharded, elapsed_sharded = timed(func, *args, workers=workers)
+            if name == "group_stress":
+                for filter_item in serial:
+                    for ix in (1, 2):
+                        np.testing.assert_allclose(
+                            sharded[filter_item][ix], serial[filter_item][ix], rtol=1e-12)
+            else:
+                for serial_sigma, sharded_sigma in zip(serial, sharded):
+                    for filter_item in serial_sigma:
+                        pd.testing.assert_series_equal(
+                            sharded_sigma[filter_item], serial_sigma[filter_item],
+                            rtol=1e-12)
+            LOGGER.info(
+                f"{name}: {n_positions} positions x {n_factors} factors, "
+                f"in process {elapsed_serial:.3f}s, {workers} workers "
+                f"{elapsed_sharded:.3f}s, results match"
+            )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="group sharding benchmark")
+    parser.add_argument("--positions", type=int, nargs="+", default=[20000, 200000])
+    parser.add_argument("--factors", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--grid", type=int, default=11, help="price and vol shocks")
+    args = parser.parse_args()
+    run(args.positions, args.factors, args.workers, args.grid)
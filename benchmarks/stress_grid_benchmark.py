@@ -0,0 +1,87 @@
+'''
+times stress_engine.group_stress over price x vol shock grids of growing
+density on a synthetic book of stocks and options
+
+run from the repository root:
+    python -m benchmarks.stress_grid_benchmark --positions 2000 20000 --grid 11 41
+'''
+import logging
+import time
+from argparse import ArgumentParser
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.position_book import PositionBook
+from legacy.stress_engine import group_stress
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+RISK_FREE_RATE = 0.055
+FILTERS = ["FundName", "Sector", "Industry", "Country", "MarketCap.1"]
+
+
+def synthetic_positions(
+    n_positions: int, option_share: float = 0.3, seed: int = 0
+) -> pd.DataFrame:
+    '''positions frame with the columns the stress test reads'''
+    rng = np.random.default_rng(seed)
+    is_option = rng.random(n_positions) < option_share
+    undl_price = rng.uniform(10, 300, n_positions)
+    quantity = rng.integers(-5000, 5000, n_positions).astype(float)
+    return pd.DataFrame(
+        {
+            "RFID": np.arange(n_positions),
+            "TradeDate": "2023-08-31",
+            "UnderlierName": [f"TCK{ix:05d}" for ix in range(n_positions)],
+            "VaRTicker": [f"TCK{ix:05d} US Equity" for ix in range(n_positions)],
+            "FundName": rng.choice([f"Fund{ix}" for ix in range(8)], n_positions),
+            "Sector": rng.choice([f"Sector{ix}" for ix in range(11)], n_positions),
+            "Industry": rng.choice([f"Industry{ix}" for ix in range(60)], n_positions),
+            "Country": rng.choice([f"Country{ix}" for ix in range(15)], n_positions),
+            "MarketCap.1": rng.choice(["Large", "Mid", "Small"], n_positions),
+            "SECURITY_TYP": np.where(is_option, "Equity Option", "Common Stock"),
+            "PutCall": np.where(is_option, rng.choice(["Call", "Put"], n_positions), None),
+            "Quantity": quantity,
+            "FXRate": 1.0,
+            "MarketPrice": np.where(is_option, 0.1 * undl_price, undl_price),
+            "PX_POS_MULT_FACTOR": np.where(is_option, 100.0, 1.0),
+            "UndlPrice": undl_price,
+            "Strike": undl_price * rng.uniform(0.8, 1.2, n_positions),
+            "MtyYears": rng.uniform(0.02, 2, n_positions),
+            "IVOL_TM": rng.uniform(0.1, 0.8, n_positions),
+            "MarketValue": quantity * undl_price,
+            "Exposure": quantity * undl_price,
+        }
+    )
+
+
+def run(positions: List[int], grids: List[int]):
+    for n_positions in positions:
+        book = PositionBook.from_positions(synthetic_positions(n_positions))
+        for n_shocks in grids:
+            price_shocks = np.linspace(-0.2, 0.2, n_shocks)
+            vol_shocks = np.linspace(-0.5, 0.5, n_shocks)
+            start = time.perf_counter()
+            group_stress(book, FILTERS, price_shocks, vol_shocks, RISK_FREE_RATE)
+            elapsed = time.perf_counter() - start
+            LOGGER.info(
+                f"group_stress: {n_positions} positions x {n_shocks}x{n_shocks} "
+                f"shocks x {len(FILTERS)} filters in {elapsed:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="stress grid benchmark")
+    parser.add_argument(
+        "--positions", type=int, nargs="+", default=[2000, 20000],
+        help="book sizes to time",
+    )
+    parser.add_argument(
+        "--grid", type=int, nargs="+", default=[11, 41],
+        help="number of price shocks and vol shocks",
+    )
+    args = parser.parse_args()
+    run(args.positions, args.grid)
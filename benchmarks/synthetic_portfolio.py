@@ -0,0 +1,230 @@
+'''
+deterministic synthetic inputs in the layout of data/: factors.csv,
+prices.csv, positions.csv (stocks, funds and equity options across funds,
+sectors, industries, countries and market caps) and the fund NAV history.
+Scale 1 is about the size of the current book
+
+run from the repository root:
+    python -m benchmarks.synthetic_portfolio --scale 10 --out /tmp/synthetic/data
+'''
+import logging
+import os
+from argparse import ArgumentParser
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+# FactorID, Factor Names, factor_group as main.py expects them, including the
+# spread factors it drops
+FACTORS = [
+    ("LD12TRUU Index", "Cash", "macro"),
+    ("SPX Index", "Equity", "macro"),
+    ("RIY Index", "Large", "macro"),
+    ("RTY Index", "Small", "macro"),
+    ("RAG Index", "Growth", "macro"),
+    ("RAV Index", "Value", "macro"),
+    ("RIY less RTY", "Size", "macro"),
+    ("RAG less RAV", "Style", "macro"),
+    ("CL1 Comdty", "Oil", "macro"),
+    ("S5INFT Index", "Tech", "sector"),
+    ("S5FINL Index", "Financials", "sector"),
+    ("S5HLTH Index", "Health", "sector"),
+]
+PRICED_FACTORS = [factor_id for factor_id, _, _ in FACTORS if " less " not in factor_id]
+SECTORS = ["Tech", "Financials", "Health", "Energy", "Industrials", "Utilities"]
+COUNTRIES = ["US", "CA", "GB", "DE", "JP", "FR"]
+MARKET_CAPS = ["Large", "Mid", "Small"]
+FUND_NAMES = ["Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta"]
+# months to expiry of the listed option series
+EXPIRIES = {1: "2026-11-20", 2: "2026-12-18", 5: "2027-03-19", 11: "2027-09-17"}
+
+
+@dataclass
+class PortfolioSpec:
+    '''
+    size of a synthetic book; the position count follows from the tickers,
+    lots_per_ticker and the option share
+    '''
+    n_tickers: int = 60
+    n_funds: int = 7
+    n_industries: int = 12
+    lots_per_ticker: float = 1.5
+    option_share: float = 0.3
+    fund_share: float = 0.05
+    holdings_date: str = "2026-10-16"
+    history_days: int = 470
+    seed: int = 0
+
+    def scaled(self, scale: float) -> "PortfolioSpec":
+        '''the book with scale times the tickers, funds and industries'''
+        return replace(
+            self,
+            n_tickers=int(round(self.n_tickers * scale)),
+            n_funds=max(self.n_funds, int(round(self.n_funds * scale ** 0.5))),
+            n_industries=int(round(self.n_industries * scale ** 0.5)),
+        )
+
+    @property
+    def tickers(self):
+        return [f"TCK{ix:05d} US Equity" for ix in range(self.n_tickers)]
+
+    @property
+    def funds(self):
+        extra = [f"Fund{ix}" for ix in range(max(0, self.n_funds - len(FUND_NAMES)))]
+        return (FUND_NAMES + extra)[: self.n_funds]
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.bdate_range(end=self.holdings_date, periods=self.history_days)
+
+
+def synthetic_factors() -> pd.DataFrame:
+    return pd.DataFrame(FACTORS, columns=["FactorID", "Factor Names", "factor_group"])
+
+
+def synthetic_prices(spec: PortfolioSpec) -> pd.DataFrame:
+    '''
+    date indexed factor and position prices; positions load on the factors,
+    some start trading late (leading NaNs)
+    '''
+    rng = np.random.default_rng(spec.seed)
+    n_dates = spec.history_days
+    factor_returns = rng.normal(0.0003, 0.01, size=(n_dates, len(PRICED_FACTORS)))
+    factor_returns[:, 0] = rng.normal(0.0001, 0.0002, size=n_dates)
+    loadings = rng.normal(0.5, 0.5, size=(len(PRICED_FACTORS), spec.n_tickers))
+    position_returns = 0.3 * factor_returns @ loadings + rng.normal(
+        0, 0.015, size=(n_dates, spec.n_tickers))
+    position_prices = rng.uniform(10, 150, spec.n_tickers) * np.exp(
+        np.cumsum(position_returns, axis=0))
+    late = np.arange(0, spec.n_tickers, 17)
+    first_day = rng.integers(10, 100, len(late))
+    position_prices[:, late] = np.where(
+        np.arange(n_dates)[:, None] < first_day[None, :], np.nan, position_prices[:, late])
+    prices = pd.DataFrame(
+        np.hstack([100 * np.exp(np.cumsum(factor_returns, axis=0)), position_prices]),
+        index=pd.Index(spec.dates.strftime("%Y-%m-%d"), name="date"),
+        columns=PRICED_FACTORS + spec.tickers,
+    )
+
+    return prices
+
+
+def synthetic_positions(spec: PortfolioSpec, prices: pd.DataFrame) -> pd.DataFrame:
+    '''
+    one or more stock or fund lots per ticker, spread over the funds, and
+    listed puts and calls on about option_share of the lots
+    '''
+    rng = np.random.default_rng(spec.seed + 1)
+    undl_price = prices[spec.tickers].iloc[-1].values
+    lots = np.repeat(
+        np.arange(spec.n_tickers),
+        rng.poisson(spec.lots_per_ticker - 1, spec.n_tickers) + 1,
+    )
+    n_lots = len(lots)
+    quantity = rng.integers(-1000, 1000, n_lots).astype(float)
+    quantity[quantity == 0] = 1.0
+    tickers = np.asarray(spec.tickers)
+    lot_price = undl_price[lots]
+    stocks = pd.DataFrame(
+        {
+            "VaRTicker": tickers[lots],
+            "FundName": rng.choice(spec.funds, n_lots),
+            "UnderlierName": [f"Name {ix}" for ix in lots],
+            "TradeDate": spec.holdings_date,
+            "Sector": np.asarray(SECTORS)[lots % len(SECTORS)],
+            "Industry": [f"Ind{ix % spec.n_industries}" for ix in lots],
+            "Country": np.asarray(COUNTRIES)[lots % len(COUNTRIES)],
+            "MarketCap.1": np.asarray(MARKET_CAPS)[lots % len(MARKET_CAPS)],
+            "FXRate": 1.0,
+            "PX_POS_MULT_FACTOR": 1.0,
+            "RFID": 0,
+            "Description": [f"{ticker} position" for ticker in tickers[lots]],
+            "UndlPrice": lot_price,
+            "SECURITY_TYP": np.where(
+                rng.random(n_lots) < spec.fund_share, "Mutual Fund", "Common Stock"),
+            "Quantity": quantity,
+            "MarketPrice": lot_price,
+            "MarketValue": quantity * lot_price,
+            "Exposure": quantity * lot_price,
+            "Delta": 1.0,
+            "PutCall": np.nan,
+            "Expiry": np.nan,
+            "Strike": np.nan,
+            "MtyYears": np.nan,
+            "IVOL_TM": np.nan,
+            "Gamma$": 0.0,
+            "Vega": 0.0,
+            "Theta": 0.0,
+        }
+    )
+    options = stocks.loc[rng.random(n_lots) < spec.option_share].copy()
+    n_options = len(options)
+    is_call = rng.random(n_options) < 0.5
+    months = rng.choice(list(EXPIRIES), n_options)
+    contracts = rng.integers(-20, 20, n_options).astype(float)
+    contracts[contracts == 0] = 1.0
+    option_price = np.maximum(0.05 * options["UndlPrice"].values, 0.1)
+    delta = np.where(is_call, 0.5, -0.5)
+    options = options.assign(
+        SECURITY_TYP="Equity Option",
+        PX_POS_MULT_FACTOR=100.0,
+        Quantity=contracts,
+        MarketPrice=option_price,
+        MarketValue=contracts * option_price * 100,
+        Exposure=contracts * 100 * options["UndlPrice"].values * delta,
+        Delta=delta,
+        PutCall=np.where(is_call, "Call", "Put"),
+        Expiry=[EXPIRIES[month] for month in months],
+        Strike=np.round(options["UndlPrice"].values * rng.uniform(0.8, 1.2, n_options), 2),
+        MtyYears=months / 12,
+        IVOL_TM=rng.uniform(0.2, 0.6, n_options),
+        **{"Gamma$": 0.02, "Vega": 0.1, "Theta": -0.05},
+    )
+
+    return pd.concat([stocks, options], axis=0, ignore_index=True)
+
+
+def synthetic_nav(spec: PortfolioSpec) -> pd.DataFrame:
+    '''daily pnl and end of day NAV of every fund'''
+    rng = np.random.default_rng(spec.seed + 2)
+    n_rows = spec.history_days * spec.n_funds
+
+    return pd.DataFrame(
+        {
+            "PeriodEndDate": np.repeat(spec.dates.strftime("%Y-%m-%d"), spec.n_funds),
+            "Fund": np.tile(spec.funds, spec.history_days),
+            "DailyBookPL": rng.normal(1e4, 1e5, n_rows),
+            "EndBookNAV": 1e8 + rng.normal(0, 1e6, n_rows),
+        }
+    )
+
+
+def write_inputs(spec: PortfolioSpec, folder: str) -> pd.DataFrame:
+    '''the four input files of main.py under folder; returns the positions'''
+    os.makedirs(folder, exist_ok=True)
+    prices = synthetic_prices(spec)
+    positions = synthetic_positions(spec, prices)
+    synthetic_factors().to_csv(os.path.join(folder, "factors.csv"), index=False)
+    prices.to_csv(os.path.join(folder, "prices.csv"))
+    positions.to_csv(os.path.join(folder, "positions.csv"), index=False)
+    synthetic_nav(spec).to_csv(
+        os.path.join(folder, "Historical Pnl and Nav.csv"), index=False)
+    LOGGER.info(
+        f"wrote {len(positions)} positions on {spec.n_tickers} tickers, "
+        f"{spec.n_funds} funds, {spec.history_days} days to {folder}"
+    )
+
+    return positions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="synthetic risk report inputs")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, required=True, help="data folder to write")
+    args = parser.parse_args()
+    write_inputs(PortfolioSpec(seed=args.seed).scaled(args.scale), args.out)
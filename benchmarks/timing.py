@@ -0,0 +1,10 @@
+'''timing helper shared by the benchmark scripts'''
+import time
+from typing import Any, Callable, Tuple
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    '''func(*args, **kwargs) and its wall seconds'''
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -1,9 +1,11 @@
 import logging
+from typing import Union
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from legacy.factor_returns import FactorReturns
 from legacy.helper import imply_SMB_GMV
 
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +26,76 @@ HistSeries <- function ( riskfactors, rfid, exposure, data.in.columns=TRUE){
 """
 
 
-def FactorBetas(factor_prices: pd.DataFrame, position_prices: pd.DataFrame):
+def FactorBetas(
+    factor_prices: Union[pd.DataFrame, FactorReturns], position_prices: pd.DataFrame
+):
+    # Inputs:
+    # Factor prices
+    # Position-level prices
+
+    # Outputs:
+    # Position level beta to each factor; same "ID" + factor columns frame as
+    # FactorBetasIterative, estimated for all positions and factors at once
+    factor_returns = FactorReturns.of(factor_prices)
+    position_returns = (
+        position_prices.iloc[1:,] / position_prices.iloc[1:,].shift(1)
+    ) - 1
+    position_returns = position_returns.reindex(factor_returns.dates)
+    # returns in excess of the STerm Treas (first factor column)
+    rf_returns = factor_returns.simple_returns[:, 0][:, None]
+    factor_returns_rf = factor_returns.simple_returns[:, 1:] - rf_returns
+    position_returns_rf = position_returns.values.astype(float) - rf_returns
+    betas = excess_return_betas(position_returns_rf, factor_returns_rf)
+    beta_factors_df = pd.DataFrame(
+        betas,
+        columns=factor_returns.columns[1:],
+        index=np.repeat(factor_returns.dates[-1], len(position_prices.columns)),
+    )
+    beta_factors_df.insert(0, "ID", position_prices.columns.values)
+
+    return beta_factors_df
+
+
+def excess_return_betas(
+    position_returns: np.ndarray, factor_returns: np.ndarray
+) -> np.ndarray:
+    # Inputs:
+    # T x N position excess returns, T x K factor excess returns (NaN = missing)
+
+    # Outputs:
+    # N x K betas: pairwise-complete cov(position, factor) (ddof=1) over the
+    # full-history factor variance (ddof=0), as in FactorBetasIterative
+    position_valid = ~np.isnan(position_returns)
+    factor_valid = ~np.isnan(factor_returns)
+    # demean first so the sums below stay well conditioned; the pairwise
+    # covariance is invariant to the shift
+    position_demeaned = np.where(
+        position_valid, position_returns - _nanmean(position_returns), 0.0
+    )
+    factor_demeaned = np.where(
+        factor_valid, factor_returns - _nanmean(factor_returns), 0.0
+    )
+    position_mask = position_valid.astype(float)
+    factor_mask = factor_valid.astype(float)
+    n_obs = position_mask.T @ factor_mask
+    sum_xy = position_demeaned.T @ factor_demeaned
+    sum_x = position_demeaned.T @ factor_mask
+    sum_y = position_mask.T @ factor_demeaned
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sum_xy - sum_x * sum_y / n_obs) / (n_obs - 1)
+        betas = cov / np.nanvar(factor_returns, axis=0)
+    betas[n_obs < 2] = np.nan
+
+    return betas
+
+
+def _nanmean(returns: np.ndarray) -> np.ndarray:
+    counts = (~np.isnan(returns)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nansum(returns, axis=0) / counts
+
+
+def FactorBetasIterative(factor_prices: pd.DataFrame, position_prices: pd.DataFrame):
     # Inputs:
     # Factor prices
     # Position-level prices
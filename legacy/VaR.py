@@ -1,12 +1,21 @@
 import logging
 from itertools import product
-from typing import Dict, List
+from typing import Dict, List, Sequence, Union
 
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
-
-from legacy.helper import imply_SMB_GMV, option_price
+from scipy.stats import norm
+
+from legacy.beta_index import BetaIndex
+from legacy.ewma import DECAYS
+from legacy.factor_returns import FactorReturns
+from legacy.position_book import PositionBook, position_frame
+from legacy.stress_engine import group_stress, shock_grid, stress_dict_by_key
+from legacy.var_engine import (
+    group_component_sigma,
+    group_sigmas,
+    total_sigma,
+)
 
 pd.set_option("mode.chained_assignment", None)
 
@@ -15,6 +24,7 @@ logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger(__name__)
 
 RISK_FREE_RATE = 5.5e-2  # as of Aug 2023
+Z_SCORES = {0.95: 1.644854, 0.99: 2.326348}
 
 
 def filter_VaR_grouping(
@@ -50,15 +60,12 @@ def filter_VaR_grouping(
 
 
 def matrix_correlation(
-    factor_prices: pd.DataFrame,
+    factor_prices: Union[pd.DataFrame, FactorReturns],
     factor: pd.DataFrame,
 ) -> pd.DataFrame:
-    factor_returns = np.log(
-        factor_prices.iloc[1:, :] / factor_prices.iloc[1:, :].shift(1)
-    )
-    factor_returns = imply_SMB_GMV(factor_returns)
-    factor_correl = factor_returns.corr()
-    factor.set_index(["FactorID"], inplace=True)
+    factor_correl = FactorReturns.of(factor_prices).corr
+    if "FactorID" in factor.columns:
+        factor = factor.set_index(["FactorID"])
     factor_correl = pd.merge(
         factor_correl, factor["Factor Names"], left_index=True, right_index=True
     )
@@ -69,679 +76,151 @@ def matrix_correlation(
     return factor_correl
 
 
-def decay_cov(factor_prices: pd.DataFrame) -> pd.DataFrame:
-    factor_returns = np.log(
-        factor_prices.iloc[1:, :] / factor_prices.iloc[1:, :].shift(1)
-    )
-    factor_returns = imply_SMB_GMV(factor_returns)
-    nn = np.linspace(start=1, stop=len(
-        factor_returns), num=len(factor_returns))
-    df = ((1 - 0.94) * 0.94 ** (nn - 1)) ** (0.5)
-    df_tmp = np.repeat(df, len(factor_returns.columns))
-    df_tmp = df_tmp.reshape(len(df), len(factor_returns.columns))
-    factor_returns_decay = factor_returns * df_tmp
-    factor_covar_decay = factor_returns_decay.cov()
-
-    return factor_covar_decay
-
-
-def matrix_cov(factor_prices: pd.DataFrame) -> pd.DataFrame:
-    factor_returns = np.log(
-        factor_prices.iloc[1:, :] / factor_prices.iloc[1:, :].shift(1)
-    )
-    factor_returns = imply_SMB_GMV(factor_returns)
-    factor_cov = factor_returns.cov()
-
-    return factor_cov
+def decay_cov(factor_prices: Union[pd.DataFrame, FactorReturns]) -> pd.DataFrame:
+    return FactorReturns.of(factor_prices).decay_cov.copy()
 
 
-def filter_VaR95(
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    dict = {}
-    date = factor_prices.index[-1]
-    filter_item = "VaRTicker"
-    position_grouped = position.groupby([filter_item])
-    for name, group in tqdm(position_grouped, 'filter_VaR95'):
-        if isinstance(name, tuple):
-            name = name[0]
-        tmp = (
-            group.groupby(
-                [
-                    "RFID",
-                ]
-            )
-            .agg({"VaRTicker": "first", "Exposure": "sum"})
-            .reset_index()
-        )
-        exposure = tmp["Exposure"].values
-        fund_positions = tmp["VaRTicker"]
-        factor_betas_fund = factor_betas.loc[factor_betas["ID"].isin(
-            fund_positions)]
-        VaR95 = (
-            exposure[:, None].T
-            @ factor_betas_fund.values[:, 1:]
-            @ matrix_cov.values[1:, 1:]
-            @ factor_betas_fund.values[:, 1:].T
-            @ exposure[:, None]
-        ) ** (0.5)
-        dict[name] = (VaR95[:, 0] * 1.644854) / firm_NAV
-        # LOGGER.info(
-        #     f"estimating  port VaR 95 of {name} as of date {date} within"
-        #     f"filter {filter_item}"
-        # )
-    VaR95_df = pd.DataFrame(dict).T
-    VaR95_df = pd.DataFrame(
-        VaR95_df.values,
-        columns=[f"{filter_item}_VaR95"],
-        index=position_agg_exposure["UnderlierName"],
-    )
-    VaR95_top10 = VaR95_df.sort_values([f"{filter_item}_VaR95"], ascending=False).iloc[
-        :10
-    ]
-    VaR95_top10.reset_index(inplace=True)
-    VaR95_top10.rename(
-        columns={
-            "UnderlierName": "Top10 VaR Contributors",
-            f"{filter_item}_VaR95": "VaR95",
-        },
-        inplace=True,
-    )
-    VaR95_top10.set_index(["Top10 VaR Contributors"], inplace=True)
-    VaR95_bottom10 = VaR95_df.sort_values(
-        [f"{filter_item}_VaR95"], ascending=True
-    ).iloc[:10]
-    VaR95_bottom10.reset_index(inplace=True)
-    VaR95_bottom10.rename(
-        columns={
-            "UnderlierName": "Top10 VaR Diversifiers",
-            f"{filter_item}_VaR95": "VaR95",
-        },
-        inplace=True,
-    )
-    VaR95_bottom10.set_index(["Top10 VaR Diversifiers"], inplace=True)
-
-    return VaR95_top10, VaR95_bottom10
-
-
-def filter_VaR99(
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    dict = {}
-    date = factor_prices.index[-1]
-    filter_item = "VaRTicker"
-    position_grouped = position.groupby([filter_item])
-    for name, group in tqdm(position_grouped, 'filter_VaR99'):
-        if isinstance(name, tuple):
-            name = name[0]
-        tmp = (
-            group.groupby(
-                [
-                    "RFID",
-                ]
-            )
-            .agg({"VaRTicker": "first", "Exposure": "sum"})
-            .reset_index()
-        )
-        exposure = tmp["Exposure"].values
-        fund_positions = tmp["VaRTicker"]
-        factor_betas_fund = factor_betas.loc[factor_betas["ID"].isin(
-            fund_positions)]
-        VaR99 = (
-            exposure[:, None].T
-            @ factor_betas_fund.values[:, 1:]
-            @ matrix_cov.values[1:, 1:]
-            @ factor_betas_fund.values[:, 1:].T
-            @ exposure[:, None]
-        ) ** (0.5)
-        dict[name] = (VaR99[:, 0] * 2.326348) / firm_NAV
-        # LOGGER.info(
-        #     f"estimating  port VaR 99 of {name} as of date {date} within"
-        #     f"filter {filter_item}"
-        # )
-    VaR99_df = pd.DataFrame(dict).T
-    VaR99_df = pd.DataFrame(
-        VaR99_df.values,
-        columns=[f"{filter_item}_VaR99"],
-        index=position_agg_exposure["UnderlierName"],
-    )
-    VaR99_top10 = VaR99_df.sort_values([f"{filter_item}_VaR99"], ascending=False).iloc[
-        :10
-    ]
-    VaR99_top10.reset_index(inplace=True)
-    VaR99_top10.rename(
-        columns={
-            "UnderlierName": "Top10 VaR Contributors",
-            f"{filter_item}_VaR99": "VaR99",
-        },
-        inplace=True,
-    )
-    VaR99_top10.set_index(["Top10 VaR Contributors"], inplace=True)
-    VaR99_bottom10 = VaR99_df.sort_values(
-        [f"{filter_item}_VaR99"], ascending=True
-    ).iloc[:10]
-    VaR99_bottom10.reset_index(inplace=True)
-    VaR99_bottom10.rename(
-        columns={
-            "UnderlierName": "Top10 VaR Diversifiers",
-            f"{filter_item}_VaR99": "VaR99",
-        },
-        inplace=True,
-    )
-    VaR99_bottom10.set_index(["Top10 VaR Diversifiers"], inplace=True)
+def ewma_cov(
+    factor_prices: Union[pd.DataFrame, FactorReturns],
+    decays: List[float] = DECAYS,
+) -> Dict[float, pd.DataFrame]:
+    # Outputs:
+    # zero-mean EWMA factor covariance for every decay, newest day weighted
+    # most, laid out as matrix_cov so it can stand in for it in filter_VaR.
+    # decay_cov keeps its original weighting
+    return FactorReturns.of(factor_prices).ewma_covs(decays)
 
-    return VaR99_top10, VaR99_bottom10
 
+def matrix_cov(factor_prices: Union[pd.DataFrame, FactorReturns]) -> pd.DataFrame:
+    return FactorReturns.of(factor_prices).cov.copy()
 
-def filter_VaR95_iso(
-    filter: Dict,
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    filter_VaR95_iso_df_list = []  # contains all compuuted results across all filters
-    filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_VaR95_iso'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = (
-                group.groupby(
-                    [
-                        "RFID",
-                    ]
-                )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
-            )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            VaR95_iso = (
-                exposure[:, None].T
-                @ factor_betas_fund.values[:, 1:]
-                @ matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ) ** (0.5)
-            dict[name] = (VaR95_iso[:, 0] * 1.644854) / firm_NAV
-            # LOGGER.info(
-            #     f"estimating  port VaR 95 of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-        VaR95_iso_df = pd.DataFrame(dict).T
-        VaR95_iso_df = pd.DataFrame(
-            VaR95_iso_df.values,
-            columns=[f"{filter_item}_Iso95"],
-            index=VaR95_iso_df.index,
-        )
-        filter_VaR95_iso_df_list.append(VaR95_iso_df)
 
-    return filter_VaR95_iso_df_list
+def z_score(confidence: float) -> float:
+    # one-sided normal quantile, pinned to the multipliers the report has
+    # always used for 95% and 99%
+    if confidence in Z_SCORES:
+        return Z_SCORES[confidence]
 
+    return float(norm.ppf(confidence))
 
-def filter_VaR99_iso(
-    filter: Dict,
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    filter_VaR99_iso_df_list = []  # contains all compuuted results across all filters
-    filter_list = list(filter.keys())
-    filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_VaR99_iso'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = (
-                group.groupby(
-                    [
-                        "RFID",
-                    ]
-                )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
-            )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            VaR99_iso = (
-                exposure[:, None].T
-                @ factor_betas_fund.values[:, 1:]
-                @ matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ) ** (0.5)
-            dict[name] = (VaR99_iso[:, 0] * 2.326348) / firm_NAV
-            # LOGGER.info(
-            #     f"estimating  port VaR 99 of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-        VaR99_iso_df = pd.DataFrame(dict).T
-        VaR99_iso_df = pd.DataFrame(
-            VaR99_iso_df.values,
-            columns=[f"{filter_item}_Iso99"],
-            index=VaR99_iso_df.index,
-        )
-        filter_VaR99_iso_df_list.append(VaR99_iso_df)
 
-    return filter_VaR99_iso_df_list
+def VaR_label(measure: str, confidence: float) -> str:
+    # e.g. ("Iso", 0.95) -> "Iso95", ("Inc", 0.975) -> "Inc97.5"
+    return f"{measure}{round(confidence * 100, 4):g}"
 
 
-def filter_VaR95_inc(
+def filter_VaR(
     filter: Dict,
     factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
+    position: Union[pd.DataFrame, PositionBook],
     factor_betas: pd.DataFrame,
     matrix_cov: pd.DataFrame,
     firm_NAV: float,
+    confidence_levels: Sequence[float] = (0.95, 0.99),
+    horizons: Sequence[int] = (1,),
+    beta_index: BetaIndex = None,
+    workers: int = 1,
 ) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    total_exposure = position_agg_exposure["Exposure"].values
-    VaR95_total = (
-        total_exposure[:, None].T
-        @ factor_betas.drop('ID', axis=1).values
-        @ matrix_cov.values[1:, 1:]
-        @ factor_betas.drop('ID', axis=1).values.T
-        @ total_exposure[:, None]
-    ) ** (0.5) * 1.644854
-    filter_VaR95_inc_df_list = []  # contains all computed results across all filters
-    filter_list = list(filter.keys())
+    # Inputs:
+    # filters, positions, factor betas, factor covariance, firm NAV,
+    # confidence levels and holding horizons (days) to report, worker
+    # processes the group reductions are sharded over
+
+    # Outputs:
+    # isolated (Iso), incremental (Inc) and Euler component (Comp, sums to the
+    # total VaR across the groups of a dimension) VaR as % of NAV
+    # for every group of VaRTicker and every filter, keyed by
+    # (dimension, group, confidence, horizon, measure). Each sigma is
+    # estimated once and scaled to every confidence level and horizon.
+    position = PositionBook.of(position)
+    if beta_index is None:
+        beta_index = BetaIndex.from_factor_betas(factor_betas)
     filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_VaR95_inc'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = position.loc[position[filter_item] != name]
-            tmp = (
-                tmp.groupby(
-                    [
-                        "RFID",
-                    ]
+    sigma_total = total_sigma(position, beta_index, matrix_cov)
+    isolated_sigma, excluded_sigma = group_sigmas(
+        position, beta_index, matrix_cov, filter_list, workers)
+    measure_dict = {
+        "Iso": isolated_sigma,
+        "Inc": {
+            filter_item: sigma_total - sigma
+            for filter_item, sigma in excluded_sigma.items()
+        },
+        "Comp": group_component_sigma(
+            position, beta_index, matrix_cov, filter_list),
+    }
+    VaR_df_list = []
+    for measure, sigma_dict in measure_dict.items():
+        for filter_item in filter_list:
+            sigma = sigma_dict[filter_item]
+            for confidence, horizon in product(confidence_levels, horizons):
+                scale = z_score(confidence) * np.sqrt(horizon)
+                VaR_df_list.append(
+                    pd.DataFrame(
+                        {
+                            "dimension": filter_item,
+                            "group": list(sigma.index),
+                            "confidence": confidence,
+                            "horizon": horizon,
+                            "measure": measure,
+                            "VaR": sigma.values * scale / firm_NAV.values[0],
+                        }
+                    )
                 )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
-            )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            VaR95_inc = (
-                exposure[:, None].T
-                @ factor_betas_fund.values[:, 1:]
-                @ matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ) ** (0.5)
-            dict[name] = (
-                (VaR95_total - (VaR95_inc[:, 0] *
-                 1.644854)) / firm_NAV.values[:, None]
-            )[0, :]
-            # LOGGER.info(
-            #     f"estimating  port VaR 95 of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-        VaR95_inc_df = pd.DataFrame(dict).T
-        VaR95_inc_df = pd.DataFrame(
-            VaR95_inc_df.values,
-            columns=[f"{filter_item}_Inc95"],
-            index=VaR95_inc_df.index,
-        )
-        filter_VaR95_inc_df_list.append(VaR95_inc_df)
-
-    return filter_VaR95_inc_df_list
-
-
-def filter_VaR99_inc(
-    filter: Dict,
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> pd.DataFrame:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
+    VaR_df = pd.concat(VaR_df_list, axis=0)
+    VaR_df.set_index(
+        ["dimension", "group", "confidence", "horizon", "measure"], inplace=True
     )
-    total_exposure = position_agg_exposure["Exposure"].values
-    VaR99_total = (
-        total_exposure[:, None].T
-        @ factor_betas.values[:, 1:]
-        @ matrix_cov.values[1:, 1:]
-        @ factor_betas.values[:, 1:].T
-        @ total_exposure[:, None]
-    ) ** (0.5) * 2.326348
-    filter_VaR99_inc_df_list = []  # contains all computed results across all filters
-    filter_list = list(filter.keys())
-    filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_VaR99_inc'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = position.loc[position[filter_item] != name]
-            tmp = (
-                tmp.groupby(
-                    [
-                        "RFID",
-                    ]
-                )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
-            )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            VaR99_inc = (
-                exposure[:, None].T
-                @ factor_betas_fund.values[:, 1:]
-                @ matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ) ** (0.5)
-            dict[name] = (
-                (VaR99_total - (VaR99_inc[:, 0] *
-                 2.326348)) / firm_NAV.values[:, None]
-            )[0, :]
-            # LOGGER.info(
-            #     f"estimating  port VaR 99 of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-        VaR99_inc_df = pd.DataFrame(dict).T
-        VaR99_inc_df = pd.DataFrame(
-            VaR99_inc_df.values,
-            columns=[f"{filter_item}_Inc99"],
-            index=VaR99_inc_df.index,
-        )
-        filter_VaR99_inc_df_list.append(VaR99_inc_df)
 
-    return filter_VaR99_inc_df_list
+    return VaR_df
 
 
-def filter_Var95_comp(
-    filter: Dict,
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
+def filter_VaR_list(
+    VaR_df: pd.DataFrame, measure: str, confidence: float, horizon: int = 1
 ) -> List:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    filter_list = list(filter.keys())
-    filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    filter_VaR95_comp_df_list = []
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_Var95_comp'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = (
-                group.groupby(
-                    [
-                        "RFID",
-                    ]
-                )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
+    # one single column frame per dimension, e.g. "Sector_Iso95", as consumed
+    # by VaR_structuring
+    label = VaR_label(measure, confidence)
+    VaR_selected = VaR_df.xs(
+        (confidence, horizon, measure), level=["confidence", "horizon", "measure"]
+    )["VaR"]
+    filter_VaR_df_list = []
+    for filter_item in VaR_selected.index.unique("dimension"):
+        VaR_filter = VaR_selected.xs(filter_item, level="dimension")
+        filter_VaR_df_list.append(
+            pd.DataFrame(
+                VaR_filter.values,
+                columns=[f"{filter_item}_{label}"],
+                index=list(VaR_filter.index),
             )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            filter_mvar_95 = (
-                matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ).sum()
-            dict[name] = filter_mvar_95 / firm_NAV
-            # LOGGER.info(
-            #     f"estimating VaR 95 comp of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-
-        VaR95_comp_df = pd.DataFrame(dict).T
-        VaR95_comp_df = pd.DataFrame(
-            VaR95_comp_df.values,
-            columns=[f"{filter_item}_Comp95"],
-            index=VaR95_comp_df.index,
         )
-        filter_VaR95_comp_df_list.append(VaR95_comp_df)
 
-    return filter_VaR95_comp_df_list
+    return filter_VaR_df_list
 
 
-def filter_Var99_comp(
-    filter: Dict,
-    factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
-    factor_betas: pd.DataFrame,
-    matrix_cov: pd.DataFrame,
-    firm_NAV: float,
-) -> List:
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
-    filter_list = list(filter.keys())
-    filter_list = ["VaRTicker"] + list(filter.keys())
-    date = factor_prices.index[-1]
-    filter_VaR99_comp_df_list = []
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        dict = {}
-        for name, group in tqdm(position_grouped, 'filter_Var99_comp'):
-            if isinstance(name, tuple):
-                name = name[0]
-            tmp = (
-                group.groupby(
-                    [
-                        "RFID",
-                    ]
-                )
-                .agg({"VaRTicker": "first", "Exposure": "sum"})
-                .reset_index()
-            )
-            exposure = tmp["Exposure"].values
-            fund_positions = tmp["VaRTicker"]
-            factor_betas_fund = factor_betas.loc[
-                factor_betas["ID"].isin(fund_positions)
-            ]
-            filter_mvar_99 = (
-                matrix_cov.values[1:, 1:]
-                @ factor_betas_fund.values[:, 1:].T
-                @ exposure[:, None]
-            ).sum()
-            dict[name] = filter_mvar_99 / firm_NAV
-            # LOGGER.info(
-            #     f"estimating VaR 99 comp of {name} as of date {date} within"
-            #     f"filter {filter_item}"
-            # )
-
-        VaR99_comp_df = pd.DataFrame(dict).T
-        VaR99_comp_df = pd.DataFrame(
-            VaR99_comp_df.values,
-            columns=[f"{filter_item}_Comp99"],
-            index=VaR99_comp_df.index,
-        )
-        filter_VaR99_comp_df_list.append(VaR99_comp_df)
+def VaR_top_bottom(
+    VaR_df: pd.DataFrame,
+    position: Union[pd.DataFrame, PositionBook],
+    confidence_levels: Sequence[float] = (0.95, 0.99),
+    horizon: int = 1,
+    n: int = 10,
+):
+    # top / bottom n positions by isolated VaR, one column per confidence
+    VaR_position = VaR_df.xs(
+        ("VaRTicker", horizon, "Iso"), level=["dimension", "horizon", "measure"]
+    )["VaR"].unstack("confidence")[list(confidence_levels)]
+    VaR_position.columns = [
+        VaR_label("VaR", confidence) for confidence in confidence_levels
+    ]
+    underlier_names = position_frame(position).groupby("VaRTicker")[
+        "UnderlierName"].first()
+    VaR_position.index = underlier_names.reindex(VaR_position.index).values
+    sort_column = VaR_position.columns[0]
+    VaR_top = VaR_position.sort_values([sort_column], ascending=False).iloc[:n]
+    VaR_top.index.name = f"Top{n} VaR Contributors"
+    VaR_bottom = VaR_position.sort_values([sort_column], ascending=True).iloc[:n]
+    VaR_bottom.index.name = f"Top{n} VaR Diversifiers"
 
-    return filter_VaR99_comp_df_list
+    return VaR_top, VaR_bottom
 
 
 def VaR_structuring(
@@ -751,7 +230,7 @@ def VaR_structuring(
     VaR99_filtered_inc: List,
     VaR95_filtered_comp: List,
     VaR99_filtered_comp: List,
-    position: pd.DataFrame,
+    position: Union[pd.DataFrame, PositionBook],
 ) -> pd.DataFrame:
     # go through all Lists and pull out the FundVaR stats, SectorVaR stats,
     # IndustryVaR stats,CountryVaR stats, MktCap VaR stats into their respective places
@@ -875,7 +354,7 @@ def VaR_structuring(
     VaR_position_df.rename(columns={"index": "VaRTicker"}, inplace=True)
     VaR_position_df = pd.merge(
         VaR_position_df,
-        position[["VaRTicker", "UnderlierName"]],
+        position_frame(position)[["VaRTicker", "UnderlierName"]],
         on=["VaRTicker"],
         how="inner",
     )
@@ -938,147 +417,43 @@ def VaR_structuring(
 def filter_stress_test_price_vol(
     filter: Dict,
     factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
+    position: Union[pd.DataFrame, PositionBook],
     price_vol_shock_range: Dict,
+    workers: int = 1,
 ):
-    price_shock_list = price_vol_shock_range["price_shock"]
-    vol_shock_list = price_vol_shock_range["vol_shock"]
-    shock_params_list = []
-    for a, b in product(
-        price_shock_list,
-        vol_shock_list,
-    ):
-        params = {"price_shock": a, "vol_shock": b}
-        shock_params_list.append(params)
-    filter_list = list(filter.keys())
-    stress_test_price_vol_dict = {}
-    stress_test_price_vol_exposure_dict = {}
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        for filter_name, filter_group in tqdm(
-            position_grouped,
-            f'Stress test price for group: {filter_item}',
-        ):
-            if isinstance(filter_name, tuple):
-                filter_name = filter_name[0]
-            for shock in shock_params_list:
-                shock_pnl = 0
-                price_shock = shock["price_shock"]
-                vol_shock = shock["vol_shock"]
-                position_non_option = filter_group.loc[
-                    filter_group["SECURITY_TYP"].str.contains(
-                        "|".join(
-                            [
-                                "fixed",
-                                "future",
-                                "public",
-                                "prefer",
-                                "common",
-                                "reit",
-                                "fund",
-                                "mlp",
-                                "adr",
-                            ]
-                        ),
-                        na=False,
-                        case=False,
-                    )
-                ]
-                if not position_non_option.empty:
-                    position_non_option["shock_value"] = (
-                        position_non_option["Quantity"].astype(float)
-                        * position_non_option["FXRate"]
-                        * position_non_option["MarketPrice"]
-                        * position_non_option["PX_POS_MULT_FACTOR"]
-                        * (1 + price_shock)
-                    )
-                    position_non_option["shock_pnl"] = (
-                        position_non_option["shock_value"]
-                    ) - (
-                        position_non_option["Quantity"].astype(float)
-                        * position_non_option["FXRate"]
-                        * position_non_option["MarketPrice"]
-                        * position_non_option["PX_POS_MULT_FACTOR"]
-                    )
-                    position_non_option["shock_exposure"] = (
-                        position_non_option["shock_value"]
-                        - position_non_option["Exposure"]
-                    )
-                    shock_pnl += position_non_option["shock_pnl"].sum()
-                    shock_exposure = position_non_option["shock_exposure"].sum(
-                    )
-                position_option = filter_group.loc[
-                    filter_group["SECURITY_TYP"].str.contains(
-                        "|".join(["call", "option", "put"]),
-                        na=False,
-                        case=False,
-                    )
-                ]
-                if not position_option.empty:
-                    position_option["shock_underlying_price"] = position_option[
-                        "UndlPrice"
-                    ] * (1 + price_shock)
-                    position_option["shock_implied_vol"] = position_option[
-                        "IVOL_TM"
-                    ].astype(float) * (1 + vol_shock)
-                    position_option["shock_option_price"] = option_price(
-                        S=position_option["shock_underlying_price"],
-                        X=position_option["Strike"],
-                        T=position_option["MtyYears"],
-                        Vol=position_option["shock_implied_vol"].astype(float),
-                        rf=RISK_FREE_RATE,
-                        type=position_option["PutCall"],
-                    )
-                    position_option["shock_value"] = (
-                        position_option["shock_option_price"]
-                        * position_option["PX_POS_MULT_FACTOR"]
-                        * position_option["Quantity"].astype(float)
-                        * position_option["FXRate"]
-                    )
-                    position_option["shock_exposure"] = (
-                        position_option["shock_value"] -
-                        position_option["Exposure"]
-                    )
-                    position_option["shock_pnl"] = (position_option["shock_value"]) - (
-                        position_option["MarketPrice"]
-                        * position_option["PX_POS_MULT_FACTOR"]
-                        * position_option["Quantity"].astype(float)
-                        * position_option["FXRate"]
-                    )
-                    shock_pnl += position_option["shock_pnl"].sum()
-                    shock_exposure = position_option["shock_exposure"].sum()
-                stress_test_price_vol_dict[
-                    f"{filter_name}_price_shock_{price_shock}_vol_shock_{vol_shock}"
-                ] = shock_pnl
-                stress_test_price_vol_exposure_dict[
-                    f"{filter_name}_price_shock_{price_shock}_vol_shock_{vol_shock}"
-                ] = shock_exposure
-        # LOGGER.info(
-        #     f"stress test results for price shock for group {filter_name} ")
-
-        stress_test_price_vol_df = pd.DataFrame(
-            stress_test_price_vol_dict, index=["stress_pnl & vol shock"]
-        ).T
-        date_vector = pd.DataFrame(
-            np.repeat(factor_prices.index[-1], len(stress_test_price_vol_df)),
-            index=stress_test_price_vol_df.index,
-        )
-        stress_test_price_vol_df = pd.concat(
-            [date_vector, stress_test_price_vol_df], axis=1
-        )
-        stress_test_price_vol_exposure_df = pd.DataFrame(
-            stress_test_price_vol_exposure_dict, index=[
-                "stress_exposure & vol shock"]
-        ).T
-        date_vector = pd.DataFrame(
-            np.repeat(factor_prices.index[-1],
-                      len(stress_test_price_vol_exposure_df)),
-            index=stress_test_price_vol_exposure_df.index,
-            columns=[factor_prices.index[-1]],
-        )
-        stress_test_price_vol_exposure_df = pd.concat(
-            [date_vector, stress_test_price_vol_exposure_df], axis=1
-        )
+    # Outputs:
+    # shock P&L and shock exposure of every group of every filter for every
+    # (price, vol) shock, keyed "{group}_price_shock_{price}_vol_shock_{vol}"
+    book = PositionBook.of(position)
+    price_shocks, vol_shocks = shock_grid(price_vol_shock_range)
+    stress_dict = group_stress(
+        book, list(filter.keys()), price_shocks, vol_shocks, RISK_FREE_RATE,
+        workers=workers,
+    )
+    stress_test_price_vol_df = pd.DataFrame(
+        stress_dict_by_key(stress_dict, price_vol_shock_range, "pnl"),
+        index=["stress_pnl & vol shock"],
+    ).T
+    date_vector = pd.DataFrame(
+        np.repeat(factor_prices.index[-1], len(stress_test_price_vol_df)),
+        index=stress_test_price_vol_df.index,
+    )
+    stress_test_price_vol_df = pd.concat(
+        [date_vector, stress_test_price_vol_df], axis=1
+    )
+    stress_test_price_vol_exposure_df = pd.DataFrame(
+        stress_dict_by_key(stress_dict, price_vol_shock_range, "exposure"),
+        index=["stress_exposure & vol shock"],
+    ).T
+    date_vector = pd.DataFrame(
+        np.repeat(factor_prices.index[-1],
+                  len(stress_test_price_vol_exposure_df)),
+        index=stress_test_price_vol_exposure_df.index,
+        columns=[factor_prices.index[-1]],
+    )
+    stress_test_price_vol_exposure_df = pd.concat(
+        [date_vector, stress_test_price_vol_exposure_df], axis=1
+    )
 
     return stress_test_price_vol_df, stress_test_price_vol_exposure_df
 
@@ -1086,150 +461,39 @@ def filter_stress_test_price_vol(
 def filter_stress_test_beta_price_vol(
     filter: Dict,
     factor_prices: pd.DataFrame,
-    position: pd.DataFrame,
+    position: Union[pd.DataFrame, PositionBook],
     factor_betas: pd.DataFrame,
     price_vol_shock_range: Dict,
+    beta_index: BetaIndex = None,
+    workers: int = 1,
 ):
-    equity_mkt_beta = factor_betas[["ID", "SPX Index"]]
-    equity_mkt_beta.rename(columns={"ID": "VaRTicker"}, inplace=True)
-    price_shock_list = price_vol_shock_range["price_shock"]
-    vol_shock_list = price_vol_shock_range["vol_shock"]
-    shock_params_list = []
-    for a, b in product(
-        price_shock_list,
-        vol_shock_list,
-    ):
-        params = {"price_shock": a, "vol_shock": b}
-        shock_params_list.append(params)
-    filter_list = list(filter.keys())
-    stress_test_beta_price_vol_dict = {}
-    for filter_item in filter_list:
-        position_grouped = position.groupby([filter_item])
-        for filter_name, filter_group in tqdm(
-            position_grouped,
-            f'Stress test beta for group: {filter_item}'
-        ):
-            if isinstance(filter_name, tuple):
-                filter_name = filter_name[0]
-            for shock in shock_params_list:
-                shock_pnl = 0
-                price_shock = shock["price_shock"]
-                vol_shock = shock["vol_shock"]
-                position_non_option = filter_group.loc[
-                    filter_group["SECURITY_TYP"].str.contains(
-                        "|".join(
-                            [
-                                "fixed",
-                                "future",
-                                "public",
-                                "prefer",
-                                "common",
-                                "reit",
-                                "fund",
-                                "mlp",
-                                "adr",
-                            ]
-                        ),
-                        na=False,
-                        case=False,
-                    )
-                ]
-                position_non_option["TradeDate"] = pd.to_datetime(
-                    position_non_option["TradeDate"]
-                )
-                position_non_option.set_index(["TradeDate"], inplace=True)
-                if not position_non_option.empty:
-                    equity_mkt_beta_group = pd.merge(
-                        position_non_option[["VaRTicker"]],
-                        equity_mkt_beta,
-                        on=["VaRTicker"],
-                        how="left",
-                    )
-                    equity_mkt_beta_group = equity_mkt_beta_group["SPX Index"]
-                    beta_price_shock = equity_mkt_beta_group.values * price_shock
-                    position_non_option["shock_value"] = (
-                        position_non_option["Quantity"].astype(float)
-                        * position_non_option["FXRate"]
-                        * position_non_option["MarketPrice"]
-                        * position_non_option["PX_POS_MULT_FACTOR"]
-                        * (1 + beta_price_shock)
-                    )
-                    position_non_option["shock_pnl"] = (
-                        position_non_option["shock_value"]
-                    ) - (
-                        position_non_option["Quantity"].astype(float)
-                        * position_non_option["FXRate"]
-                        * position_non_option["MarketPrice"]
-                        * position_non_option["PX_POS_MULT_FACTOR"]
-                    )
-                    shock_pnl += position_non_option["shock_pnl"].sum()
-                position_option = filter_group.loc[
-                    filter_group["SECURITY_TYP"].str.contains(
-                        "|".join(["call", "option", "put"]),
-                        na=False,
-                        case=False,
-                    )
-                ]
-                position_option["TradeDate"] = pd.to_datetime(
-                    position_option["TradeDate"]
-                )
-                position_option.set_index(["TradeDate"], inplace=True)
-                if not position_option.empty:
-                    equity_mkt_beta_group = pd.merge(
-                        position_option[["VaRTicker"]],
-                        equity_mkt_beta,
-                        on=["VaRTicker"],
-                        how="left",
-                    )
-                    equity_mkt_beta_group = equity_mkt_beta_group["SPX Index"]
-                    beta_price_shock = equity_mkt_beta_group.values * price_shock
-                    position_option["shock_underlying_price"] = position_option[
-                        "UndlPrice"
-                    ] * (1 + beta_price_shock)
-                    position_option["shock_implied_vol"] = position_option[
-                        "IVOL_TM"
-                    ].astype(float) * (1 + vol_shock)
-                    position_option["shock_option_price"] = option_price(
-                        S=position_option["shock_underlying_price"],
-                        X=position_option["Strike"],
-                        T=position_option["MtyYears"],
-                        Vol=position_option["shock_implied_vol"].astype(float),
-                        rf=RISK_FREE_RATE,
-                        type=position_option["PutCall"],
-                    )
-                    position_option["shock_value"] = (
-                        position_option["shock_option_price"]
-                        * position_option["PX_POS_MULT_FACTOR"]
-                        * position_option["Quantity"].astype(float)
-                        * position_option["FXRate"]
-                    )
-                    position_option["shock_pnl"] = (position_option["shock_value"]) - (
-                        position_option["MarketPrice"]
-                        * position_option["PX_POS_MULT_FACTOR"]
-                        * position_option["Quantity"].astype(float)
-                        * position_option["FXRate"]
-                    )
-                    shock_pnl += position_option["shock_pnl"].sum()
-                stress_test_beta_price_vol_dict[
-                    f"{filter_name}_price_shock_" f"{price_shock}_vol_shock_{vol_shock}"
-                ] = shock_pnl
-            # LOGGER.info(
-            #     f"stress test results for beta * price shock for group {filter_name} "
-            # )
-
-        stress_test_beta_price_vol_df = pd.DataFrame(
-            stress_test_beta_price_vol_dict, index=[
-                "stress_pnl_beta*price & vol shock"]
-        ).T
-        date_vector = pd.DataFrame(
-            np.repeat(factor_prices.index[-1],
-                      len(stress_test_beta_price_vol_df)),
-            index=stress_test_beta_price_vol_df.index,
-            columns=[factor_prices.index[-1]],
-        )
-        stress_test_beta_price_vol_df = pd.concat(
-            [date_vector, stress_test_beta_price_vol_df], axis=1
-        )
+    # Outputs:
+    # shock P&L of every group of every filter for every (price, vol) shock,
+    # the price shock of each position scaled by its equity market beta
+    book = PositionBook.of(position)
+    if beta_index is None:
+        beta_index = BetaIndex.from_factor_betas(factor_betas)
+    # equity market beta of every position row
+    equity_mkt_beta = beta_index.gather(
+        book.position["VaRTicker"].values, "SPX Index")
+    price_shocks, vol_shocks = shock_grid(price_vol_shock_range)
+    stress_dict = group_stress(
+        book, list(filter.keys()), price_shocks, vol_shocks, RISK_FREE_RATE,
+        price_beta=equity_mkt_beta, workers=workers,
+    )
+    stress_test_beta_price_vol_df = pd.DataFrame(
+        stress_dict_by_key(stress_dict, price_vol_shock_range, "pnl"),
+        index=["stress_pnl_beta*price & vol shock"],
+    ).T
+    date_vector = pd.DataFrame(
+        np.repeat(factor_prices.index[-1],
+                  len(stress_test_beta_price_vol_df)),
+        index=stress_test_beta_price_vol_df.index,
+        columns=[factor_prices.index[-1]],
+    )
+    stress_test_beta_price_vol_df = pd.concat(
+        [date_vector, stress_test_beta_price_vol_df], axis=1
+    )
 
     return stress_test_beta_price_vol_df
 
@@ -1237,27 +501,9 @@ def filter_stress_test_beta_price_vol(
 def stress_test_structuring(
     stress_test_df: pd.DataFrame, position: pd.DataFrame, price_vol_shock_range: Dict
 ):
-    position_grouped = position.groupby(["FundName"])
-    fund_list = list(position_grouped.groups.keys())
-    # agg positions by exposure across fund strats
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
+    book = PositionBook.of(position)
+    fund_list = list(book.groups("FundName"))
+    position_agg_exposure = book.agg_exposure
     # convert stress_test_df to % from $ space
     col = stress_test_df.filter(like="stress_").columns
     stress_test_df = stress_test_df[col] / \
@@ -0,0 +1,56 @@
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class BetaIndex:
+    '''
+    integer row index over the factor beta matrix, built once per run.
+    replaces factor_betas.loc[factor_betas["ID"].isin(...)] lookups: gathers
+    cost O(group size) and come back in the order they were asked for
+    '''
+    ids: pd.Index
+    factors: pd.Index
+    values: np.ndarray
+
+    @classmethod
+    def from_factor_betas(cls, factor_betas: pd.DataFrame) -> "BetaIndex":
+        '''build from the "ID" + factor columns frame of Factors.FactorBetas'''
+        betas = factor_betas.drop("ID", axis=1)
+        return cls(
+            ids=pd.Index(factor_betas["ID"].values),
+            factors=pd.Index(betas.columns),
+            values=np.ascontiguousarray(betas.values, dtype=np.float64),
+        )
+
+    def rows(self, tickers) -> np.ndarray:
+        '''beta matrix row of every ticker, raises for tickers without betas'''
+        rows = self.ids.get_indexer(tickers)
+        if (rows < 0).any():
+            missing = np.asarray(tickers)[rows < 0]
+            raise KeyError(f"no factor betas for {sorted(set(missing))}")
+
+        return rows
+
+    def position_rows(self, position: pd.DataFrame) -> np.ndarray:
+        '''beta matrix row of every position row, matched on VaRTicker'''
+        return self.rows(position["VaRTicker"].values)
+
+    def rfid_rows(self, position: pd.DataFrame) -> pd.Series:
+        '''beta matrix row of every RFID'''
+        rfid_ticker = position.groupby("RFID")["VaRTicker"].first()
+        return pd.Series(self.rows(rfid_ticker.values), index=rfid_ticker.index)
+
+    def gather(self, tickers, factor: str = None) -> np.ndarray:
+        '''betas of the tickers, in ticker order; one factor column if given'''
+        rows = self.rows(tickers)
+        if factor is None:
+            return self.values[rows]
+
+        return self.values[rows, self.factors.get_loc(factor)]
@@ -0,0 +1,119 @@
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def return_matrix(X) -> np.ndarray:
+    # returns as a float T x M matrix, a 1-d series as one column
+    a = np.array(X, dtype=float, ndmin=2)
+    if np.ndim(X) < 2:
+        a = a.T
+
+    return a
+
+
+def cumulative_nav(X) -> np.ndarray:
+    # Outputs:
+    # (T + 1) x M uncompounded cumulative NAV of every series, 1 before the
+    # first return
+    a = return_matrix(X)
+
+    return np.cumsum(np.insert(a, 0, 1, axis=0), axis=0)
+
+
+def drawdowns(X) -> np.ndarray:
+    # Outputs:
+    # (T + 1) x M drawdown history of the uncompounded NAV: running peak less
+    # NAV, 0 at a new peak. A NaN return leaves NaN for the rest of its series
+    nav = cumulative_nav(X)
+
+    return np.maximum.accumulate(nav, axis=0) - nav
+
+
+def last_peak_rows(dd: np.ndarray) -> np.ndarray:
+    # (T + 1) x M row of the running peak at every row of a drawdown history
+    rows = np.arange(len(dd))[:, None]
+
+    return np.maximum.accumulate(np.where(dd == 0, rows, 0), axis=0)
+
+
+def last_positive(dd: np.ndarray) -> np.ndarray:
+    # the most recent positive drawdown of every series, NaN where there is
+    # none; still the last drawdown after the series made a new peak
+    positive = dd > 0
+    rows = len(dd) - 1 - np.argmax(positive[::-1], axis=0)
+    last = dd[rows, np.arange(dd.shape[1])]
+
+    return np.where(positive.any(axis=0), last, np.nan)
+
+
+@dataclass
+class DrawdownStats:
+    '''
+    drawdown statistics of M return series. Rows count the NAV history, row
+    0 the start before the first return and row t the NAV after return t;
+    -1 where a row does not exist (no drawdown, not recovered)
+    '''
+    current: np.ndarray
+    maximum: np.ndarray
+    duration: np.ndarray
+    peak: np.ndarray
+    trough: np.ndarray
+    recovery: np.ndarray
+
+    @classmethod
+    def of(cls, X) -> "DrawdownStats":
+        '''all statistics from one drawdown history of the T x M returns'''
+        dd = drawdowns(X)
+        series = np.arange(dd.shape[1])
+        peak_rows = last_peak_rows(dd)
+        # NaN drawdowns only follow a NaN return, so the maximum is taken
+        # over the rows before it; row 0 is never NaN
+        trough = np.nanargmax(dd, axis=0)
+        maximum = dd[trough, series]
+        in_drawdown = maximum > 0
+        recovered = (dd == 0) & (np.arange(len(dd))[:, None] > trough)
+        recovery = np.where(
+            in_drawdown & recovered.any(axis=0), np.argmax(recovered, axis=0), -1)
+
+        return cls(
+            current=dd[-1],
+            maximum=maximum,
+            duration=len(dd) - 1 - peak_rows[-1],
+            peak=np.where(in_drawdown, peak_rows[trough, series], -1),
+            trough=np.where(in_drawdown, trough, -1),
+            recovery=recovery,
+        )
+
+    def to_frame(self, returns: pd.DataFrame) -> pd.DataFrame:
+        # Outputs:
+        # one row per column of returns: current and maximum drawdown, periods
+        # since the last peak and the peak, trough and recovery dates of the
+        # maximum drawdown, taken from the index of returns (NaT for the
+        # start and for rows that do not exist)
+        dates = pd.Index([pd.NaT]).append(pd.Index(returns.index))
+
+        def row_dates(rows: np.ndarray) -> pd.Index:
+            return pd.Index(dates[np.where(rows > 0, rows, 0)]).where(rows > 0)
+
+        return pd.DataFrame(
+            {
+                "Current Drawdown": self.current,
+                "Maximum Drawdown": self.maximum,
+                "Drawdown Duration": self.duration,
+                "Peak Date": row_dates(self.peak),
+                "Trough Date": row_dates(self.trough),
+                "Recovery Date": row_dates(self.recovery),
+            },
+            index=returns.columns,
+        )
+
+
+def drawdown_table(returns: pd.DataFrame) -> pd.DataFrame:
+    # DrawdownStats of every column of a date indexed return frame
+    return DrawdownStats.of(returns.values).to_frame(returns)
@@ -0,0 +1,75 @@
+import logging
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+DECAYS = [0.94, 0.97, 0.99]
+
+
+def ewma_weights(n_obs: int, decays: List[float]) -> np.ndarray:
+    # decays x n_obs weights decay^(n_obs - 1 - t), the newest return weighted 1
+    age = np.arange(n_obs - 1, -1, -1)
+    return np.asarray(decays, dtype=np.float64)[:, None] ** age[None, :]
+
+
+@dataclass
+class EWMACov:
+    '''
+    zero-mean exponentially weighted factor covariance for several decay
+    factors at once, kept as running weighted Gram sums so a new day of
+    returns is folded in with one rank-1 update per decay:
+        gram = decay * gram + r r',  weight_sum = decay * weight_sum + 1
+        cov = gram / weight_sum
+    '''
+    decays: np.ndarray
+    gram: np.ndarray
+    weight_sum: np.ndarray
+    n_obs: int
+
+    @classmethod
+    def from_returns(
+        cls, returns: np.ndarray, decays: List[float] = DECAYS
+    ) -> "EWMACov":
+        '''
+        one weighted Gram product over a T x K return history for every decay;
+        rows with no return at all are skipped, other missing returns count
+        as 0
+        '''
+        returns = np.asarray(returns, dtype=np.float64)
+        returns = returns[~np.isnan(returns).all(axis=1)]
+        returns = np.where(np.isnan(returns), 0, returns)
+        weights = ewma_weights(len(returns), decays)
+        gram = (returns.T[None, :, :] * weights[:, None, :]) @ returns
+
+        return cls(
+            decays=np.asarray(decays, dtype=np.float64),
+            gram=gram,
+            weight_sum=weights.sum(axis=1),
+            n_obs=len(returns),
+        )
+
+    def update(self, returns: np.ndarray) -> "EWMACov":
+        '''fold in one new day (K returns), O(decays x K^2)'''
+        returns = np.where(np.isnan(returns), 0, np.asarray(returns, dtype=np.float64))
+        decays = self.decays[:, None, None]
+        self.gram = decays * self.gram + np.outer(returns, returns)[None, :, :]
+        self.weight_sum = self.decays * self.weight_sum + 1
+        self.n_obs += 1
+
+        return self
+
+    @property
+    def cov(self) -> np.ndarray:
+        # decays x K x K covariance
+        return self.gram / self.weight_sum[:, None, None]
+
+    def cov_for(self, decay: float) -> np.ndarray:
+        matches = np.flatnonzero(np.isclose(self.decays, decay))
+        if not len(matches):
+            raise KeyError(f"no EWMA covariance for decay {decay}")
+
+        return self.gram[matches[0]] / self.weight_sum[matches[0]]
@@ -0,0 +1,107 @@
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.beta_index import BetaIndex
+from legacy.position_book import PositionBook
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+EXPOSURE_COLUMNS = ["Long", "Short", "Gross", "Net"]
+
+
+def stacked_codes(position: PositionBook, filter_list: List[str]) -> np.ndarray:
+    # Outputs:
+    # dimensions x rows group codes offset so every (dimension, group) pair
+    # has its own code; rows without a value for a dimension get -1
+    offset = 0
+    stacked = []
+    for filter_item in filter_list:
+        codes = position.codes(filter_item)
+        stacked.append(np.where(codes >= 0, codes + offset, -1))
+        offset += len(position.groups(filter_item))
+
+    return np.vstack(stacked) if stacked else np.empty((0, len(position.position)), int)
+
+
+def group_exposures(
+    position: PositionBook,
+    filter_list: List[str],
+    scale: np.ndarray = None,
+) -> pd.DataFrame:
+    # Inputs:
+    # position book, grouping columns, optional per row multiplier of the
+    # exposure (e.g. market beta)
+
+    # Outputs:
+    # (dimension, group) indexed Long / Short / Gross / Net $ exposure of
+    # every group of every grouping, groups in groupby order. Rows are long
+    # or short by the sign of their exposure; all groupings are summed in
+    # one bincount over the stacked group codes
+    exposure = position.exposure
+    value = exposure if scale is None else exposure * scale
+    # NaN exposures or multipliers drop out of the sums as in pandas
+    value = np.where(np.isnan(value), 0.0, value)
+    long_value = np.where(exposure > 0, value, 0.0)
+    short_value = np.where(exposure < 0, value, 0.0)
+    codes = stacked_codes(position, filter_list)
+    n_groups = sum(len(position.groups(filter_item)) for filter_item in filter_list)
+    rows = codes >= 0
+    long_exposure = np.bincount(
+        codes[rows], weights=np.broadcast_to(long_value, codes.shape)[rows],
+        minlength=n_groups,
+    )
+    short_exposure = np.bincount(
+        codes[rows], weights=np.broadcast_to(short_value, codes.shape)[rows],
+        minlength=n_groups,
+    )
+    index = pd.MultiIndex.from_tuples(
+        [
+            (filter_item, group)
+            for filter_item in filter_list
+            for group in position.groups(filter_item)
+        ],
+        names=["dimension", "group"],
+    )
+
+    return pd.DataFrame(
+        {
+            "Long": long_exposure,
+            "Short": short_exposure,
+            "Gross": long_exposure + abs(short_exposure),
+            "Net": long_exposure + short_exposure,
+        },
+        index=index,
+        columns=EXPOSURE_COLUMNS,
+    )
+
+
+def group_beta_adj_exposures(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    filter_list: List[str],
+    factor: str = "SPX Index",
+) -> pd.DataFrame:
+    # group_exposures of the exposures times the factor beta of every row
+    betas = beta_index.values[
+        beta_index.position_rows(position.position), beta_index.factors.get_loc(factor)
+    ]
+
+    return group_exposures(position, filter_list, scale=betas)
+
+
+def dimension_exposures(
+    exposures: pd.DataFrame, filter_item: str, label: str, suffix: str = ""
+) -> pd.DataFrame:
+    # the groups of one grouping as a frame indexed by label, group names
+    # followed by suffix
+    frame = exposures.loc[
+        exposures.index.get_level_values("dimension") == filter_item
+    ].droplevel("dimension")
+    frame.index = pd.Index(
+        [f"{group}{suffix}" for group in frame.index], name=label)
+
+    return frame
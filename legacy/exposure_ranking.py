@@ -0,0 +1,112 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from legacy.position_book import PositionBook
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def smallest_rows(key: np.ndarray, n: int) -> np.ndarray:
+    # Outputs:
+    # n x K rows of the n smallest keys of every column, ascending. One
+    # argpartition over the whole matrix picks them in O(rows); only those n
+    # rows are sorted, equal keys in row order. Which of several rows equal
+    # to the n-th key make the cut is up to the partition
+    n_rows, n_cols = key.shape
+    n = min(n, n_rows)
+    if n == 0:
+        return np.empty((0, n_cols), dtype=np.intp)
+    rows = np.argpartition(key, n - 1, axis=0)[:n]
+    order = np.lexsort((rows.T, np.take_along_axis(key, rows, axis=0).T)).T
+
+    return np.take_along_axis(rows, order, axis=0)
+
+
+@dataclass
+class FactorExposureMatrix:
+    '''
+    positions x factors exposure (beta x exposure / NAV) in float64, built
+    once per report and shared by the heat map and the top / bottom
+    contributors of every factor
+    '''
+    names: np.ndarray
+    factors: pd.Index
+    values: np.ndarray
+    exposure: np.ndarray
+
+    @classmethod
+    def from_book(
+        cls,
+        position: PositionBook,
+        factor_betas: pd.DataFrame,
+        factor_names: List[str],
+        firm_NAV: float,
+    ) -> "FactorExposureMatrix":
+        '''
+        rows of the positions with betas in factor_betas order, as the
+        inner merge of the betas with the RFID aggregated exposures
+        '''
+        beta_rows = pd.DataFrame(
+            {"ID": factor_betas["ID"].values, "beta_row": np.arange(len(factor_betas))})
+        merged = pd.merge(
+            beta_rows,
+            position.agg_exposure.rename(columns={"VaRTicker": "ID"})[
+                ["ID", "UnderlierName", "Exposure"]],
+            on=["ID"],
+            how="inner",
+        )
+        betas = factor_betas.drop("ID", axis=1).values.astype(float)
+        exposure = merged["Exposure"].values.astype(float)
+        nav = float(np.ravel(firm_NAV)[0])
+
+        return cls(
+            names=merged["UnderlierName"].values,
+            factors=pd.Index(factor_names),
+            values=betas[merged["beta_row"].values] * exposure[:, None] / nav,
+            exposure=exposure / nav,
+        )
+
+    def ranked_rows(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        # rows of the n largest and the n smallest exposures of every factor,
+        # NaN exposures last
+        top = smallest_rows(np.where(np.isnan(self.values), np.inf, -self.values), n)
+        bottom = smallest_rows(np.where(np.isnan(self.values), np.inf, self.values), n)
+
+        return top, bottom
+
+    def ranked_tables(self, n: int = 10) -> Tuple[List[pd.DataFrame], List[pd.DataFrame]]:
+        # Outputs:
+        # per factor the positions with the n largest and n smallest
+        # exposures: factor exposure ("Exposure") and position exposure
+        # ("FactorExp") as fractions of NAV
+        top, bottom = self.ranked_rows(n)
+        tables = {"Top": [], "Bottom": []}
+        for col, factor_name in enumerate(self.factors):
+            for label, rows in [("Top", top[:, col]), ("Bottom", bottom[:, col])]:
+                tables[label].append(
+                    pd.DataFrame(
+                        {
+                            "Exposure": self.values[rows, col],
+                            "FactorExp": self.exposure[rows],
+                        },
+                        index=pd.Index(self.names[rows], name=f"{factor_name} - {label} {n}"),
+                    )
+                )
+
+        return tables["Top"], tables["Bottom"]
+
+    def heat_map(self) -> pd.DataFrame:
+        # Outputs:
+        # position indexed exposure to every factor, the position exposure
+        # after the first factor; the Equity factor shown as Beta
+        columns = {str(self.factors[0]): self.values[:, 0], "Exposure": self.exposure}
+        for col, factor_name in enumerate(self.factors[1:], start=1):
+            columns.setdefault(str(factor_name), self.values[:, col])
+        heat_map = pd.DataFrame(columns, index=pd.Index(self.names, name="Position"))
+
+        return heat_map.rename(columns={"Equity": "Beta"})
@@ -0,0 +1,128 @@
+import logging
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from legacy.ewma import DECAYS, EWMACov
+from legacy.helper import imply_SMB_GMV
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+EWMA_DECAY = 0.94
+
+
+@dataclass
+class FactorReturns:
+    '''
+    factor log and simple returns built once per report from factor prices,
+    with the RIY less RTY / RAG less RAV spreads implied and the column order
+    of helper.imply_SMB_GMV. Covariance, decay weighted covariance and
+    correlation of the log returns are computed on first use and kept;
+    ewma() gives the RiskMetrics style covariance for a list of decays
+    '''
+    dates: pd.Index
+    columns: pd.Index
+    log_returns: np.ndarray
+    simple_returns: np.ndarray
+    _ewma: Dict[Tuple[float, ...], EWMACov] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_prices(cls, factor_prices: pd.DataFrame) -> "FactorReturns":
+        # returns over factor_prices.iloc[1:], the first row NaN, as the
+        # VaR and beta estimators have always used them
+        prices = factor_prices.iloc[1:, :]
+        log_returns, simple_returns = factor_return_frames(prices)
+
+        return cls(
+            dates=prices.index,
+            columns=log_returns.columns,
+            log_returns=np.ascontiguousarray(log_returns.values, dtype=np.float64),
+            simple_returns=np.ascontiguousarray(
+                simple_returns.values, dtype=np.float64),
+        )
+
+    @classmethod
+    def of(cls, factor_prices: Union[pd.DataFrame, "FactorReturns"]) -> "FactorReturns":
+        '''pass returns through, build them from a factor prices frame'''
+        if isinstance(factor_prices, FactorReturns):
+            return factor_prices
+
+        return cls.from_prices(factor_prices)
+
+    @property
+    def log_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.log_returns, index=self.dates, columns=self.columns)
+
+    @property
+    def simple_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self.simple_returns, index=self.dates, columns=self.columns)
+
+    @cached_property
+    def cov(self) -> pd.DataFrame:
+        return self._frame(_pairwise_cov(self.log_returns))
+
+    @cached_property
+    def decay_cov(self) -> pd.DataFrame:
+        # covariance of the returns scaled by sqrt((1 - decay) * decay^(n - 1)),
+        # n = 1 for the first row, as VaR.decay_cov has always weighted them
+        nn = np.arange(1, len(self.log_returns) + 1)
+        weights = ((1 - EWMA_DECAY) * EWMA_DECAY ** (nn - 1)) ** 0.5
+
+        return self._frame(_pairwise_cov(self.log_returns * weights[:, None]))
+
+    @cached_property
+    def corr(self) -> pd.DataFrame:
+        if _is_complete(self.log_returns):
+            cov = self.cov.values
+            std = np.sqrt(np.diag(cov))
+            return self._frame(cov / np.outer(std, std))
+
+        return self.log_frame.corr()
+
+    def ewma(self, decays: List[float] = DECAYS) -> EWMACov:
+        '''zero-mean EWMA covariance of the log returns for every decay'''
+        key = tuple(decays)
+        if key not in self._ewma:
+            self._ewma[key] = EWMACov.from_returns(self.log_returns, decays)
+
+        return self._ewma[key]
+
+    def ewma_covs(self, decays: List[float] = DECAYS) -> Dict[float, pd.DataFrame]:
+        ewma = self.ewma(decays)
+        return {decay: self._frame(cov) for decay, cov in zip(decays, ewma.cov)}
+
+    def _frame(self, matrix: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+
+def factor_return_frames(
+    factor_prices: pd.DataFrame,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # log and simple returns of consecutive price rows (first row NaN), with
+    # the SMB / GMV spreads implied
+    ratio = factor_prices / factor_prices.shift(1)
+
+    return imply_SMB_GMV(np.log(ratio)), imply_SMB_GMV(ratio - 1)
+
+
+def _complete_rows(returns: np.ndarray) -> np.ndarray:
+    # drop the rows with no return at all (the leading shift row)
+    return returns[~np.isnan(returns).all(axis=1)]
+
+
+def _is_complete(returns: np.ndarray) -> bool:
+    return not np.isnan(_complete_rows(returns)).any()
+
+
+def _pairwise_cov(returns: np.ndarray) -> np.ndarray:
+    # DataFrame.cov (pairwise complete, ddof=1), in one BLAS pass when no
+    # return is missing
+    if _is_complete(returns):
+        return np.cov(_complete_rows(returns), rowvar=False)
+
+    return pd.DataFrame(returns).cov().values
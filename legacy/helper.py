@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 import logging
+from typing import Dict, Tuple, Union
+from scipy.special import ndtr
 from scipy.stats import expon, norm
 
 logging.basicConfig(level=logging.INFO)
@@ -52,9 +54,86 @@ def historical_series(risk_factors: pd.DataFrame, exposure: np.ndarray, name: st
     return hist_ret
 
 
+CALL_FLAGS = ["Call", "C", "c"]
+PUT_FLAGS = ["Put", "P", "p"]
+
+
+def put_call_sign(type) -> np.ndarray:
+    # +1 for calls, -1 for puts, NaN for anything else
+    type = np.asarray(type)
+    return np.where(
+        np.isin(type, CALL_FLAGS), 1.0, np.where(np.isin(type, PUT_FLAGS), -1.0, np.nan)
+    )
+
+
+def black_scholes(
+    S: np.ndarray,
+    X: np.ndarray,
+    T: np.ndarray,
+    Vol: np.ndarray,
+    rf: float,
+    sign: np.ndarray,
+    greeks: bool = False,
+) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    # Inputs:
+    # spot, strike, years to expiry, vol and put_call_sign as arrays that
+    # broadcast against each other, e.g. positions x 1 x 1 option terms against
+    # 1 x price shocks x vol shocks spots and vols
+
+    # Outputs:
+    # prices and, with greeks=True, delta, gamma, vega (per 1.00 vol) and theta
+    # (per year). Expired or zero-vol options are priced at the intrinsic value
+    # of the forward, the limit of the formula
+    S, X, T, Vol, sign = np.broadcast_arrays(
+        *(np.asarray(arr, dtype=np.float64) for arr in (S, X, T, Vol, sign))
+    )
+    sqrt_T = np.sqrt(T)
+    vol_sqrt_T = Vol * sqrt_T
+    discount_X = X * np.exp(-rf * T)
+    degenerate = vol_sqrt_T <= 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(S / X) + (rf + Vol**2 / 2) * T) / vol_sqrt_T
+        # d1, d2 -> +/-inf as vol * sqrt(T) -> 0, by the moneyness of the forward
+        d1 = np.where(degenerate, np.where(S > discount_X, np.inf, -np.inf), d1)
+        d2 = np.where(degenerate, d1, d1 - vol_sqrt_T)
+    N_d1 = ndtr(sign * d1)
+    N_d2 = ndtr(sign * d2)
+    price = sign * (S * N_d1 - discount_X * N_d2)
+    if not greeks:
+        return price
+
+    pdf_d1 = np.exp(-0.5 * np.where(degenerate, 0, d1) ** 2) / np.sqrt(2 * np.pi)
+    pdf_d1 = np.where(degenerate, 0, pdf_d1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = np.where(degenerate, 0, pdf_d1 / (S * vol_sqrt_T))
+        theta_decay = np.where(degenerate, 0, S * pdf_d1 * Vol / (2 * sqrt_T))
+    greeks_dict = {
+        "Delta": sign * N_d1,
+        "Gamma": gamma,
+        "Vega": S * pdf_d1 * sqrt_T,
+        "Theta": -theta_decay - sign * rf * discount_X * N_d2,
+    }
+
+    return price, greeks_dict
+
+
 def option_price(
     S: pd.Series, X: pd.Series, T: pd.Series, Vol: pd.Series, rf: float, type: pd.Series
+) -> np.ndarray:
+    return black_scholes(
+        S=np.asarray(S, dtype=np.float64),
+        X=np.asarray(X, dtype=np.float64),
+        T=np.asarray(T, dtype=np.float64),
+        Vol=np.asarray(Vol, dtype=np.float64),
+        rf=rf,
+        sign=put_call_sign(type),
+    )
+
+
+def option_price_iterative(
+    S: pd.Series, X: pd.Series, T: pd.Series, Vol: pd.Series, rf: float, type: pd.Series
 ):
+    # row by row reference for option_price
     price_list = []
     for ix in range(0, len(S)):
         d1 = (
@@ -0,0 +1,136 @@
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from legacy.position_book import PositionBook
+from legacy.security_class import is_option
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+# report table: (index label, {column: measure}) in sheet column order
+OPTIONS_TABLES = {
+    "delta_adj_exposure": (
+        "Option Exposure",
+        {
+            "Long Calls": "long_call_exposure",
+            "Short Calls": "short_call_exposure",
+            "long Puts": "long_put_exposure",
+            "Short Puts": "short_put_exposure",
+        },
+    ),
+    "delta1_exposure": (
+        "Option Notional",
+        {
+            "Long Calls": "long_call_delta1",
+            "Short Calls": "short_call_delta1",
+            "long Puts": "long_put_delta1",
+            "Short Puts": "short_put_delta1",
+        },
+    ),
+    "premium": (
+        "Premium",
+        {
+            "Call_Premium": "call_premium",
+            "Call_Intrinsic": "call_intrinsic",
+            "Put_Premium": "put_premium",
+            "Put_Intrinsic": "put_intrinsic",
+        },
+    ),
+    "greek_sensitivities": (
+        "Greek Sensitivity",
+        {
+            "Delta_Exposure": "option_exposure",
+            "Dollar_Gamma_1%": "dollar_gamma",
+            "Dollar_Vega_1%": "dollar_vega",
+            "Dollar_Theta_1D": "dollar_theta",
+        },
+    ),
+}
+
+
+def _masked(mask: np.ndarray, value: np.ndarray) -> np.ndarray:
+    # value where mask holds, 0 elsewhere; NaN values drop out of the sums as
+    # in pandas
+    return np.where(mask & ~np.isnan(value), value, 0.0)
+
+
+def option_measures(position: pd.DataFrame) -> pd.DataFrame:
+    # Outputs:
+    # one row per position with an expiry: FundName, Expiry and every
+    # options table measure of the row, 0 where the row does not count
+    # towards it, and whether it is an option. Rows are tagged call / put,
+    # long / short and option once
+    rows = position.loc[position["FundName"].notna() & position["Expiry"].notna()]
+    put_call = rows["PutCall"]
+    call = put_call.str.contains("call", na=False, case=False).values
+    put = put_call.str.contains("put", na=False, case=False).values
+    option = is_option(rows).values
+    exposure = rows["Exposure"].values
+    long, short = exposure > 0, exposure < 0
+    delta1 = (1 / abs(rows["Delta"].values)) * exposure
+    premium = (
+        rows["Quantity"].values * rows["MarketPrice"].values
+        * rows["PX_POS_MULT_FACTOR"].values
+    )
+    undl_price, strike = rows["UndlPrice"].values, rows["Strike"].values
+    # NaN prices or strikes keep a NaN intrinsic value, as the 0 floor only
+    # applies to negative values
+    call_intrinsic = np.where(undl_price - strike < 0, 0, undl_price - strike)
+    put_intrinsic = np.where(strike - undl_price < 0, 0, strike - undl_price)
+    measures = {
+        "long_call_exposure": _masked(long & call, exposure),
+        "short_call_exposure": _masked(short & call, exposure),
+        "long_put_exposure": _masked(long & put, exposure),
+        "short_put_exposure": _masked(short & put, exposure),
+        "long_call_delta1": _masked(long & call, delta1),
+        "short_call_delta1": _masked(short & call, delta1),
+        "long_put_delta1": _masked(long & put, delta1),
+        "short_put_delta1": _masked(short & put, delta1),
+        "call_premium": _masked(call, premium),
+        "call_intrinsic": _masked(call, call_intrinsic),
+        "put_premium": _masked(put, premium),
+        "put_intrinsic": _masked(put, put_intrinsic),
+        "option_exposure": _masked(option, exposure),
+        "dollar_gamma": _masked(option, rows["Gamma$"].values * exposure),
+        "dollar_vega": _masked(option, rows["Vega"].values * exposure),
+        "dollar_theta": _masked(option, rows["Theta"].values * exposure),
+        "n_options": option.astype(float),
+    }
+
+    return pd.DataFrame(
+        {"FundName": rows["FundName"].values, "Expiry": rows["Expiry"].values, **measures},
+        index=rows.index,
+    )
+
+
+def fund_expiry_options(position: PositionBook) -> pd.DataFrame:
+    # Outputs:
+    # (FundName, Expiry) indexed sums of every options measure, funds and
+    # expiries sorted as groupby; only pairs holding at least one option
+    sums = option_measures(position.position).groupby(["FundName", "Expiry"]).sum()
+
+    return sums.loc[sums.pop("n_options") > 0]
+
+
+def options_tables(position: PositionBook) -> Dict[str, pd.DataFrame]:
+    # Outputs:
+    # the delta adjusted exposure, delta 1 exposure, premium and greek
+    # sensitivity tables of the Options&Stress sheet, one row per (fund,
+    # expiry) pair in fund order, indexed by the expiry date, from one
+    # grouped sum over the option rows
+    sums = fund_expiry_options(position)
+    expiry = pd.Index(
+        pd.to_datetime(sums.index.get_level_values("Expiry")).strftime("%Y-%m-%d"))
+
+    return {
+        name: pd.DataFrame(
+            sums[list(columns.values())].values,
+            index=expiry.rename(label),
+            columns=list(columns),
+        )
+        for name, (label, columns) in OPTIONS_TABLES.items()
+    }
+
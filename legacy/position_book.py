@@ -0,0 +1,153 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from legacy.security_class import (
+    SECURITY_CLASS_COLUMN,
+    classify_security_type,
+    is_non_option,
+    is_option,
+)
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+# every grouping the risk report is broken down by
+GROUP_DIMENSIONS = [
+    "VaRTicker",
+    "FundName",
+    "Sector",
+    "Industry",
+    "Country",
+    "MarketCap.1",
+]
+NUMERIC_COLUMNS = [
+    "MarketValue",
+    "Exposure",
+    "Quantity",
+    "FXRate",
+    "MarketPrice",
+    "PX_POS_MULT_FACTOR",
+    "UndlPrice",
+    "Strike",
+    "MtyYears",
+    "IVOL_TM",
+    "Delta",
+    "Gamma$",
+    "Vega",
+    "Theta",
+]
+
+
+@dataclass
+class PositionBook:
+    '''
+    positions preprocessed once per report and shared by all risk functions:
+    numeric columns cast to float, security class resolved once into the
+    SecurityClass column, exposures aggregated by RFID and group codes of
+    every filter dimension
+    '''
+    position: pd.DataFrame
+    agg_exposure: pd.DataFrame
+    group_codes: Dict[str, np.ndarray]
+    group_names: Dict[str, pd.Index]
+    _membership: Dict[str, sparse.csr_matrix] = field(
+        default_factory=dict, repr=False)
+
+    @classmethod
+    def from_positions(
+        cls, position: pd.DataFrame, dimensions: List[str] = GROUP_DIMENSIONS
+    ) -> "PositionBook":
+        '''preprocess a positions frame with one row per position'''
+        position = position.copy()
+        for col in NUMERIC_COLUMNS:
+            if col in position.columns:
+                position[col] = position[col].astype(float)
+        position[SECURITY_CLASS_COLUMN] = classify_security_type(
+            position["SECURITY_TYP"])
+        # agg positions by exposure across fund strats
+        agg_exposure = (
+            position.groupby(
+                [
+                    "RFID",
+                ]
+            )
+            .agg(
+                {
+                    "TradeDate": "first",
+                    "FundName": "first",
+                    "UnderlierName": "first",
+                    "VaRTicker": "first",
+                    "MarketValue": "sum",
+                    "Exposure": "sum",
+                }
+            )
+            .reset_index()
+        )
+        book = cls(
+            position=position,
+            agg_exposure=agg_exposure,
+            group_codes={},
+            group_names={},
+        )
+        for filter_item in dimensions:
+            book.codes(filter_item)
+
+        return book
+
+    @classmethod
+    def of(cls, position: Union[pd.DataFrame, "PositionBook"]) -> "PositionBook":
+        '''pass a book through, build one from a positions frame'''
+        if isinstance(position, PositionBook):
+            return position
+
+        return cls.from_positions(position)
+
+    @property
+    def exposure(self) -> np.ndarray:
+        return self.position["Exposure"].values
+
+    @property
+    def option_mask(self) -> pd.Series:
+        return is_option(self.position)
+
+    @property
+    def non_option_mask(self) -> pd.Series:
+        return is_non_option(self.position)
+
+    def codes(self, filter_item: str) -> np.ndarray:
+        '''group code of every row (-1 for no value), groups sorted as groupby'''
+        if filter_item not in self.group_codes:
+            codes, groups = pd.factorize(self.position[filter_item], sort=True)
+            self.group_codes[filter_item] = codes
+            self.group_names[filter_item] = pd.Index(groups, name=filter_item)
+
+        return self.group_codes[filter_item]
+
+    def groups(self, filter_item: str) -> pd.Index:
+        self.codes(filter_item)
+        return self.group_names[filter_item]
+
+    def membership(self, filter_item: str) -> sparse.csr_matrix:
+        '''sparse groups x rows indicator matrix of a grouping'''
+        if filter_item not in self._membership:
+            codes = self.codes(filter_item)
+            rows = np.flatnonzero(codes >= 0)
+            self._membership[filter_item] = sparse.csr_matrix(
+                (np.ones(len(rows)), (codes[rows], rows)),
+                shape=(len(self.groups(filter_item)), len(codes)),
+            )
+
+        return self._membership[filter_item]
+
+
+def position_frame(position: Union[pd.DataFrame, PositionBook]) -> pd.DataFrame:
+    '''the positions frame behind a book, or the frame itself'''
+    if isinstance(position, PositionBook):
+        return position.position
+
+    return position
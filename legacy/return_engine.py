@@ -0,0 +1,183 @@
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from legacy.drawdown_engine import drawdowns, last_positive
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+ANNUALIZATION_FACTOR = 252
+
+# PNLReport rows in sheet order
+RETURN_STATISTICS = [
+    "Last Day Return",
+    "MTD Return",
+    "YTD Return",
+    "Cumulative Return",
+    "Annualized Return",
+    "Daily Volatility",
+    "Annualized Volatility",
+    "Sharpe Ratio",
+    "Downside Deviation",
+    "Sortino Ratio",
+    "Up Days",
+    "Down Days",
+    "Largest Up Day",
+    "Largest Down Day",
+    "Current Drawdown",
+    "Maximum Drawdown",
+    "Return over Drawdown (CALMAR)",
+]
+COMPARATIVE_STATISTICS = ["Beta", "Correlation", "Up Capture", "Down Capture"]
+
+
+def fund_returns(AUM: pd.DataFrame) -> pd.DataFrame:
+    # Outputs:
+    # PeriodEndDate x Fund daily returns of the NAV file: book P&L over the
+    # fund's end NAV of the previous date, as NAV_clean computes the firm
+    # return. Returns of a fund's first date or of 100% and more are NaN
+    dates = pd.to_datetime(AUM["PeriodEndDate"]).dt.strftime("%Y-%m-%d")
+    books = (
+        AUM.assign(PeriodEndDate=dates)
+        .groupby(["PeriodEndDate", "Fund"])[["DailyBookPL", "EndBookNAV"]]
+        .sum()
+        .unstack("Fund")
+        .astype(float)
+    )
+    returns = books["DailyBookPL"] / books["EndBookNAV"].shift(1)
+
+    return returns.where(abs(returns) < 1)
+
+
+def _nanstd(values: np.ndarray) -> np.ndarray:
+    # population standard deviation of every column over its non NaN values
+    count = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(values, axis=0) / count
+        return np.sqrt(np.nansum((values - mean) ** 2, axis=0) / count)
+
+
+def _growth(values: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+    # compounded 1 + return of every column over rows (all rows by default),
+    # NaN returns skipped, NaN where a column has no return in rows
+    if rows is not None:
+        values = np.where(rows[:, None], values, np.nan)
+    growth = np.nanprod(1 + values, axis=0)
+
+    return np.where((~np.isnan(values)).any(axis=0), growth, np.nan)
+
+
+def return_statistics(returns: pd.DataFrame, downside_of: str = None) -> pd.DataFrame:
+    # Inputs:
+    # date indexed daily returns, one column per series (funds, benchmarks);
+    # downside_of names the column whose negative days the Downside Deviation
+    # is taken over, each column's own by default
+
+    # Outputs:
+    # RETURN_STATISTICS x columns, every statistic a column-wise reduction of
+    # the whole return matrix. Month and year to date run to the last date;
+    # drawdowns count a missing return as flat
+    values = returns.values.astype(float)
+    dates = pd.to_datetime(returns.index)
+    month = (dates.year == dates[-1].year) & (dates.month == dates[-1].month)
+    year = dates.year == dates[-1].year
+    growth = _growth(values)
+    observations = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        annualized_return = growth ** (ANNUALIZATION_FACTOR / observations) - 1
+    volatility = _nanstd(values)
+    annualized_volatility = volatility * np.sqrt(ANNUALIZATION_FACTOR)
+    downside = (
+        values < 0 if downside_of is None
+        else np.broadcast_to(returns[downside_of].values[:, None] < 0, values.shape)
+    )
+    annualized_downside = _nanstd(np.where(values < 0, values, np.nan)) * np.sqrt(
+        ANNUALIZATION_FACTOR)
+    dd = drawdowns(np.where(np.isnan(values), 0, values))
+    max_drawdown = dd.max(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        statistics = {
+            "Last Day Return": values[-1],
+            "MTD Return": _growth(values, month) - 1,
+            "YTD Return": _growth(values, year) - 1,
+            "Cumulative Return": growth - 1,
+            "Annualized Return": annualized_return,
+            "Daily Volatility": volatility,
+            "Annualized Volatility": annualized_volatility,
+            "Sharpe Ratio": annualized_return / annualized_volatility,
+            "Downside Deviation": _nanstd(np.where(downside, values, np.nan)),
+            "Sortino Ratio": annualized_return / annualized_downside,
+            "Up Days": (values > 0).sum(axis=0),
+            "Down Days": (values < 0).sum(axis=0),
+            "Largest Up Day": np.fmax.reduce(values, axis=0),
+            "Largest Down Day": np.fmin.reduce(values, axis=0),
+            "Current Drawdown": last_positive(dd),
+            "Maximum Drawdown": max_drawdown,
+            "Return over Drawdown (CALMAR)": annualized_return / max_drawdown,
+        }
+
+    return pd.DataFrame(
+        np.vstack([statistics[name] for name in RETURN_STATISTICS]).astype(float),
+        index=pd.Index(RETURN_STATISTICS, name="Return Analysis"),
+        columns=returns.columns,
+    )
+
+
+def comparative_statistics(
+    returns: pd.DataFrame, benchmarks: pd.DataFrame
+) -> pd.DataFrame:
+    # Inputs:
+    # date indexed daily returns of the series and of the benchmarks, on the
+    # same dates
+
+    # Outputs:
+    # (COMPARATIVE_STATISTICS, benchmark) x columns of returns: beta and
+    # correlation over the dates both have a return, up (down) capture as the
+    # compounded return over the benchmark's up (down) days relative to the
+    # benchmark's. All series are reduced at once for each benchmark
+    values = returns.values.astype(float)
+    rows = []
+    for benchmark in benchmarks.columns:
+        bench = benchmarks[benchmark].values.astype(float)
+        both = ~np.isnan(values) & ~np.isnan(bench)[:, None]
+        count = both.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            series = np.where(both, values, 0.0)
+            bench_rows = np.where(both, bench[:, None], 0.0)
+            series_dev = np.where(both, series - series.sum(axis=0) / count, 0.0)
+            bench_dev = np.where(both, bench_rows - bench_rows.sum(axis=0) / count, 0.0)
+            cov = (series_dev * bench_dev).sum(axis=0) / count
+            bench_var = (bench_dev ** 2).sum(axis=0) / count
+            series_var = (series_dev ** 2).sum(axis=0) / count
+            up, down = bench > 0, bench < 0
+            rows.extend(
+                [
+                    cov / bench_var,
+                    cov / np.sqrt(series_var * bench_var),
+                    (_growth(values, up) - 1) / (_growth(bench[:, None], up) - 1),
+                    (_growth(values, down) - 1) / (_growth(bench[:, None], down) - 1),
+                ]
+            )
+    index = pd.MultiIndex.from_tuples(
+        [
+            (statistic, benchmark)
+            for benchmark in benchmarks.columns
+            for statistic in COMPARATIVE_STATISTICS
+        ],
+        names=["Comparative Statistics", "Benchmark"],
+    )
+    statistics = pd.DataFrame(np.vstack(rows), index=index, columns=returns.columns)
+
+    return statistics.reindex(
+        pd.MultiIndex.from_product(
+            [COMPARATIVE_STATISTICS, list(benchmarks.columns)], names=index.names))
+
+
+def benchmark_returns(factor_prices: pd.DataFrame, benchmarks: List[str]) -> pd.DataFrame:
+    # daily returns of the benchmark price columns
+    prices = factor_prices[benchmarks].astype(float)
+
+    return prices / prices.shift(1) - 1
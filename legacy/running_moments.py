@@ -0,0 +1,301 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from legacy.factor_returns import FactorReturns, factor_return_frames
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+SUM_FIELDS = [
+    "n_pair", "sum_x", "sum_y", "sum_xy",
+    "n_factor", "sum_f", "sum_ff",
+    "n_cov", "sum_a", "sum_b", "sum_ab",
+]
+
+
+def _pairwise_sums(
+    x: np.ndarray, y: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # T x N and T x K returns (NaN = missing) -> N x K pair counts and
+    # pairwise-complete sums of x, y and xy
+    x_valid = ~np.isnan(x)
+    y_valid = ~np.isnan(y)
+    x0 = np.where(x_valid, x, 0.0)
+    y0 = np.where(y_valid, y, 0.0)
+    x_mask = x_valid.astype(float)
+    y_mask = y_valid.astype(float)
+
+    return x_mask.T @ y_mask, x0.T @ y_mask, x_mask.T @ y0, x0.T @ y0
+
+
+def _pairwise_cov(
+    n: np.ndarray, sum_x: np.ndarray, sum_y: np.ndarray, sum_xy: np.ndarray
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sum_xy - sum_x * sum_y / n) / (n - 1)
+    cov[n < 2] = np.nan
+
+    return cov
+
+
+@dataclass
+class RunningMoments:
+    '''
+    running sums behind the factor betas (Factors.FactorBetas) and factor
+    covariance (VaR.matrix_cov), so a new trading day is folded in with
+    O(positions x factors) work instead of a pass over the whole price
+    history. With a window, the oldest day is subtracted once the window is
+    full. Betas: pairwise sums of position (x) and factor (y) simple returns
+    in excess of LD12TRUU, over the factor variance. Covariance: pairwise
+    sums of factor log returns (a, b)
+    '''
+    dates: pd.Index
+    position_ids: pd.Index
+    factor_ids: pd.Index
+    window: Optional[int]
+    n_pair: np.ndarray
+    sum_x: np.ndarray
+    sum_y: np.ndarray
+    sum_xy: np.ndarray
+    n_factor: np.ndarray
+    sum_f: np.ndarray
+    sum_ff: np.ndarray
+    n_cov: np.ndarray
+    sum_a: np.ndarray
+    sum_b: np.ndarray
+    sum_ab: np.ndarray
+    # return rows inside the window: (position excess, factor excess, log)
+    history: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = field(
+        default_factory=list, repr=False)
+
+    @classmethod
+    def from_prices(
+        cls,
+        factor_prices: pd.DataFrame,
+        position_prices: pd.DataFrame,
+        window: Optional[int] = None,
+    ) -> "RunningMoments":
+        '''full recompute over the price history, returns as FactorBetas'''
+        factor_returns = FactorReturns.from_prices(factor_prices)
+        position_returns = (
+            position_prices.iloc[1:,] / position_prices.iloc[1:,].shift(1)
+        ) - 1
+        position_returns = position_returns.reindex(factor_returns.dates)
+
+        return cls.from_returns(
+            factor_returns.dates,
+            position_prices.columns,
+            factor_returns.columns,
+            *_excess_returns(
+                position_returns.values.astype(float),
+                factor_returns.simple_returns,
+            ),
+            factor_returns.log_returns,
+            window=window,
+        )
+
+    @classmethod
+    def from_returns(
+        cls,
+        dates: pd.Index,
+        position_ids: pd.Index,
+        factor_ids: pd.Index,
+        position_excess: np.ndarray,
+        factor_excess: np.ndarray,
+        factor_log: np.ndarray,
+        window: Optional[int] = None,
+    ) -> "RunningMoments":
+        if window is not None:
+            dates = dates[-window:]
+            position_excess = position_excess[-window:]
+            factor_excess = factor_excess[-window:]
+            factor_log = factor_log[-window:]
+        factor_valid = ~np.isnan(factor_excess)
+        n_pair, sum_x, sum_y, sum_xy = _pairwise_sums(position_excess, factor_excess)
+        n_cov, sum_a, sum_b, sum_ab = _pairwise_sums(factor_log, factor_log)
+        moments = cls(
+            dates=pd.Index(dates),
+            position_ids=pd.Index(position_ids),
+            factor_ids=pd.Index(factor_ids),
+            window=window,
+            n_pair=n_pair,
+            sum_x=sum_x,
+            sum_y=sum_y,
+            sum_xy=sum_xy,
+            n_factor=factor_valid.sum(axis=0).astype(float),
+            sum_f=np.where(factor_valid, factor_excess, 0).sum(axis=0),
+            sum_ff=np.where(factor_valid, factor_excess**2, 0).sum(axis=0),
+            n_cov=n_cov,
+            sum_a=sum_a,
+            sum_b=sum_b,
+            sum_ab=sum_ab,
+        )
+        if window is not None:
+            moments.history = list(zip(position_excess, factor_excess, factor_log))
+
+        return moments
+
+    def add(
+        self,
+        date,
+        position_excess: np.ndarray,
+        factor_excess: np.ndarray,
+        factor_log: np.ndarray,
+    ):
+        '''fold in one day of returns, dropping the oldest one past the window'''
+        self._accumulate(position_excess, factor_excess, factor_log, 1.0)
+        self.dates = self.dates.append(pd.Index([date]))
+        if self.window is None:
+            return
+        self.history.append((position_excess, factor_excess, factor_log))
+        if len(self.history) > self.window:
+            self._accumulate(*self.history.pop(0), -1.0)
+            self.dates = self.dates[1:]
+
+    def update(
+        self, factor_prices: pd.DataFrame, position_prices: pd.DataFrame
+    ) -> int:
+        '''
+        fold in every price row after the last date of the state; returns the
+        number of days added. Raises KeyError when the positions or factors
+        differ from the state, which then needs a full recompute
+        '''
+        if not position_prices.columns.equals(self.position_ids):
+            raise KeyError("positions differ from the running moments state")
+        new_dates = factor_prices.index[factor_prices.index > self.dates[-1]]
+        start = factor_prices.index.get_loc(self.dates[-1])
+        for offset, date in enumerate(new_dates):
+            rows = factor_prices.index[start + offset: start + offset + 2]
+            factor_log, factor_simple = factor_return_frames(factor_prices.loc[rows])
+            if not factor_log.columns.equals(self.factor_ids):
+                raise KeyError("factors differ from the running moments state")
+            day_prices = position_prices.reindex(rows).values.astype(float)
+            position_excess, factor_excess = _excess_returns(
+                day_prices[1:] / day_prices[:1] - 1,
+                factor_simple.values[1:],
+            )
+            self.add(date, position_excess[0], factor_excess[0], factor_log.values[1])
+
+        return len(new_dates)
+
+    def _accumulate(
+        self,
+        position_excess: np.ndarray,
+        factor_excess: np.ndarray,
+        factor_log: np.ndarray,
+        sign: float,
+    ):
+        # rank-1 update (sign 1) or downdate (sign -1) of every sum
+        x_valid = ~np.isnan(position_excess)
+        y_valid = ~np.isnan(factor_excess)
+        x0 = np.where(x_valid, position_excess, 0.0)
+        y0 = np.where(y_valid, factor_excess, 0.0)
+        self.n_pair += sign * np.outer(x_valid, y_valid)
+        self.sum_x += sign * np.outer(x0, y_valid)
+        self.sum_y += sign * np.outer(x_valid, y0)
+        self.sum_xy += sign * np.outer(x0, y0)
+        self.n_factor += sign * y_valid
+        self.sum_f += sign * y0
+        self.sum_ff += sign * y0**2
+        a_valid = ~np.isnan(factor_log)
+        a0 = np.where(a_valid, factor_log, 0.0)
+        self.n_cov += sign * np.outer(a_valid, a_valid)
+        self.sum_a += sign * np.outer(a0, a_valid)
+        self.sum_b += sign * np.outer(a_valid, a0)
+        self.sum_ab += sign * np.outer(a0, a0)
+
+    def betas(self) -> pd.DataFrame:
+        '''"ID" + factor columns frame laid out as Factors.FactorBetas'''
+        cov = _pairwise_cov(self.n_pair, self.sum_x, self.sum_y, self.sum_xy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_f = self.sum_f / self.n_factor
+            factor_var = self.sum_ff / self.n_factor - mean_f**2
+            betas = cov / factor_var[None, :]
+        beta_factors_df = pd.DataFrame(
+            betas,
+            columns=self.factor_ids[1:],
+            index=np.repeat(self.dates[-1], len(self.position_ids)),
+        )
+        beta_factors_df.insert(0, "ID", self.position_ids.values)
+
+        return beta_factors_df
+
+    def cov(self) -> pd.DataFrame:
+        '''factor log return covariance laid out as VaR.matrix_cov'''
+        return pd.DataFrame(
+            _pairwise_cov(self.n_cov, self.sum_a, self.sum_b, self.sum_ab),
+            index=self.factor_ids,
+            columns=self.factor_ids,
+        )
+
+    def save(self, path: str):
+        history = {}
+        if self.history:
+            for ix, name in enumerate(["history_x", "history_y", "history_log"]):
+                history[name] = np.stack([row[ix] for row in self.history])
+        np.savez(
+            path,
+            dates=np.asarray(self.dates, dtype=str),
+            position_ids=np.asarray(self.position_ids, dtype=str),
+            factor_ids=np.asarray(self.factor_ids, dtype=str),
+            window=-1 if self.window is None else self.window,
+            **{name: getattr(self, name) for name in SUM_FIELDS},
+            **history,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RunningMoments":
+        with np.load(path) as state:
+            window = int(state["window"])
+            moments = cls(
+                dates=pd.Index(state["dates"].astype(object)),
+                position_ids=pd.Index(state["position_ids"].astype(object)),
+                factor_ids=pd.Index(state["factor_ids"].astype(object)),
+                window=None if window < 0 else window,
+                **{name: state[name] for name in SUM_FIELDS},
+            )
+            if "history_x" in state:
+                moments.history = list(
+                    zip(state["history_x"], state["history_y"], state["history_log"])
+                )
+
+        return moments
+
+
+def _excess_returns(
+    position_returns: np.ndarray, factor_returns: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    # position returns and factor returns (bar the first) in excess of the
+    # STerm Treas, the first factor column
+    rf_returns = factor_returns[:, :1]
+
+    return position_returns - rf_returns, factor_returns[:, 1:] - rf_returns
+
+
+def running_moments(
+    path: str,
+    factor_prices: pd.DataFrame,
+    position_prices: pd.DataFrame,
+    window: Optional[int] = None,
+) -> RunningMoments:
+    # Outputs:
+    # the moments state persisted at path brought up to the last price row,
+    # rebuilt from the full history when there is none or it no longer fits
+    # the book (new positions, factors or window); saved back to path
+    moments = None
+    try:
+        moments = RunningMoments.load(path)
+        if moments.window != window:
+            raise KeyError(f"state window {moments.window} is not {window}")
+        added = moments.update(factor_prices, position_prices)
+        LOGGER.info(f"running moments: added {added} day(s) to {path}")
+    except (OSError, KeyError) as err:
+        LOGGER.info(f"running moments: full recompute ({err})")
+        moments = RunningMoments.from_prices(factor_prices, position_prices, window)
+    moments.save(path)
+
+    return moments
@@ -0,0 +1,62 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+OPTION = "Option"
+NON_OPTION = "NonOption"
+OTHER = "Other"
+SECURITY_CLASSES = [OPTION, NON_OPTION, OTHER]
+SECURITY_CLASS_COLUMN = "SecurityClass"
+
+NON_OPTION_PATTERN = "|".join(
+    ["fixed", "future", "public", "prefer", "common", "reit", "fund", "mlp", "adr"]
+)
+OPTION_PATTERN = "|".join(["call", "option", "put"])
+
+
+def classify_security_type(security_type: pd.Series) -> pd.Series:
+    # Inputs:
+    # SECURITY_TYP column of the positions
+
+    # Outputs:
+    # categorical security class of every row. The patterns are matched once
+    # per distinct security type, not once per row; a type matching both
+    # patterns (e.g. a fund option) is an option
+    start = time.perf_counter()
+    types = pd.Series(security_type.dropna().unique())
+    security_class = np.select(
+        [
+            types.str.contains(OPTION_PATTERN, case=False).values,
+            types.str.contains(NON_OPTION_PATTERN, case=False).values,
+        ],
+        [OPTION, NON_OPTION],
+        default=OTHER,
+    )
+    class_map = dict(zip(types, security_class))
+    classified = pd.Series(
+        pd.Categorical(
+            security_type.map(class_map).fillna(OTHER), categories=SECURITY_CLASSES
+        ),
+        index=security_type.index,
+        name=SECURITY_CLASS_COLUMN,
+    )
+    LOGGER.info(
+        f"classified {len(types)} security types in "
+        f"{1e3 * (time.perf_counter() - start):.1f}ms: "
+        f"{classified.value_counts().to_dict()}"
+    )
+
+    return classified
+
+
+def is_option(position: pd.DataFrame) -> pd.Series:
+    return position[SECURITY_CLASS_COLUMN] == OPTION
+
+
+def is_non_option(position: pd.DataFrame) -> pd.Series:
+    return position[SECURITY_CLASS_COLUMN] == NON_OPTION
@@ -0,0 +1,149 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class SharedArray:
+    '''
+    picklable handle of a read-only array published in shared memory, so
+    worker processes map it instead of receiving a pickled copy
+    '''
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @classmethod
+    def publish(cls, array: np.ndarray) -> Tuple["SharedArray", shared_memory.SharedMemory]:
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+        return cls(shm.name, array.shape, array.dtype.str), shm
+
+    def attach(self) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+        shm = shared_memory.SharedMemory(name=self.name)
+        array = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+        array.flags.writeable = False
+
+        return shm, array
+
+
+def shard_ranges(weights: np.ndarray, n_shards: int) -> List[Tuple[int, int]]:
+    # contiguous [start, stop) row ranges with about equal total weight
+    n_rows = len(weights)
+    n_shards = max(1, min(n_shards, n_rows))
+    cum_weight = np.cumsum(weights, dtype=float)
+    targets = cum_weight[-1] * np.arange(1, n_shards) / n_shards if n_rows else []
+    bounds = np.unique(
+        np.concatenate([[0], np.searchsorted(cum_weight, targets, side="right"), [n_rows]])
+    )
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _run_shard(
+    func: Callable, membership: sparse.csr_matrix, arrays: Dict[str, SharedArray]
+):
+    # worker side: map the shared arrays, run func on one block of groups
+    attached = {name: handle.attach() for name, handle in arrays.items()}
+    try:
+        result = func(membership, **{name: array for name, (_, array) in attached.items()})
+        # results must not point into shared memory that is about to close
+        if isinstance(result, tuple):
+            return tuple(np.array(value, copy=True) for value in result)
+        return np.array(result, copy=True)
+    finally:
+        for shm, _ in attached.values():
+            shm.close()
+
+
+@dataclass
+class ShardPool:
+    '''
+    worker processes for group level reductions of large books. The groups x
+    rows membership matrix is split into contiguous blocks of groups with
+    about equal numbers of rows, one per worker; the row level arrays every
+    block reads (exposures, betas, covariance, shock grids) are published
+    once in shared memory. Blocks are merged back in group order, so results
+    do not depend on the number of workers
+    '''
+    workers: int
+    _executor: ProcessPoolExecutor = field(default=None, init=False, repr=False)
+    _segments: List[shared_memory.SharedMemory] = field(
+        default_factory=list, init=False, repr=False)
+
+    def __enter__(self) -> "ShardPool":
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown()
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def share(self, array: np.ndarray) -> SharedArray:
+        handle, shm = SharedArray.publish(array)
+        self._segments.append(shm)
+        return handle
+
+    def map_groups(
+        self,
+        func: Callable,
+        membership: sparse.csr_matrix,
+        **arrays: np.ndarray,
+    ):
+        '''func(membership block, **arrays) over blocks of groups, concatenated'''
+        handles = {name: self.share(array) for name, array in arrays.items()}
+        ranges = shard_ranges(membership.getnnz(axis=1), self.workers)
+        futures = [
+            self._executor.submit(_run_shard, func, membership[start:stop], handles)
+            for start, stop in ranges
+        ]
+        results = [future.result() for future in futures]
+        if isinstance(results[0], tuple):
+            return tuple(np.concatenate(parts, axis=0) for parts in zip(*results))
+
+        return np.concatenate(results, axis=0)
+
+
+def map_group_shards(
+    func: Callable,
+    membership: sparse.csr_matrix,
+    workers: int = 1,
+    **arrays: np.ndarray,
+):
+    # Inputs:
+    # func(membership, **arrays) computing one result row per group (row of
+    # membership), number of worker processes
+
+    # Outputs:
+    # func over all groups; in process when workers <= 1 or there are fewer
+    # groups than workers
+    if workers <= 1 or membership.shape[0] < workers:
+        return func(membership, **arrays)
+    with ShardPool(workers) as pool:
+        return pool.map_groups(func, membership, **arrays)
+
+
+def split_groups(values, sizes: List[int]) -> List:
+    # cut results over vertically stacked memberships back into one block per
+    # grouping
+    offsets = np.cumsum([0] + list(sizes))
+    if isinstance(values, tuple):
+        return [
+            tuple(value[start:stop] for value in values)
+            for start, stop in zip(offsets[:-1], offsets[1:])
+        ]
+
+    return [values[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
@@ -0,0 +1,207 @@
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from legacy.helper import black_scholes, put_call_sign
+from legacy.position_book import PositionBook
+from legacy.shard_pool import map_group_shards, split_groups
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+STRESS_MEASURES = ["pnl", "exposure"]
+
+
+def shock_grid(price_vol_shock_range: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    # price and vol shocks of a {"price_shock": [...], "vol_shock": [...]} range
+    return (
+        np.asarray(price_vol_shock_range["price_shock"], dtype=np.float64),
+        np.asarray(price_vol_shock_range["vol_shock"], dtype=np.float64),
+    )
+
+
+def non_option_shock(
+    position: PositionBook,
+    price_shocks: np.ndarray,
+    price_beta: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Inputs:
+    # position book, price shocks, optional price beta of every position row
+    # (the shock applied to a row is beta * price shock)
+
+    # Outputs:
+    # non-option row numbers, their shocked value and P&L, rows x price shocks
+    rows = np.flatnonzero(position.non_option_mask.values)
+    non_option = position.position.iloc[rows]
+    base_value = (
+        non_option["Quantity"].values
+        * non_option["FXRate"].values
+        * non_option["MarketPrice"].values
+        * non_option["PX_POS_MULT_FACTOR"].values
+    )
+    beta = 1.0 if price_beta is None else price_beta[rows, None]
+    shock_value = base_value[:, None] * (1 + beta * price_shocks[None, :])
+
+    return rows, shock_value, shock_value - base_value[:, None]
+
+
+def option_shock(
+    position: PositionBook,
+    price_shocks: np.ndarray,
+    vol_shocks: np.ndarray,
+    rf: float,
+    price_beta: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Outputs:
+    # option row numbers, their shocked value and P&L, revalued once over the
+    # whole grid as rows x price shocks x vol shocks
+    rows = np.flatnonzero(position.option_mask.values)
+    option = position.position.iloc[rows]
+    beta = 1.0 if price_beta is None else price_beta[rows, None, None]
+    shock_option_price = black_scholes(
+        S=option["UndlPrice"].values[:, None, None]
+        * (1 + beta * price_shocks[None, :, None]),
+        X=option["Strike"].values[:, None, None],
+        T=option["MtyYears"].values[:, None, None],
+        Vol=option["IVOL_TM"].values[:, None, None]
+        * (1 + vol_shocks[None, None, :]),
+        rf=rf,
+        sign=put_call_sign(option["PutCall"].values)[:, None, None],
+    )
+    units = (
+        option["PX_POS_MULT_FACTOR"].values
+        * option["Quantity"].values
+        * option["FXRate"].values
+    )
+    shock_value = shock_option_price * units[:, None, None]
+    base_value = option["MarketPrice"].values * units
+
+    return rows, shock_value, shock_value - base_value[:, None, None]
+
+
+def _group_sum(membership: sparse.csr_matrix, values: np.ndarray) -> np.ndarray:
+    # sum of the rows of values (one per column of membership) by group, NaNs
+    # as 0
+    values = np.where(np.isnan(values), 0, values)
+    group_values = membership @ values.reshape(len(values), -1)
+
+    return group_values.reshape((membership.shape[0],) + values.shape[1:])
+
+
+def _group_stress_sums(
+    membership: sparse.csr_matrix,
+    non_option_rows: np.ndarray,
+    option_rows: np.ndarray,
+    non_option_pnl: np.ndarray,
+    option_pnl: np.ndarray,
+    non_option_exposure: np.ndarray,
+    option_exposure: np.ndarray,
+) -> Tuple[np.ndarray, ...]:
+    # per group (row of membership): summed non-option and option shock P&L
+    # and exposure, and the number of option rows
+    non_option_membership = membership[:, non_option_rows]
+    option_membership = membership[:, option_rows]
+
+    return (
+        _group_sum(non_option_membership, non_option_pnl),
+        _group_sum(option_membership, option_pnl),
+        _group_sum(non_option_membership, non_option_exposure),
+        _group_sum(option_membership, option_exposure),
+        np.asarray(option_membership.sum(axis=1)).ravel(),
+    )
+
+
+def group_stress(
+    position: PositionBook,
+    filter_list: List[str],
+    price_shocks: np.ndarray,
+    vol_shocks: np.ndarray,
+    rf: float,
+    price_beta: np.ndarray = None,
+    workers: int = 1,
+) -> Dict[str, Tuple[pd.Index, np.ndarray, np.ndarray]]:
+    # Inputs:
+    # position book, grouping columns, shock grid, risk free rate, optional
+    # price beta of every position row, worker processes
+
+    # Outputs:
+    # for every grouping: group names, shock P&L and shock exposure (shocked
+    # value less exposure) as groups x price shocks x vol shocks. Each position
+    # is revalued once; groups are a sparse reduction of the position grid,
+    # over the stacked groups of all groupings, sharded by groups over
+    # workers processes
+    non_option_rows, non_option_value, non_option_pnl = non_option_shock(
+        position, price_shocks, price_beta
+    )
+    option_rows, option_value, option_pnl = option_shock(
+        position, price_shocks, vol_shocks, rf, price_beta
+    )
+    exposure = position.exposure
+    memberships = [position.membership(filter_item) for filter_item in filter_list]
+    group_sums = map_group_shards(
+        _group_stress_sums,
+        sparse.vstack(memberships, format="csr"),
+        workers,
+        non_option_rows=non_option_rows,
+        option_rows=option_rows,
+        non_option_pnl=non_option_pnl,
+        option_pnl=option_pnl,
+        non_option_exposure=non_option_value - exposure[non_option_rows, None],
+        option_exposure=option_value - exposure[option_rows, None, None],
+    )
+    grid_shape = (len(price_shocks), len(vol_shocks))
+    stress_dict = {}
+    for filter_item, (
+        group_non_option_pnl,
+        group_option_pnl,
+        group_non_option_exposure,
+        group_option_exposure,
+        option_count,
+    ) in zip(
+        filter_list,
+        split_groups(group_sums, [membership.shape[0] for membership in memberships]),
+    ):
+        groups = position.groups(filter_item)
+        n_groups = len(groups)
+        # non-option value does not depend on the vol shock
+        group_pnl = (
+            np.broadcast_to(group_non_option_pnl[:, :, None], (n_groups,) + grid_shape)
+            + group_option_pnl
+        )
+        group_non_option_exposure = np.broadcast_to(
+            group_non_option_exposure[:, :, None], (n_groups,) + grid_shape)
+        # as in the per group stress test, a group holding options reports the
+        # shock exposure of its options
+        group_exposure = np.where(
+            (option_count > 0)[:, None, None],
+            group_option_exposure,
+            group_non_option_exposure,
+        )
+        stress_dict[filter_item] = (groups, group_pnl, group_exposure)
+
+    return stress_dict
+
+
+def stress_dict_by_key(
+    stress_dict: Dict[str, Tuple[pd.Index, np.ndarray, np.ndarray]],
+    price_vol_shock_range: Dict,
+    measure: str,
+) -> Dict[str, float]:
+    # flatten the "pnl" or "exposure" grids of group_stress into the
+    # "{group}_price_shock_{price}_vol_shock_{vol}" keyed dict of the report
+    price_shock_list = price_vol_shock_range["price_shock"]
+    vol_shock_list = price_vol_shock_range["vol_shock"]
+    key_dict = {}
+    for filter_item, stress in stress_dict.items():
+        groups, values = stress[0], stress[STRESS_MEASURES.index(measure) + 1]
+        for group_ix, filter_name in enumerate(groups):
+            for price_ix, price_shock in enumerate(price_shock_list):
+                for vol_ix, vol_shock in enumerate(vol_shock_list):
+                    key_dict[
+                        f"{filter_name}_price_shock_{price_shock}_vol_shock_{vol_shock}"
+                    ] = values[group_ix, price_ix, vol_ix]
+
+    return key_dict
@@ -0,0 +1,217 @@
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from legacy.beta_index import BetaIndex
+from legacy.position_book import PositionBook
+from legacy.shard_pool import map_group_shards, split_groups
+
+logging.basicConfig(level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+
+def group_membership(
+    position: PositionBook, filter_item: str
+) -> Tuple[sparse.csr_matrix, pd.Index]:
+    # Outputs:
+    # sparse groups x rows indicator matrix, group names in groupby order
+    # (sorted, NaN keys dropped)
+    return position.membership(filter_item), position.groups(filter_item)
+
+
+def position_factor_exposures(
+    position: PositionBook, beta_index: BetaIndex
+) -> np.ndarray:
+    # rows x K dollar exposure of every position row to every factor
+    row_betas = beta_index.values[beta_index.position_rows(position.position)]
+
+    return position.exposure[:, None] * row_betas
+
+
+def factor_variance(factor_exposures: np.ndarray, factor_cov: np.ndarray) -> np.ndarray:
+    # diag(F cov F^T) for a groups x K factor exposure matrix
+    variance = ((factor_exposures @ factor_cov) * factor_exposures).sum(axis=1)
+
+    return np.clip(variance, 0, None)
+
+
+def factor_cov_values(matrix_cov: pd.DataFrame) -> np.ndarray:
+    # factor covariance without the cash factor, aligned with the beta columns
+    return matrix_cov.values[1:, 1:].astype(float)
+
+
+def _group_forms(
+    membership: sparse.csr_matrix,
+    exposures: np.ndarray,
+    factor_cov: np.ndarray,
+    cov_total_exposure: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # per group (row of membership) with factor exposures f_g: the variance
+    # f_g' cov f_g and the covariance with the book f_g' cov f_total
+    group_exposures = membership @ exposures
+
+    return (
+        factor_variance(group_exposures, factor_cov),
+        group_exposures @ cov_total_exposure,
+    )
+
+
+def group_factor_forms(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    matrix_cov: pd.DataFrame,
+    filter_list: List[str],
+    workers: int = 1,
+) -> Tuple[float, Dict[str, Tuple[pd.Index, np.ndarray, np.ndarray]]]:
+    # Outputs:
+    # variance of the book, and for every grouping its group names, group
+    # variances and group covariances with the book. The groups of all
+    # groupings are one stacked membership matrix, reduced in process or
+    # sharded by groups over workers processes
+    exposures = position_factor_exposures(position, beta_index)
+    factor_cov = factor_cov_values(matrix_cov)
+    cov_total_exposure = factor_cov @ exposures.sum(axis=0)
+    total_variance = exposures.sum(axis=0) @ cov_total_exposure
+    memberships = [position.membership(filter_item) for filter_item in filter_list]
+    forms = map_group_shards(
+        _group_forms,
+        sparse.vstack(memberships, format="csr"),
+        workers,
+        exposures=exposures,
+        factor_cov=factor_cov,
+        cov_total_exposure=cov_total_exposure,
+    )
+    form_dict = {
+        filter_item: (position.groups(filter_item),) + group_forms
+        for filter_item, group_forms in zip(
+            filter_list,
+            split_groups(forms, [membership.shape[0] for membership in memberships]),
+        )
+    }
+
+    return total_variance, form_dict
+
+
+def _isolated_sigma(form_dict) -> Dict[str, pd.Series]:
+    # $ sigma of every group from its variance
+    return {
+        filter_item: pd.Series(np.sqrt(variance), index=groups)
+        for filter_item, (groups, variance, _) in form_dict.items()
+    }
+
+
+def _excluded_sigma(total_variance: float, form_dict) -> Dict[str, pd.Series]:
+    # $ sigma of the book without every group, in closed form from the total
+    # and per-group factor exposures:
+    # var(total - g) = var(total) - 2 f_g' cov f_total + f_g' cov f_g
+    sigma_dict = {}
+    for filter_item, (groups, variance, cov_total) in form_dict.items():
+        excluded_variance = total_variance - 2 * cov_total + variance
+        sigma_dict[filter_item] = pd.Series(
+            np.sqrt(np.clip(excluded_variance, 0, None)), index=groups
+        )
+
+    return sigma_dict
+
+
+def group_sigmas(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    matrix_cov: pd.DataFrame,
+    filter_list: List[str],
+    workers: int = 1,
+) -> Tuple[Dict[str, pd.Series], Dict[str, pd.Series]]:
+    # Outputs:
+    # group_sigma and group_excluded_sigma of every grouping from one
+    # (sharded) pass of the group factor forms
+    total_variance, form_dict = group_factor_forms(
+        position, beta_index, matrix_cov, filter_list, workers)
+
+    return _isolated_sigma(form_dict), _excluded_sigma(total_variance, form_dict)
+
+
+def group_sigma(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    matrix_cov: pd.DataFrame,
+    filter_list: List[str],
+    workers: int = 1,
+) -> Dict[str, pd.Series]:
+    # Inputs:
+    # position book, factor beta index, factor covariance, grouping columns,
+    # worker processes
+
+    # Outputs:
+    # $ sigma of every group of every grouping, one quadratic form per
+    # grouping instead of one per group
+    _, form_dict = group_factor_forms(
+        position, beta_index, matrix_cov, filter_list, workers)
+
+    return _isolated_sigma(form_dict)
+
+
+def group_excluded_sigma(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    matrix_cov: pd.DataFrame,
+    filter_list: List[str],
+    workers: int = 1,
+) -> Dict[str, pd.Series]:
+    # Outputs:
+    # $ sigma of the book without each group of every grouping; rows with no
+    # value for the grouping always stay in the book
+    total_variance, form_dict = group_factor_forms(
+        position, beta_index, matrix_cov, filter_list, workers)
+
+    return _excluded_sigma(total_variance, form_dict)
+
+
+def total_sigma(
+    position: PositionBook, beta_index: BetaIndex, matrix_cov: pd.DataFrame
+) -> float:
+    # $ sigma of the whole book
+    total_exposure = position_factor_exposures(position, beta_index).sum(axis=0)
+
+    return float(np.sqrt(factor_variance(total_exposure[None, :],
+                                         factor_cov_values(matrix_cov))[0]))
+
+
+def position_marginal_sigma(
+    position: PositionBook, beta_index: BetaIndex, matrix_cov: pd.DataFrame
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Outputs:
+    # marginal sigma d sigma / d e = B cov B' e / sigma of every position row,
+    # and its Euler component e * marginal; the components sum to the total
+    # sigma of the book
+    row_betas = beta_index.values[beta_index.position_rows(position.position)]
+    exposure = position.exposure
+    factor_cov = factor_cov_values(matrix_cov)
+    cov_total_exposure = factor_cov @ (exposure @ row_betas)
+    sigma = np.sqrt(max(exposure @ row_betas @ cov_total_exposure, 0))
+    if sigma == 0:
+        marginal = np.zeros(len(exposure))
+    else:
+        marginal = row_betas @ cov_total_exposure / sigma
+
+    return marginal, exposure * marginal
+
+
+def group_component_sigma(
+    position: PositionBook,
+    beta_index: BetaIndex,
+    matrix_cov: pd.DataFrame,
+    filter_list: List[str],
+) -> Dict[str, pd.Series]:
+    # Euler component sigma of every group of every grouping: a segment sum
+    # of the position components
+    _, component = position_marginal_sigma(position, beta_index, matrix_cov)
+    component_dict = {}
+    for filter_item in filter_list:
+        membership, groups = group_membership(position, filter_item)
+        component_dict[filter_item] = pd.Series(
+            membership @ component, index=groups)
+
+    return component_dict
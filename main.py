@@ -1,7 +1,9 @@
 import json
 import logging
+import os
 from argparse import ArgumentParser
 from datetime import datetime
+from glob import glob
 
 import pandas as pd
 import pandas_market_calendars as mcal
@@ -11,7 +13,23 @@ import legacy.Exposures as Exposures
 import legacy.Factors as Factors
 import legacy.pnl_stats as pnl_stats
 import legacy.VaR as VaR
+from legacy.beta_index import BetaIndex
+from legacy.factor_returns import FactorReturns
+from legacy.position_book import PositionBook
+from legacy.running_moments import running_moments
 import src.report_sheets as rsh
+from src.pipeline import (
+    FACTORS_SCHEMA,
+    NAV_SCHEMA,
+    POSITIONS_SCHEMA,
+    ColumnarStore,
+    ResultCache,
+    RunProfile,
+    capture_tables,
+    files_digest,
+    report_graph,
+    write_tables,
+)
 
 logging.basicConfig(level=logging.INFO)
 LOGGER = logging.getLogger(__name__)
@@ -44,7 +62,82 @@ if __name__ == "__main__":
         default="2023-08-10",
         help="holdings date of postions across investment advisor",
     )
+    parser.add_argument(
+        "--cov_decay",
+        type=float,
+        default=None,
+        help="EWMA decay of the factor covariance used for VaR, e.g. 0.94; "
+        "sample covariance when not given",
+    )
+    parser.add_argument(
+        "--moments_state",
+        type=str,
+        default=None,
+        help="npz file of running beta / covariance sums, updated with the new "
+        "price rows instead of recomputing over the full history",
+    )
+    parser.add_argument(
+        "--moments_window",
+        type=int,
+        default=None,
+        help="rolling window (days) of the running sums; full history if not given",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="recompute every stage instead of reusing cached results",
+    )
+    parser.add_argument(
+        "--cache_dir", type=str, default="cache", help="stage result cache folder"
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=2048,
+        help="size above which least recently used cache entries are evicted",
+    )
+    parser.add_argument(
+        "--stage_workers",
+        type=int,
+        default=1,
+        help="processes running independent report stages concurrently",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes the VaR and stress group reductions are sharded over",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=f"output/run_profile_{now}.json",
+        help="json file the run profile (stage timings, memory, sizes) is written to",
+    )
+    parser.add_argument(
+        "--profile_memory",
+        action="store_true",
+        help="trace python allocations for the peak memory of every stage (slower)",
+    )
+    parser.add_argument(
+        "--golden_dir",
+        type=str,
+        default=None,
+        help="folder the frames handed to the report sheets are written to, in the "
+        "canonical form benchmarks.golden_regression diffs",
+    )
     args = parser.parse_args()
+    profile = RunProfile(trace_memory=args.profile_memory)
+    for module in [Exposures, Factors, pnl_stats, VaR, rsh]:
+        profile.instrument(module)
+    if args.golden_dir is not None:
+        golden_tables = capture_tables(rsh)
+    cache = ResultCache(
+        root=args.cache_dir,
+        max_bytes=args.cache_max_mb << 20,
+        enabled=not args.no_cache,
+    )
 
     # open the price_shock_range command line argument
     price_vol_shock_range = args.price_vol_shock_range
@@ -56,16 +149,39 @@ if __name__ == "__main__":
     holdings_date = args.holdings_date
 
     # 1. Read in factors, prices, positions, AUM
-    factor = pd.read_csv("data/factors.csv")
-    price = pd.read_csv("data/prices.csv")
-    price.set_index(["date"], inplace=True)
-    position = pd.read_csv("data/positions.csv")
-    position["MarketValue"] = position["MarketValue"].astype(float)
-    AUM = pd.read_csv("data/Historical Pnl and Nav.csv")
-    AUM_clean = pnl_stats.NAV_clean(AUM)  # model NAVs
-    firm_NAV = AUM_clean.loc[AUM_clean.index == holdings_date]["EndBookNAV"]
-
-    price_date_index = pd.to_datetime(price.index)
+    # typed columnar copies of the csv files, parsed again only when they change
+    store = ColumnarStore(
+        root=os.path.join(args.cache_dir, "ingest"), enabled=not args.no_cache
+    )
+    input_paths = [
+        "data/factors.csv",
+        "data/prices.csv",
+        "data/positions.csv",
+        "data/Historical Pnl and Nav.csv",
+    ]
+    with profile.stage("read_inputs") as record:
+        factor = store.read_csv("data/factors.csv", FACTORS_SCHEMA)
+        prices = store.read_prices("data/prices.csv")
+        position = store.read_csv("data/positions.csv", POSITIONS_SCHEMA)
+        AUM = store.read_csv("data/Historical Pnl and Nav.csv", NAV_SCHEMA)
+        AUM_clean = pnl_stats.NAV_clean(AUM)  # model NAVs
+        firm_NAV = AUM_clean.loc[AUM_clean.index == holdings_date]["EndBookNAV"]
+        record.sizes.update(
+            factors=len(factor), positions=len(position), dates=len(prices.dates),
+            tickers=len(prices.tickers),
+        )
+    # stage cache keys: input files and the code they are computed with: the
+    # risk code, the stage wiring and parameters, and this script's factor
+    # selection
+    input_digests = [store.source_digest(path) for path in input_paths]
+    repo_root = os.path.dirname(os.path.abspath(__file__))
+    code_digest = files_digest(
+        glob(os.path.join(repo_root, "legacy", "*.py"))
+        + glob(os.path.join(repo_root, "src", "pipeline", "*.py"))
+        + [os.path.abspath(__file__)]
+    )
+
+    price_date_index = pd.to_datetime(prices.dates)
     price_date_min = price_date_index.min()
     price_date_max = price_date_index.max()
     date_list = pd.date_range(price_date_min, price_date_max, freq="D")
@@ -77,23 +193,25 @@ if __name__ == "__main__":
     # for now need to process positions and force a distinct RFID for each distinct symbol
     LOGGER.info(
         "process positions and force a distinct RFID for each distinct symbol")
-    cols = position.columns[~position.columns.isin(["RFID"])]
-    position = position[cols]
-    position_group = position.groupby("VaRTicker")
-    count = 0
-    position_group_df_list = []
-    for name, group in position_group:
-        count += 1
-        group["RFID"] = count
-        position_group_df_list.append(group)
-    position = pd.concat(position_group_df_list, axis=0)
-    position["Exposure"] = position["Exposure"].astype(float)
+    with profile.stage("positions", rows=len(position)) as record:
+        cols = position.columns[~position.columns.isin(["RFID"])]
+        position = position[cols]
+        position_group = position.groupby("VaRTicker")
+        count = 0
+        position_group_df_list = []
+        for name, group in position_group:
+            count += 1
+            group["RFID"] = count
+            position_group_df_list.append(group)
+        position = pd.concat(position_group_df_list, axis=0)
+        # cast, aggregate and group the positions once for every risk function
+        position_book = PositionBook.from_positions(position)
+        position = position_book.position
+        record.sizes["positions"] = len(position)
 
     # structure positions, factor, price data for subsequent estimation of Factor
     # betas, VaRs, Exposures, and Stress Tests
-    price.index = pd.to_datetime(price.index).strftime("%Y-%m-%d")
     # TODO: MAKE IT PARAMETRISABLE
-    price.index = pd.to_datetime(price.index).strftime("%Y-%m-%d")
     # position = position.loc[(position["RFID"] > 0) & (position["RFID"] < 25)]
     factor_names = list(factor["Factor Names"])
     factor_names = [name for name in factor_names if str(name) != "nan"]
@@ -101,13 +219,14 @@ if __name__ == "__main__":
     factors_to_remove = ["RIY less RTY", "RAG less RAV"]
     factor_ids = [
         item for item in factor_ids_full if item not in factors_to_remove]
-    factor_prices = price[factor_ids]
+    factor_prices = prices.frame(factor_ids)
     factor_ids = factor_ids_full
     factors_to_remove = ["RIY Index", "RTY Index", "RAG Index", "RAV Index"]
     factor_ids = [item for item in factor_ids if item not in factors_to_remove]
     factor = factor.loc[factor["FactorID"].isin(factor_ids)]
+    factor = factor.set_index(["FactorID"])
     position_ids = list(position["VaRTicker"].unique())
-    position_prices = price[position_ids]
+    position_prices = prices.frame(position_ids)
     strat_filters = position["FundName"].unique()
     sector_filters = position["Sector"].unique()
     industry_filters = position["Industry"].unique()
@@ -124,8 +243,40 @@ if __name__ == "__main__":
     LOGGER.info("review input data")
 
     # 1.a. estimate factor betas, factor vols
-    factor_betas = Factors.FactorBetas(factor_prices, position_prices)
+    factor_returns = FactorReturns.from_prices(factor_prices)
+    # stages downstream of the betas are keyed on how they were estimated
+    model_inputs = [
+        input_digests, code_digest, args.moments_state is not None,
+        args.moments_window,
+    ]
+    with profile.stage(
+        "factor_model", factors=factor_prices.shape[1], positions=position_prices.shape[1]
+    ):
+        if args.moments_state is None:
+            factor_betas, matrix_cov = cache.cached(
+                "factor_model",
+                model_inputs,
+                lambda: (
+                    Factors.FactorBetas(factor_returns, position_prices),
+                    VaR.matrix_cov(factor_returns),
+                ),
+            )
+        else:
+            # not cached: the running sums state file is brought up to date here
+            moments = running_moments(
+                args.moments_state, factor_prices, position_prices, args.moments_window
+            )
+            factor_betas, matrix_cov = moments.betas(), moments.cov()
+            # the sums may span more dates than the price file (no window, an
+            # older or reset state), so the downstream stages are keyed on the
+            # estimated model itself
+            model_inputs = model_inputs + [factor_betas, matrix_cov]
+    beta_index = BetaIndex.from_factor_betas(factor_betas)
     position_returns = Factors.position_returns(position_prices)
+    if args.cov_decay is None:
+        VaR_cov = matrix_cov
+    else:
+        VaR_cov = VaR.ewma_cov(factor_returns, [args.cov_decay])[args.cov_decay]
 
     # 1.b. VaR functions
     # Create a Pandas Excel writer using XlsxWriter as the engine.
@@ -134,174 +285,41 @@ if __name__ == "__main__":
     file_name = f"output/risk_report_{now}.xlsx"
     writer = xlsxwriter.Workbook(file_name, writer_options)
     writer.set_tab_ratio(75)
-    # Excel equivalent ["FactorCorrels"]
-    matrix_correlation = VaR.matrix_correlation(factor_prices, factor)
-    matrix_cov = VaR.matrix_cov(factor_prices)
-    decay_cov = VaR.decay_cov(factor_prices)
-    VaR95_top_10, VaR95_bottom_10 = VaR.filter_VaR95(
-        factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR99_top_10, VaR99_bottom_10 = VaR.filter_VaR99(
-        factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR95_filtered_iso = VaR.filter_VaR95_iso(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR_Top10 = pd.merge(VaR95_top_10, VaR99_top_10,
-                         left_index=True, right_index=True)
-    VaR_Bottom10 = pd.merge(
-        VaR95_bottom_10, VaR99_bottom_10, left_index=True, right_index=True
-    )
-    VaR99_filtered_iso = VaR.filter_VaR99_iso(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR95_filtered_inc = VaR.filter_VaR95_inc(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR99_filtered_inc = VaR.filter_VaR99_inc(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR95_filtered_comp = VaR.filter_Var95_comp(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    VaR99_filtered_comp = VaR.filter_Var99_comp(
-        filters_dict, factor_prices, position, factor_betas, matrix_cov, firm_NAV
-    )
-    # Excel equivalent ["VaRReport; "Strat VaR", "Sector VaR", "Industry VaR",
-    # "Country VaR", "Market Cap VaR" tbls]
-    (
-        VaR_structured_position_top10,
-        VaR_structured_position_bottom10,
-        VaR_structured_strat,
-        VaR_structured_sector,
-        VaR_structured_industry,
-        VaR_structured_country,
-        VaR_structured_mcap,
-    ) = VaR.VaR_structuring(
-        VaR95_filtered_iso,
-        VaR99_filtered_iso,
-        VaR95_filtered_inc,
-        VaR99_filtered_inc,
-        VaR95_filtered_comp,
-        VaR99_filtered_comp,
-        position,
-    )
-
-    # # 1.c Stress Test functions
-    # Excel equivalent ["Options&Stress; "Beta & Volatility Stress Test P&L tbl"]
-    stress_test_beta_price_vol_calc = VaR.filter_stress_test_beta_price_vol(
-        filters_dict, factor_prices, position, factor_betas, price_vol_shock_range
-    )
-    stress_test_beta_price_vol_results_df = VaR.stress_test_structuring(
-        stress_test_beta_price_vol_calc, position, price_vol_shock_range
-    )
-    # Excel equivalent ["Options&Stress; "Price & Volatility Stress Test P&L tbl"]
-    (
-        stress_test_price_vol_calc,
-        stress_test_price_vol_exposure_calc,
-    ) = VaR.filter_stress_test_price_vol(
-        filters_dict, factor_prices, position, price_vol_shock_range
-    )
-    # Excel equivalent ["Options&Stress; "Price & Volatility Stress Test Net Exposure tbl"]
-    stress_test_price_vol_results_df = VaR.stress_test_structuring(
-        stress_test_price_vol_calc, position, price_vol_shock_range
-    )
-    stress_test_price_vol_exposure_results_df = VaR.stress_test_structuring(
-        stress_test_price_vol_exposure_calc, position, price_vol_shock_range
-    )
-
-    # 1.d Exposure functions
-    # Excel equivalent ["ExpReport"]
-    (
-        strat_exposure_df,
-        sector_exposure_df,
-        industry_exposure_df,
-        country_exposure_df,
-        mktcap_exposure_df,
-    ) = Exposures.filter_exposure_calc(filters_dict, position, firm_NAV)
-    # Excel equivalent ["ExpReport"]
-    (
-        strat_beta_adj_exposure_df,
-        sector_beta_adj_exposure_df,
-        industry_beta_adj_exposure_df,
-        country_beta_adj_exposure_df,
-        mktcap_beta_adj_exposure_df,
-    ) = Exposures.filter_beta_adj_exposure_calc(
-        filters_dict, position, factor_betas, firm_NAV
-    )
-    # Excel equivalent ["Options&Stress"; "Option Exposure" tbl]
-    options_delta_adj_exposure_calc = Exposures.filter_options_delta_adj_exposure(
-        position
-    )
-    # Excel equivalent ["Options&Stress"; "Option Notional" tbl]
-    options_delta1_exposure_calc = Exposures.filter_options_delta_unadj_exposure(
-        position
-    )
-    # Excel equivalent ["Options&Stress"; "Premium" tbl]
-    options_premium_calc = Exposures.filter_options_premium(position)
-    # Excel equivalent ["Options&Stress"; "Greek Sensitivity" tbl]
-    greek_sensitivities_calc = Exposures.greek_sensitivities(position)
-    # Excel equivalent ["FactorExposures"; "Macro Factor Sensitivity" tbl & "Sector
-    # Sensitivities" tbl]
-    macro_factor_decomp_df, sector_factor_decomp_df = Exposures.factor_decomp_filtered(
-        position, factor_betas, factor_prices, factor, matrix_cov, firm_NAV
-    )
-    # Excel equivalent ["FactorExposures"; "Top10" tbls & "Bottom10" tbls by Factor
-    # Exposure by Position]
-    (
-        risk_factor_exposure_top_N_list,
-        risk_factor_exposure_bottom_N_list,
-    ) = Exposures.factor_decomp_by_factor_position(
-        position, factor_betas, factor, firm_NAV
-    )
-    # Excel equivalents ["FactorHeatMap"]
-    factor_heat_map = Exposures.factor_heat_map(
-        position, factor_betas, factor, firm_NAV
-    )
-    # Excel equivalents ["PositionsBreakdown"]; ["PositionsSummary"];
-    (
-        position_breakdown,
-        position_summary,
-    ) = Exposures.stress_test_beta_price_vol_exposure_by_position(
-        position, factor_betas, matrix_cov, position_returns, factor, firm_NAV
-    )
-
-    # 1.e. pnl estimation
-    factor_rets = pd.DataFrame(
-        factor_prices["SPX Index"] / factor_prices["SPX Index"].shift(1) - 1,
-        columns=["SPX Index"],
-        index=factor_prices.index,
-    )
-    AUM_clean = pd.merge(
-        AUM_clean, factor_rets["SPX Index"], left_index=True, right_index=True
-    )
-    # Excel equivalents ["PNLReport"]
-    return_analysis_stats = pnl_stats.return_analysis(AUM_clean)
-    comparative_analysis_stats = pnl_stats.comparative_statistics(
-        AUM_clean, return_analysis_stats
-    )
+    # 1.b.-1.e. VaR, stress tests, exposures, factor decompositions and pnl
+    # stats as a stage graph; independent stages run concurrently with
+    # --stage_workers > 1
+    report_stages = report_graph(workers=args.workers)
+    report = report_stages.run(
+        {
+            "filters_dict": filters_dict,
+            "factor": factor,
+            "factor_prices": factor_prices,
+            "factor_returns": factor_returns,
+            "position_book": position_book,
+            "position_returns": position_returns,
+            "factor_betas": factor_betas,
+            "beta_index": beta_index,
+            "matrix_cov": matrix_cov,
+            "VaR_cov": VaR_cov,
+            "firm_NAV": firm_NAV,
+            "AUM": AUM,
+            "AUM_clean": AUM_clean,
+            "price_vol_shock_range": price_vol_shock_range,
+            "model_inputs": model_inputs,
+            "input_digests": input_digests,
+            "code_digest": code_digest,
+            "cov_decay": args.cov_decay,
+            "holdings_date": holdings_date,
+        },
+        workers=args.stage_workers,
+        cache=cache,
+        profile=profile,
+    )
+    LOGGER.info(f"stage timings\n{report_stages.timing_table()}")
 
     # 1.f. dashboard
     # Excel equivalents ["Dashboard; "Fund Exposure %" tbl; "Fund Exposures $" tbl]
     # fund exposure % tbl
-    position_agg_exposure = (
-        position.groupby(
-            [
-                "RFID",
-            ]
-        )
-        .agg(
-            {
-                "TradeDate": "first",
-                "FundName": "first",
-                "UnderlierName": "first",
-                "VaRTicker": "first",
-                "MarketValue": "sum",
-                "Exposure": "sum",
-            }
-        )
-        .reset_index()
-    )
     long_mkt_value_pct = tmp = (
         position.loc[position["MarketValue"] > 0]["MarketValue"].sum()
         / firm_NAV.values[0]
@@ -327,23 +345,23 @@ if __name__ == "__main__":
                 "Market Value",
             ],
             "Long": [
-                sector_exposure_df["Long"].sum(),
-                sector_beta_adj_exposure_df["Long"].sum(),
+                report["sector_exposure_df"]["Long"].sum(),
+                report["sector_beta_adj_exposure_df"]["Long"].sum(),
                 long_mkt_value_pct,
             ],
             "Short": [
-                sector_exposure_df["Short"].sum(),
-                sector_beta_adj_exposure_df["Short"].sum(),
+                report["sector_exposure_df"]["Short"].sum(),
+                report["sector_beta_adj_exposure_df"]["Short"].sum(),
                 short_mkt_value_pct,
             ],
             "Gross": [
-                sector_exposure_df["Gross"].sum(),
-                sector_beta_adj_exposure_df["Gross"].sum(),
+                report["sector_exposure_df"]["Gross"].sum(),
+                report["sector_beta_adj_exposure_df"]["Gross"].sum(),
                 gross_mkt_value_pct,
             ],
             "Net": [
-                sector_exposure_df["Net"].sum(),
-                sector_beta_adj_exposure_df["Net"].sum(),
+                report["sector_exposure_df"]["Net"].sum(),
+                report["sector_beta_adj_exposure_df"]["Net"].sum(),
                 net_mkt_value_pct,
             ],
         }
@@ -356,25 +374,25 @@ if __name__ == "__main__":
                 "Market Value",
             ],
             "Long": [
-                sector_exposure_df["Long"].sum() * firm_NAV.values[0],
-                sector_beta_adj_exposure_df["Long"].sum() * firm_NAV.values[0],
+                report["sector_exposure_df"]["Long"].sum() * firm_NAV.values[0],
+                report["sector_beta_adj_exposure_df"]["Long"].sum() * firm_NAV.values[0],
                 long_mkt_value,
             ],
             "Short": [
-                sector_exposure_df["Short"].sum() * firm_NAV.values[0],
-                sector_beta_adj_exposure_df["Short"].sum(
+                report["sector_exposure_df"]["Short"].sum() * firm_NAV.values[0],
+                report["sector_beta_adj_exposure_df"]["Short"].sum(
                 ) * firm_NAV.values[0],
                 short_mkt_value,
             ],
             "Gross": [
-                sector_exposure_df["Gross"].sum() * firm_NAV.values[0],
-                sector_beta_adj_exposure_df["Gross"].sum(
+                report["sector_exposure_df"]["Gross"].sum() * firm_NAV.values[0],
+                report["sector_beta_adj_exposure_df"]["Gross"].sum(
                 ) * firm_NAV.values[0],
                 gross_mkt_value,
             ],
             "Net": [
-                sector_exposure_df["Net"].sum() * firm_NAV.values[0],
-                sector_beta_adj_exposure_df["Net"].sum() * firm_NAV.values[0],
+                report["sector_exposure_df"]["Net"].sum() * firm_NAV.values[0],
+                report["sector_beta_adj_exposure_df"]["Net"].sum() * firm_NAV.values[0],
                 net_mkt_value,
             ],
         }
@@ -383,13 +401,13 @@ if __name__ == "__main__":
     rsh.generate_dashboard_sheet(
         writer,
         data={
-            'var_structured_position_top10': VaR_structured_position_top10.fillna(0),
-            'var_structured_position_bottom10': VaR_structured_position_bottom10.fillna(0),
-            'sector_exposure_df': sector_exposure_df,
-            'options_premium_calc': options_premium_calc,
-            'greek_sensitivities_calc': greek_sensitivities_calc.sort_index(),
-            'macro_factor_decomp_df': macro_factor_decomp_df.sort_index(),
-            'sector_factor_decomp_df': sector_factor_decomp_df,
+            'var_structured_position_top10': report["VaR_structured_position_top10"].fillna(0),
+            'var_structured_position_bottom10': report["VaR_structured_position_bottom10"].fillna(0),
+            'sector_exposure_df': report["sector_exposure_df"],
+            'options_premium_calc': report["options_premium_calc"],
+            'greek_sensitivities_calc': report["greek_sensitivities_calc"].sort_index(),
+            'macro_factor_decomp_df': report["macro_factor_decomp_df"].sort_index(),
+            'sector_factor_decomp_df': report["sector_factor_decomp_df"],
             'fund_exp_pct_dashboard': fund_exp_pct_dashboard,
             'fund_exp_usd_dashboard': fund_exp_usd_dashboard,
         }
@@ -402,31 +420,38 @@ if __name__ == "__main__":
     rsh.generate_pnldata_sheet(
         writer,
         data_dict={
-            'aum_clean': AUM_clean,
+            'aum_clean': report["pnl_data"],
         }
     )
 
     rsh.generate_pnlreport_sheet(
         writer,
         data_dict={
-            'comparative_analysis_stats': comparative_analysis_stats,
-            'return_analysis_stats': return_analysis_stats,
+            'comparative_analysis_stats': report["comparative_analysis_stats"],
+            'return_analysis_stats': report["return_analysis_stats"],
+        }
+    )
+    rsh.generate_fund_pnlreport_sheet(
+        writer,
+        data_dict={
+            'fund_return_analysis_stats': report["fund_return_analysis_stats"],
+            'fund_comparative_analysis_stats': report["fund_comparative_analysis_stats"],
         }
     )
     rsh.generate_factor_heatmap_sheet(
         writer,
         data_dict={
-            'factor_heatmap': factor_heat_map.
+            'factor_heatmap': report["factor_heat_map"].
             sort_values('Exposure', ascending=False),
         }
     )
     rsh.generate_factor_exposures_sheet(
         writer,
         data={
-            'macro_factor_decomp_df': macro_factor_decomp_df,
-            'sector_factor_decomp_df': sector_factor_decomp_df,
-            'risk_factor_exposure_top_n_list': risk_factor_exposure_top_N_list,
-            'risk_factor_exposure_bottom_n_list': risk_factor_exposure_bottom_N_list,
+            'macro_factor_decomp_df': report["macro_factor_decomp_df"],
+            'sector_factor_decomp_df': report["sector_factor_decomp_df"],
+            'risk_factor_exposure_top_n_list': report["risk_factor_exposure_top_N_list"],
+            'risk_factor_exposure_bottom_n_list': report["risk_factor_exposure_bottom_N_list"],
         }
     )
 
@@ -434,41 +459,41 @@ if __name__ == "__main__":
         writer,
         data=[
             {
-                'Strategy exposure': strat_exposure_df,
-                'Strategy Beta Exposure': strat_beta_adj_exposure_df,
+                'Strategy exposure': report["strat_exposure_df"],
+                'Strategy Beta Exposure': report["strat_beta_adj_exposure_df"],
             },
             {
-                'Sector Exposure': sector_exposure_df.set_index('Sector Exposure'),
-                'Sector Beta Exposure': sector_beta_adj_exposure_df,
+                'Sector Exposure': report["sector_exposure_df"].set_index('Sector Exposure'),
+                'Sector Beta Exposure': report["sector_beta_adj_exposure_df"],
             },
             {
-                'Industry Exposure': industry_exposure_df,
-                'Industry Beta Exposure': industry_beta_adj_exposure_df,
+                'Industry Exposure': report["industry_exposure_df"],
+                'Industry Beta Exposure': report["industry_beta_adj_exposure_df"],
             },
             {
-                'Country Exposure': country_exposure_df,
-                'Country Beta Exposure': country_beta_adj_exposure_df,
+                'Country Exposure': report["country_exposure_df"],
+                'Country Beta Exposure': report["country_beta_adj_exposure_df"],
             },
             {
-                'Market Cap Exposure': mktcap_exposure_df,
-                'Market Cap Beta Exposure': mktcap_beta_adj_exposure_df,
+                'Market Cap Exposure': report["mktcap_exposure_df"],
+                'Market Cap Beta Exposure': report["mktcap_beta_adj_exposure_df"],
             },
         ]
     )
-    mktcap_exposure_df.to_csv(r'data/mktcap_exposure_df.csv', sep=';')
+    report["mktcap_exposure_df"].to_csv(r'data/mktcap_exposure_df.csv', sep=';')
     rsh.generate_var_report_sheet(
         writer,
         data=[
             {
-                'var_top10': VaR_Top10,
-                'var_bottom10': VaR_Bottom10,
+                'var_top10': report["VaR_Top10"],
+                'var_bottom10': report["VaR_Bottom10"],
             },
             {
-                'Strat VaR': VaR_structured_strat.fillna(0),
-                'Sector VaR': VaR_structured_sector.fillna(0),
-                'Industry VaR': VaR_structured_industry.fillna(0),
-                'Country VaR': VaR_structured_country.fillna(0),
-                'MarketCap VaR': VaR_structured_mcap.fillna(0),
+                'Strat VaR': report["VaR_structured_strat"].fillna(0),
+                'Sector VaR': report["VaR_structured_sector"].fillna(0),
+                'Industry VaR': report["VaR_structured_industry"].fillna(0),
+                'Country VaR': report["VaR_structured_country"].fillna(0),
+                'MarketCap VaR': report["VaR_structured_mcap"].fillna(0),
             },
         ]
     )
@@ -477,18 +502,18 @@ if __name__ == "__main__":
         writer,
         data=[
             {
-                'options_delta_adj_exposure_calc': options_delta_adj_exposure_calc,
-                'options_delta1_exposure_calc': options_delta1_exposure_calc,
+                'options_delta_adj_exposure_calc': report["options_delta_adj_exposure_calc"],
+                'options_delta1_exposure_calc': report["options_delta1_exposure_calc"],
                 # .set_index('Greek Sensitivity'),
-                'greek_sensitivities_calc': greek_sensitivities_calc,
-                'options_premium_calc': options_premium_calc.set_index('Premium'),
+                'greek_sensitivities_calc': report["greek_sensitivities_calc"],
+                'options_premium_calc': report["options_premium_calc"].set_index('Premium'),
             },
             {
-                'stress_test_beta_price_vol_results_df': stress_test_beta_price_vol_results_df,
-                'stress_test_price_vol_results_df': stress_test_price_vol_results_df,
-                'stress_test_price_vol_exposure_results_df': stress_test_price_vol_exposure_results_df,
+                'stress_test_beta_price_vol_results_df': report["stress_test_beta_price_vol_results_df"],
+                'stress_test_price_vol_results_df': report["stress_test_price_vol_results_df"],
+                'stress_test_price_vol_exposure_results_df': report["stress_test_price_vol_exposure_results_df"],
             },
-            stress_test_price_vol_exposure_results_df,
+            report["stress_test_price_vol_exposure_results_df"],
         ]
     )
     drop_columns = ['Dollar Delta', 'Dollar Gamma 1%',
@@ -496,18 +521,25 @@ if __name__ == "__main__":
 
     rsh.generate_positions_summary_sheet(
         writer,
-        position_summary,  # type: ignore
+        report["position_summary"],  # type: ignore
     )
 
     rsh.generate_positions_breakdown_sheet(
         writer,
-        position_breakdown.fillna(0),  # type: ignore
+        report["position_breakdown"].fillna(0),  # type: ignore
     )
 
     rsh.generate_factor_correlations_sheet(
         writer,
-        matrix_correlation,
+        report["matrix_correlation"],
     )
 
-    writer.close()
+    with profile.stage("write_workbook") as record:
+        record.sizes["rows_written"] = sum(
+            (sheet.dim_rowmax or 0) + 1 for sheet in writer.worksheets())
+        writer.close()
     LOGGER.info("assess & interpret")
+    LOGGER.info(f"run profile\n{profile.summary_table()}")
+    profile.write(args.profile)
+    if args.golden_dir is not None:
+        write_tables(golden_tables, args.golden_dir)
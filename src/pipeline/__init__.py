@@ -0,0 +1,20 @@
+# pylint disable=F401
+from .cache import ResultCache, file_digest, files_digest, value_digest  # noqa: F401
+from .ingest import (  # noqa: F401
+    FACTORS_SCHEMA,
+    NAV_SCHEMA,
+    POSITIONS_SCHEMA,
+    ColumnarStore,
+    PriceMatrix,
+)
+from .golden import (  # noqa: F401
+    TableDiff,
+    capture_tables,
+    diff_report,
+    diff_tables,
+    read_tables,
+    write_tables,
+)
+from .graph import Stage, StageGraph  # noqa: F401
+from .profile import RunProfile, StageRecord  # noqa: F401
+from .report_stages import report_graph  # noqa: F401
@@ -0,0 +1,168 @@
+'''
+content-addressed on-disk cache for expensive pipeline stages.
+a stage result is stored under the hash of the stage name and of everything
+it was computed from (input file digests, parameters, risk code), so a
+changed input or parameter only recomputes the stages that read it
+'''
+import hashlib
+import json
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from glob import glob
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    '''sha256 of a file's bytes'''
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def files_digest(paths: Iterable[str]) -> str:
+    '''one digest over several files, e.g. the sources of a package'''
+    sha = hashlib.sha256()
+    for path in sorted(paths):
+        sha.update(path.encode())
+        sha.update(file_digest(path).encode())
+    return sha.hexdigest()
+
+
+def value_digest(value: Any) -> str:
+    '''sha256 of a stage input: frames, arrays or json-able parameters'''
+    sha = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        sha.update(repr(list(value.columns)).encode())
+        sha.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        sha.update(f"{value.dtype}{value.shape}".encode())
+        sha.update(np.ascontiguousarray(value).tobytes())
+    else:
+        sha.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return sha.hexdigest()
+
+
+def write_value(path: str, value: Any) -> str:
+    '''value stored at path + an extension chosen by type, returns the file'''
+    # arrays as .npy, frames as parquet where pyarrow can store them,
+    # anything else (tuples of frames, non-string labels) pickled
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        np.save(f"{path}.npy", value, allow_pickle=False)
+        return f"{path}.npy"
+    if (
+        HAS_PARQUET
+        and isinstance(value, pd.DataFrame)
+        and all(isinstance(col, str) for col in value.columns)
+    ):
+        try:
+            value.to_parquet(f"{path}.parquet")
+            return f"{path}.parquet"
+        except (ValueError, TypeError, ImportError):
+            if os.path.exists(f"{path}.parquet"):
+                os.remove(f"{path}.parquet")
+    with open(f"{path}.pkl", "wb") as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return f"{path}.pkl"
+
+
+def read_value(path: str) -> Any:
+    if path.endswith(".npy"):
+        return np.load(path, allow_pickle=False)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+@dataclass
+class ResultCache:
+    '''
+    stage results on disk under root, keyed by ResultCache.key, evicted least
+    recently used first once they take more than max_bytes. A disabled cache
+    (--no-cache) computes every stage and stores nothing
+    '''
+    root: str = "cache"
+    max_bytes: int = 2 << 30
+    enabled: bool = True
+    hits: Dict[str, int] = field(default_factory=dict)
+    misses: Dict[str, int] = field(default_factory=dict)
+
+    def key(self, stage: str, *inputs: Any) -> str:
+        sha = hashlib.sha256(f"{CACHE_VERSION}:{stage}".encode())
+        for value in inputs:
+            sha.update(value_digest(value).encode())
+        return f"{stage}-{sha.hexdigest()[:32]}"
+
+    def _entry(self, key: str) -> str:
+        matches = glob(os.path.join(self.root, f"{key}.*"))
+        return matches[0] if matches else None
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        '''(True, value) on a hit, (False, None) on a miss'''
+        if not self.enabled:
+            return False, None
+        path = self._entry(key)
+        if path is None:
+            return False, None
+        try:
+            value = read_value(path)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError) as err:
+            LOGGER.warning(f"dropping unreadable cache entry {path}: {err}")
+            os.remove(path)
+            return False, None
+        # mark as recently used
+        os.utime(path)
+        return True, value
+
+    def put(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_key = f".{key}.{os.getpid()}"
+        path = write_value(os.path.join(self.root, tmp_key), value)
+        os.replace(path, os.path.join(self.root, key + os.path.splitext(path)[1]))
+        self.evict()
+
+    def cached(self, stage: str, inputs: Iterable[Any], compute: Callable[[], Any]) -> Any:
+        '''the stored result of stage for inputs, computed and stored on a miss'''
+        key = self.key(stage, *inputs)
+        hit, value = self.get(key)
+        if hit:
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+            LOGGER.info(f"cache hit: {stage}")
+            return value
+        self.misses[stage] = self.misses.get(stage, 0) + 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def evict(self):
+        '''drop least recently used entries until the cache fits max_bytes'''
+        entries = [
+            (os.path.getmtime(path), os.path.getsize(path), path)
+            for path in glob(os.path.join(self.root, "*"))
+            if os.path.isfile(path) and not os.path.basename(path).startswith(".")
+        ]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            LOGGER.info(f"evicted cache entry {path}")
@@ -0,0 +1,214 @@
+'''
+golden output tables: every frame handed to the report sheet writers,
+captured in a canonical csv form (index reset, column levels joined, floats
+written round-trip) and diffed against a stored set with per-table
+tolerances, so a rewritten engine can be shown to leave the numbers in place
+'''
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from functools import wraps
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+GOLDEN_VERSION = 1
+MANIFEST = "manifest.json"
+# (rtol, atol) by table name pattern, first match wins
+DEFAULT_TOLERANCES = {"*": (1e-9, 1e-12)}
+
+
+def canonical_frame(value: Any) -> pd.DataFrame:
+    '''value as a flat frame: index levels as leading columns, string columns'''
+    frame = value.to_frame() if isinstance(value, pd.Series) else value.copy()
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame.columns = [" | ".join(map(str, col)) for col in frame.columns]
+    frame.columns = [str(col) for col in frame.columns]
+    index_names = [
+        str(name) if name is not None else f"index_{level}"
+        for level, name in enumerate(frame.index.names)
+    ]
+    frame.index = frame.index.set_names(index_names)
+
+    return frame.reset_index(allow_duplicates=True)
+
+
+def frame_tables(name: str, value: Any) -> Dict[str, pd.DataFrame]:
+    # the frames in a writer argument (frame, dict or list of them) by path
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return {name: canonical_frame(value)}
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        return {}
+    tables = {}
+    for key, item in items:
+        tables.update(frame_tables(f"{name}/{key}", item))
+
+    return tables
+
+
+def _capturing(func: Callable, sheet: str, tables: Dict[str, pd.DataFrame]) -> Callable:
+    @wraps(func)
+    def wrapper(writer, *args, **kwargs):
+        for index, value in enumerate(args):
+            tables.update(frame_tables(f"{sheet}/{index}", value))
+        for key, value in kwargs.items():
+            tables.update(frame_tables(f"{sheet}/{key}", value))
+        return func(writer, *args, **kwargs)
+
+    return wrapper
+
+
+def capture_tables(module: ModuleType, prefix: str = "generate_") -> Dict[str, pd.DataFrame]:
+    '''
+    wraps the sheet writers of module (functions taking the workbook first)
+    so every frame they are handed is added to the returned dict, named
+    sheet/argument/key
+    '''
+    tables: Dict[str, pd.DataFrame] = {}
+    for attr, func in list(vars(module).items()):
+        if attr.startswith(prefix) and callable(func):
+            sheet = attr[len(prefix):].replace("_sheet", "")
+            setattr(module, attr, _capturing(func, sheet, tables))
+
+    return tables
+
+
+def _file_name(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]+", "_", name) + ".csv"
+
+
+def write_tables(tables: Dict[str, pd.DataFrame], folder: str):
+    '''the tables as csv files and a manifest of their names and shapes'''
+    os.makedirs(folder, exist_ok=True)
+    manifest = {"version": GOLDEN_VERSION, "tables": {}}
+    for name, frame in tables.items():
+        file_name = _file_name(name)
+        frame.to_csv(os.path.join(folder, file_name), index=False, float_format="%.17g")
+        manifest["tables"][name] = {"file": file_name, "shape": list(frame.shape)}
+    with open(os.path.join(folder, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=1)
+    LOGGER.info(f"wrote {len(tables)} tables to {folder}")
+
+
+def read_tables(folder: str) -> Dict[str, pd.DataFrame]:
+    with open(os.path.join(folder, MANIFEST)) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != GOLDEN_VERSION:
+        raise ValueError(f"{folder} holds golden tables of version {manifest.get('version')}")
+
+    return {
+        name: pd.read_csv(os.path.join(folder, entry["file"]))
+        for name, entry in manifest["tables"].items()
+    }
+
+
+def tolerance(name: str, tolerances: Dict[str, Tuple[float, float]]) -> Tuple[float, float]:
+    '''(rtol, atol) of the first pattern matching name, the defaults last'''
+    for pattern_tolerances in [tolerances, DEFAULT_TOLERANCES]:
+        for pattern, rtol_atol in pattern_tolerances.items():
+            if fnmatch(name, pattern):
+                return tuple(rtol_atol)
+
+
+@dataclass
+class TableDiff:
+    '''outcome of one table: ok, or what differs'''
+    name: str
+    problems: List[str] = field(default_factory=list)
+    max_abs: float = 0.0
+    max_rel: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def diff_table(
+    name: str, golden: pd.DataFrame, new: pd.DataFrame, rtol: float, atol: float,
+    max_cells: int = 5,
+) -> TableDiff:
+    '''numeric columns within rtol / atol (NaN equal to NaN), others exactly'''
+    diff = TableDiff(name)
+    if list(golden.columns) != list(new.columns):
+        diff.problems.append(
+            f"columns {list(golden.columns)} became {list(new.columns)}")
+        return diff
+    if golden.shape != new.shape:
+        diff.problems.append(f"shape {golden.shape} became {new.shape}")
+        return diff
+    for col in golden.columns:
+        old_values, new_values = golden[col], new[col]
+        if pd.api.types.is_numeric_dtype(old_values) and pd.api.types.is_numeric_dtype(
+            new_values
+        ):
+            old_array = old_values.to_numpy(dtype=float)
+            new_array = new_values.to_numpy(dtype=float)
+            close = np.isclose(new_array, old_array, rtol=rtol, atol=atol, equal_nan=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                abs_diff = np.abs(new_array - old_array)
+                rel_diff = abs_diff / np.abs(old_array)
+            finite = np.isfinite(abs_diff)
+            if finite.any():
+                diff.max_abs = max(diff.max_abs, float(abs_diff[finite].max()))
+                finite_rel = np.isfinite(rel_diff)
+                if finite_rel.any():
+                    diff.max_rel = max(diff.max_rel, float(rel_diff[finite_rel].max()))
+        else:
+            close = (
+                old_values.fillna("").astype(str).values
+                == new_values.fillna("").astype(str).values
+            )
+        for row in np.flatnonzero(~close)[:max_cells]:
+            diff.problems.append(
+                f"row {row} {col}: {old_values.iloc[row]!r} -> {new_values.iloc[row]!r}")
+        if (~close).sum() > max_cells:
+            diff.problems.append(f"... {(~close).sum()} cells of {col} differ")
+
+    return diff
+
+
+def diff_tables(
+    golden: Dict[str, pd.DataFrame],
+    new: Dict[str, pd.DataFrame],
+    tolerances: Dict[str, Tuple[float, float]] = None,
+) -> List[TableDiff]:
+    '''every golden and new table, missing ones on either side reported'''
+    diffs = []
+    for name in list(golden) + [name for name in new if name not in golden]:
+        if name not in new:
+            diffs.append(TableDiff(name, ["missing from the new run"]))
+        elif name not in golden:
+            diffs.append(TableDiff(name, ["not in the golden set"]))
+        else:
+            diffs.append(
+                diff_table(
+                    name, golden[name], new[name], *tolerance(name, tolerances or {})))
+
+    return diffs
+
+
+def diff_report(diffs: List[TableDiff]) -> str:
+    '''one line per table, the differing cells of failed tables below it'''
+    width = max([len(diff.name) for diff in diffs] + [5])
+    lines = [f"{'table':<{width}}  status  max abs diff  max rel diff"]
+    for diff in diffs:
+        lines.append(
+            f"{diff.name:<{width}}  {'ok' if diff.ok else 'FAIL':<6}  "
+            f"{diff.max_abs:12.3g}  {diff.max_rel:12.3g}"
+        )
+        lines.extend(f"    {problem}" for problem in diff.problems)
+    failed = sum(not diff.ok for diff in diffs)
+    lines.append(f"{len(diffs) - failed} of {len(diffs)} tables match")
+
+    return "\n".join(lines)
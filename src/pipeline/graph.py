@@ -0,0 +1,205 @@
+'''
+declarative stage graph: each stage names the context keys it reads and the
+keys it writes, the graph runs them in a stable topological order. Stages of
+one generation (all inputs already computed) are independent and run
+concurrently on a forked process pool: workers inherit the context through
+fork instead of having their inputs pickled, only stage outputs are sent back
+'''
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import ResultCache
+from .profile import RunProfile
+
+LOGGER = logging.getLogger(__name__)
+
+# read by forked workers, set by StageGraph.run just before the pool starts
+_CONTEXT: Dict[str, Any] = {}
+_STAGES: List["Stage"] = []
+_PROFILE: Optional[RunProfile] = None
+# stage kwargs that change how a result is computed, never the result
+EXECUTION_KWARGS = ("workers",)
+
+
+@dataclass
+class Stage:
+    '''
+    func(*context[inputs], **context[kw_inputs], **kwargs), its result
+    unpacked into outputs. With cache_key the result is stored in the
+    ResultCache under the values of those context keys and kwargs (bar
+    EXECUTION_KWARGS)
+    '''
+    name: str
+    func: Callable
+    inputs: List[str]
+    outputs: List[str]
+    kw_inputs: Dict[str, str] = field(default_factory=dict)
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    cache_key: Optional[List[str]] = None
+
+    @property
+    def reads(self) -> List[str]:
+        return self.inputs + list(self.kw_inputs.values()) + (self.cache_key or [])
+
+    def run(self, context: Dict[str, Any], cache: ResultCache = None) -> Any:
+        def compute():
+            return self.func(
+                *[context[key] for key in self.inputs],
+                **{arg: context[key] for arg, key in self.kw_inputs.items()},
+                **self.kwargs,
+            )
+
+        if cache is None or self.cache_key is None:
+            return compute()
+        # the stage's own parameters change its result as much as its inputs;
+        # how it is executed does not
+        parameters = {
+            arg: value for arg, value in self.kwargs.items()
+            if arg not in EXECUTION_KWARGS
+        }
+        return cache.cached(
+            self.name, [context[key] for key in self.cache_key] + [parameters], compute)
+
+    def unpack(self, result: Any) -> Dict[str, Any]:
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        if len(result) != len(self.outputs):
+            raise ValueError(
+                f"stage {self.name} returned {len(result)} values for "
+                f"outputs {self.outputs}"
+            )
+        return dict(zip(self.outputs, result))
+
+
+def _profiled(profile: Optional[RunProfile], name: str):
+    return nullcontext() if profile is None else profile.stage(name)
+
+
+def _run_stage(index: int, cache: ResultCache) -> Tuple[Any, float, List]:
+    # worker side: the stage and its inputs come from the forked parent; the
+    # profile records made here are sent back with the result
+    start = time.perf_counter()
+    if _PROFILE is not None:
+        _PROFILE.records.clear()
+    with _profiled(_PROFILE, _STAGES[index].name):
+        result = _STAGES[index].run(_CONTEXT, cache)
+    records = [] if _PROFILE is None else list(_PROFILE.records.values())
+    return result, time.perf_counter() - start, records
+
+
+@dataclass
+class StageGraph:
+    stages: List[Stage] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def add(
+        self,
+        name: str,
+        func: Callable,
+        inputs: List[str],
+        outputs: List[str],
+        kw_inputs: Dict[str, str] = None,
+        cache_key: List[str] = None,
+        **kwargs,
+    ) -> "StageGraph":
+        if any(stage.name == name for stage in self.stages):
+            raise ValueError(f"duplicate stage {name}")
+        self.stages.append(
+            Stage(name, func, inputs, outputs, kw_inputs or {}, kwargs, cache_key))
+        return self
+
+    def generations(self, available: List[str]) -> List[List[Stage]]:
+        '''
+        stages grouped by the first generation whose inputs are all known,
+        in declaration order within a generation. Raises ValueError on an
+        output written twice, an input nothing provides or a cycle
+        '''
+        producer = {}
+        for stage in self.stages:
+            for key in stage.outputs:
+                if key in producer or key in available:
+                    raise ValueError(f"{key} written by more than one stage")
+                producer[key] = stage.name
+        known = set(available)
+        pending = list(self.stages)
+        generations = []
+        while pending:
+            ready = [
+                stage for stage in pending
+                if all(key in known for key in stage.reads)
+            ]
+            if not ready:
+                missing = {
+                    stage.name: [key for key in stage.reads if key not in known]
+                    for stage in pending
+                }
+                raise ValueError(f"unresolved stage inputs: {missing}")
+            generations.append(ready)
+            for stage in ready:
+                known.update(stage.outputs)
+            pending = [stage for stage in pending if stage not in ready]
+
+        return generations
+
+    def run(
+        self,
+        context: Dict[str, Any],
+        workers: int = 1,
+        cache: ResultCache = None,
+        profile: RunProfile = None,
+    ) -> Dict[str, Any]:
+        '''
+        context updated with every stage output. Results do not depend on
+        workers: each generation's outputs are merged in declaration order.
+        With a profile every stage is recorded, in workers too
+        '''
+        global _CONTEXT, _STAGES, _PROFILE
+        parallel = workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+        for generation in self.generations(list(context)):
+            start = time.perf_counter()
+            if parallel and len(generation) > 1:
+                _CONTEXT, _STAGES, _PROFILE = context, generation, profile
+                try:
+                    with ProcessPoolExecutor(
+                        max_workers=min(workers, len(generation)),
+                        mp_context=multiprocessing.get_context("fork"),
+                    ) as pool:
+                        futures = [
+                            pool.submit(_run_stage, index, cache)
+                            for index in range(len(generation))
+                        ]
+                        results = [future.result() for future in futures]
+                finally:
+                    _CONTEXT, _STAGES, _PROFILE = {}, [], None
+            else:
+                results = []
+                for stage in generation:
+                    stage_start = time.perf_counter()
+                    with _profiled(profile, stage.name):
+                        result = stage.run(context, cache)
+                    results.append((result, time.perf_counter() - stage_start, []))
+            for stage, (result, elapsed, records) in zip(generation, results):
+                context.update(stage.unpack(result))
+                self.timings[stage.name] = elapsed
+                if profile is not None:
+                    profile.merge(records)
+            LOGGER.info(
+                f"stages {[stage.name for stage in generation]} done in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+
+        return context
+
+    def timing_table(self) -> str:
+        '''stage timings, slowest first'''
+        width = max([len(name) for name in self.timings] + [5])
+        lines = [f"{'stage':<{width}}  seconds"]
+        for name, elapsed in sorted(self.timings.items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<{width}}  {elapsed:7.3f}")
+
+        return "\n".join(lines)
@@ -0,0 +1,211 @@
+'''
+typed columnar copies of the csv inputs. Each csv is parsed once with an
+explicit schema and stored next to a manifest of its source (size, mtime,
+sha256); later runs load the stored copy while the source is unchanged. The
+wide price matrix is stored column-major as .npy and memory-mapped, so a run
+only reads the histories of the tickers it selects
+'''
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from legacy.position_book import NUMERIC_COLUMNS
+
+from .cache import file_digest, read_value, write_value
+
+LOGGER = logging.getLogger(__name__)
+
+INGEST_VERSION = 1
+TEXT = "str"
+FLOAT = "float64"
+
+POSITIONS_SCHEMA = {
+    **{col: FLOAT for col in NUMERIC_COLUMNS},
+    **{
+        col: TEXT
+        for col in [
+            "VaRTicker", "FundName", "UnderlierName", "TradeDate", "Sector",
+            "Industry", "Country", "MarketCap.1", "Description", "SECURITY_TYP",
+            "PutCall", "Expiry",
+        ]
+    },
+}
+FACTORS_SCHEMA = {"FactorID": TEXT, "Factor Names": TEXT, "factor_group": TEXT}
+NAV_SCHEMA = {
+    "PeriodEndDate": TEXT,
+    "Fund": TEXT,
+    "DailyBookPL": FLOAT,
+    "EndBookNAV": FLOAT,
+}
+PRICE_DATE_COLUMN = "date"
+
+
+@dataclass
+class PriceMatrix:
+    '''
+    dates x tickers prices; values may be a read-only memory map of the
+    ingested file, dates are "%Y-%m-%d" strings
+    '''
+    values: np.ndarray
+    dates: pd.Index
+    tickers: pd.Index
+
+    def frame(self, tickers: List[str]) -> pd.DataFrame:
+        '''the price columns of tickers as a date indexed frame'''
+        cols = self.tickers.get_indexer(tickers)
+        if (cols < 0).any():
+            raise KeyError(f"no prices for {list(np.asarray(tickers)[cols < 0])}")
+
+        return pd.DataFrame(
+            np.asarray(self.values[:, cols]), index=self.dates, columns=list(tickers)
+        )
+
+
+def _schema_dtypes(path: str, schema: Dict[str, str]) -> Dict[str, str]:
+    # the schema entries of the columns the file actually has
+    header = pd.read_csv(path, nrows=0).columns
+    return {col: dtype for col, dtype in schema.items() if col in header}
+
+
+def parse_csv(path: str, schema: Dict[str, str]) -> pd.DataFrame:
+    '''csv read with the schema dtypes, other columns inferred'''
+    return pd.read_csv(path, dtype=_schema_dtypes(path, schema))
+
+
+def parse_prices(path: str) -> PriceMatrix:
+    '''prices csv with its dates parsed once into "%Y-%m-%d" strings'''
+    price = pd.read_csv(path, index_col=PRICE_DATE_COLUMN)
+    dates = pd.Index(
+        pd.to_datetime(price.index).strftime("%Y-%m-%d"), name=PRICE_DATE_COLUMN)
+
+    return PriceMatrix(
+        np.asfortranarray(price.values.astype(np.float64)), dates, price.columns
+    )
+
+
+@dataclass
+class ColumnarStore:
+    '''
+    ingested inputs under root, one manifest per source. A disabled store
+    (--no-cache) parses every csv on each run and writes nothing
+    '''
+    root: str = os.path.join("cache", "ingest")
+    enabled: bool = True
+
+    def _stem(self, path: str) -> str:
+        # sources of the same name in different folders get their own files
+        name = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+        source = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:12]
+        return os.path.join(self.root, f"{name}-{source}")
+
+    def _manifest(self, path: str) -> Dict:
+        try:
+            with open(f"{self._stem(path)}.json") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return manifest if manifest.get("source") == os.path.abspath(path) else {}
+
+    def source_digest(self, path: str) -> str:
+        '''sha256 of a source, from its manifest while size and mtime match'''
+        manifest = self._manifest(path) if self.enabled else {}
+        stat = os.stat(path)
+        if (
+            manifest.get("size") == stat.st_size
+            and manifest.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return manifest["sha256"]
+        return file_digest(path)
+
+    def _fresh(self, path: str, schema_id: str) -> Dict:
+        # manifest of an ingested copy of path that is still valid, or {}
+        manifest = self._manifest(path)
+        if (
+            manifest.get("version") != INGEST_VERSION
+            or manifest.get("schema") != schema_id
+        ):
+            return {}
+        if not all(os.path.exists(file) for file in manifest["files"].values()):
+            return {}
+        stat = os.stat(path)
+        if (
+            manifest["size"] == stat.st_size
+            and manifest["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return manifest
+        # touched but maybe unchanged (copied, checked out again)
+        if manifest["sha256"] != file_digest(path):
+            return {}
+        manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        self._write_manifest(path, manifest)
+        return manifest
+
+    def _write_manifest(self, path: str, manifest: Dict):
+        tmp_path = f"{self._stem(path)}.json.{os.getpid()}"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp_path, f"{self._stem(path)}.json")
+
+    def _store(self, path: str, schema_id: str, values: Dict[str, object]) -> Dict:
+        os.makedirs(self.root, exist_ok=True)
+        stat = os.stat(path)
+        files = {
+            name: write_value(f"{self._stem(path)}.{name}", value)
+            for name, value in values.items()
+        }
+        manifest = {
+            "version": INGEST_VERSION,
+            "source": os.path.abspath(path),
+            "schema": schema_id,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(path),
+            "files": files,
+        }
+        self._write_manifest(path, manifest)
+        LOGGER.info(f"ingested {path} into {self.root}")
+        return manifest
+
+    def read_csv(self, path: str, schema: Dict[str, str]) -> pd.DataFrame:
+        '''the typed frame of a csv, parsed only when the source changed'''
+        if not self.enabled:
+            return parse_csv(path, schema)
+        schema_id = hashlib.sha256(
+            json.dumps(schema, sort_keys=True).encode()).hexdigest()
+        manifest = self._fresh(path, schema_id)
+        if manifest:
+            return read_value(manifest["files"]["frame"])
+        frame = parse_csv(path, schema)
+        self._store(path, schema_id, {"frame": frame})
+
+        return frame
+
+    def read_prices(self, path: str) -> PriceMatrix:
+        '''the price matrix of a csv, memory-mapped from the ingested copy'''
+        if not self.enabled:
+            return parse_prices(path)
+        manifest = self._fresh(path, PRICE_DATE_COLUMN)
+        if not manifest:
+            prices = parse_prices(path)
+            manifest = self._store(
+                path,
+                PRICE_DATE_COLUMN,
+                {
+                    "values": prices.values,
+                    "dates": np.asarray(prices.dates, dtype=str),
+                    "tickers": np.asarray(prices.tickers, dtype=str),
+                },
+            )
+        files = manifest["files"]
+
+        return PriceMatrix(
+            np.load(files["values"], mmap_mode="r"),
+            pd.Index(np.load(files["dates"]).astype(object), name=PRICE_DATE_COLUMN),
+            pd.Index(np.load(files["tickers"]).astype(object)),
+        )
@@ -0,0 +1,230 @@
+'''
+run profile: wall time, cpu time, memory and input sizes of the pipeline
+stages and of the legacy risk / report sheet functions they call. Records
+are aggregated by name over calls; nested records overlap (a stage includes
+the functions it calls). The profile is written as json at the end of a run
+so runs can be compared night over night
+'''
+import inspect
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import wraps
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+MB = 1 << 20
+
+
+def peak_rss_mb() -> float:
+    '''high-water resident set size of this process'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def value_size(value: Any) -> Optional[Any]:
+    '''
+    shape of an array-like input, of the frame of a PositionBook or the
+    matrix of a BetaIndex; item and row counts of containers; None otherwise
+    '''
+    for attr in [None, "position", "values"]:
+        item = value if attr is None else getattr(value, attr, None)
+        shape = getattr(item, "shape", None)
+        if isinstance(shape, tuple):
+            return list(shape)
+    if isinstance(value, (dict, list, tuple)):
+        items = value.values() if isinstance(value, dict) else value
+        sizes = [value_size(item) for item in items]
+        rows = sum(size[0] for size in sizes if isinstance(size, list) and size)
+        return {"items": len(sizes), "rows": rows}
+    return None
+
+
+def call_sizes(func: Callable, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    # sizes of the sized arguments of one call, by parameter name
+    try:
+        bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    except (TypeError, ValueError):
+        return {}
+    sizes = {name: value_size(value) for name, value in bound.arguments.items()}
+    return {name: size for name, size in sizes.items() if size is not None}
+
+
+@dataclass
+class StageRecord:
+    '''totals over the calls of one stage or function'''
+    name: str
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_rss_mb: float = 0.0
+    rss_growth_mb: float = 0.0
+    traced_peak_mb: Optional[float] = None
+    sizes: Dict[str, Any] = field(default_factory=dict)
+
+    def merge(self, other: "StageRecord"):
+        self.calls += other.calls
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.peak_rss_mb = max(self.peak_rss_mb, other.peak_rss_mb)
+        self.rss_growth_mb = max(self.rss_growth_mb, other.rss_growth_mb)
+        if other.traced_peak_mb is not None:
+            self.traced_peak_mb = max(self.traced_peak_mb or 0.0, other.traced_peak_mb)
+        self.sizes = self.sizes or other.sizes
+
+
+@dataclass
+class _OpenStage:
+    record: StageRecord
+    traced_start: int = 0
+    traced_peak: int = 0
+
+
+@dataclass
+class RunProfile:
+    '''
+    stage / function records of one run. With trace_memory the python heap
+    is traced (tracemalloc) for the peak allocation of every stage, which
+    slows the run down; the process high-water RSS is always recorded
+    '''
+    trace_memory: bool = False
+    records: Dict[str, StageRecord] = field(default_factory=dict)
+    started: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+    _open: List[_OpenStage] = field(default_factory=list, repr=False)
+
+    def __post_init__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _fold_traced_peak(self):
+        # the traced peak since the last fold counts towards every open stage;
+        # resetting it lets nested stages measure their own peak
+        if not tracemalloc.is_tracing():
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self._open:
+            frame.traced_peak = max(frame.traced_peak, peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name: str, **sizes: Any):
+        '''
+        records the enclosed block under name; sizes (positions, groups,
+        rows written, ...) may also be added to the yielded record
+        '''
+        self._fold_traced_peak()
+        record = StageRecord(name, calls=1, sizes=dict(sizes))
+        frame = _OpenStage(record)
+        if tracemalloc.is_tracing():
+            frame.traced_start, frame.traced_peak = tracemalloc.get_traced_memory()
+        rss_start = peak_rss_mb()
+        self._open.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.process_time() - cpu_start
+            self._fold_traced_peak()
+            self._open.pop()
+            record.peak_rss_mb = peak_rss_mb()
+            record.rss_growth_mb = record.peak_rss_mb - rss_start
+            if tracemalloc.is_tracing():
+                record.traced_peak_mb = (frame.traced_peak - frame.traced_start) / MB
+            self.add(record)
+
+    def add(self, record: StageRecord):
+        if record.name in self.records:
+            self.records[record.name].merge(record)
+        else:
+            self.records[record.name] = record
+
+    def merge(self, records: List[StageRecord]):
+        '''records of stages run in another (forked) process'''
+        for record in records:
+            self.add(record)
+
+    def profiled(self, name: str) -> Callable:
+        '''decorator recording every call of a function, with its input sizes'''
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                sizes = {} if name in self.records else call_sizes(func, args, kwargs)
+                with self.stage(name, **sizes):
+                    return func(*args, **kwargs)
+
+            wrapper.__profiled__ = True
+            return wrapper
+
+        return decorator
+
+    def instrument(self, module: ModuleType) -> List[str]:
+        '''
+        replaces the public functions of module (and those it re-exports from
+        its submodules) with profiled wrappers. Callers that look functions
+        up on the module are recorded, names imported before stay unwrapped
+        '''
+        wrapped = []
+        for attr, func in list(vars(module).items()):
+            if (
+                attr.startswith("_")
+                or not inspect.isfunction(func)
+                or getattr(func, "__profiled__", False)
+                or not func.__module__.startswith(module.__name__)
+            ):
+                continue
+            setattr(module, attr, self.profiled(f"{module.__name__}.{attr}")(func))
+            wrapped.append(attr)
+
+        return wrapped
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PROFILE_VERSION,
+            "started": self.started,
+            "argv": sys.argv,
+            "wall": time.perf_counter() - self._start,
+            "peak_rss_mb": peak_rss_mb(),
+            "trace_memory": self.trace_memory,
+            "stages": [asdict(record) for record in self.records.values()],
+        }
+
+    def write(self, path: str):
+        '''the profile as json'''
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=1, default=str)
+        LOGGER.info(f"run profile written to {path}")
+
+    def summary_table(self, limit: int = 30) -> str:
+        '''the slowest records by wall time'''
+        records = sorted(self.records.values(), key=lambda record: -record.wall)
+        width = max([len(record.name) for record in records[:limit]] + [5])
+        lines = [
+            f"{'stage':<{width}}  calls     wall      cpu  rss MB  rss +MB  traced MB"
+        ]
+        for record in records[:limit]:
+            traced = (
+                "" if record.traced_peak_mb is None else f"{record.traced_peak_mb:9.1f}"
+            )
+            lines.append(
+                f"{record.name:<{width}}  {record.calls:5d}  {record.wall:7.3f}  "
+                f"{record.cpu:7.3f}  {record.peak_rss_mb:6.0f}  "
+                f"{record.rss_growth_mb:7.1f}  {traced}"
+            )
+
+        return "\n".join(lines)
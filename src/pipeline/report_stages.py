@@ -0,0 +1,266 @@
+'''
+the risk report computations as a stage graph. Every stage reads the shared
+inputs main.py prepares (positions, betas, covariance, NAV, ...) or the
+outputs of earlier stages; none of them modifies its inputs, so stages of a
+generation can run in any order or concurrently
+'''
+import pandas as pd
+
+import legacy.Exposures as Exposures
+import legacy.pnl_stats as pnl_stats
+import legacy.return_engine as return_engine
+import legacy.VaR as VaR
+
+from .graph import StageGraph
+
+CONFIDENCE_LEVELS = [0.95, 0.99]
+# factor price series every fund is compared against
+FUND_BENCHMARKS = ["SPX Index"]
+
+
+def VaR_structured(VaR_filtered, position_book):
+    return VaR.VaR_structuring(
+        VaR.filter_VaR_list(VaR_filtered, "Iso", 0.95),
+        VaR.filter_VaR_list(VaR_filtered, "Iso", 0.99),
+        VaR.filter_VaR_list(VaR_filtered, "Inc", 0.95),
+        VaR.filter_VaR_list(VaR_filtered, "Inc", 0.99),
+        VaR.filter_VaR_list(VaR_filtered, "Comp", 0.95),
+        VaR.filter_VaR_list(VaR_filtered, "Comp", 0.99),
+        position_book,
+    )
+
+
+def stress_structured(
+    stress_test_beta_price_vol_calc,
+    stress_test_price_vol_calc,
+    stress_test_price_vol_exposure_calc,
+    position_book,
+    price_vol_shock_range,
+):
+    return tuple(
+        VaR.stress_test_structuring(calc, position_book, price_vol_shock_range)
+        for calc in [
+            stress_test_beta_price_vol_calc,
+            stress_test_price_vol_calc,
+            stress_test_price_vol_exposure_calc,
+        ]
+    )
+
+
+def pnl_analysis(AUM_clean, factor_prices):
+    # AUM_clean with the SPX returns it is compared against; return_analysis
+    # adds month/year columns to it, which the PnlData sheet shows
+    factor_rets = pd.DataFrame(
+        factor_prices["SPX Index"] / factor_prices["SPX Index"].shift(1) - 1,
+        columns=["SPX Index"],
+        index=factor_prices.index,
+    )
+    AUM_clean = pd.merge(
+        AUM_clean, factor_rets["SPX Index"], left_index=True, right_index=True
+    )
+    return_analysis_stats = pnl_stats.return_analysis(AUM_clean)
+    comparative_analysis_stats = pnl_stats.comparative_statistics(AUM_clean)
+
+    return AUM_clean, return_analysis_stats, comparative_analysis_stats
+
+
+def fund_pnl_analysis(AUM, factor_prices, benchmarks=FUND_BENCHMARKS):
+    # return and comparative statistics of every fund of the NAV file, the
+    # benchmark returns taken on the fund dates
+    returns = return_engine.fund_returns(AUM)
+    benchmark_returns = return_engine.benchmark_returns(
+        factor_prices, benchmarks).reindex(returns.index)
+
+    return (
+        return_engine.return_statistics(returns),
+        return_engine.comparative_statistics(returns, benchmark_returns),
+    )
+
+
+def report_graph(workers: int = 1) -> StageGraph:
+    '''
+    stages in the order the report was computed serially; VaR and the stress
+    tests shard their group reductions over workers processes
+    '''
+    graph = StageGraph()
+    # Excel equivalent ["FactorCorrels"]
+    graph.add(
+        "matrix_correlation",
+        VaR.matrix_correlation,
+        ["factor_returns", "factor"],
+        ["matrix_correlation"],
+    )
+    # 1.b. VaR
+    graph.add(
+        "VaR",
+        VaR.filter_VaR,
+        [
+            "filters_dict", "factor_prices", "position_book", "factor_betas",
+            "VaR_cov", "firm_NAV",
+        ],
+        ["VaR_filtered"],
+        kw_inputs={"beta_index": "beta_index"},
+        cache_key=["model_inputs", "cov_decay", "holdings_date"],
+        confidence_levels=CONFIDENCE_LEVELS,
+        workers=workers,
+    )
+    graph.add(
+        "VaR_top_bottom",
+        VaR.VaR_top_bottom,
+        ["VaR_filtered", "position_book"],
+        ["VaR_Top10", "VaR_Bottom10"],
+        confidence_levels=CONFIDENCE_LEVELS,
+    )
+    # Excel equivalent ["VaRReport; "Strat VaR", "Sector VaR", "Industry VaR",
+    # "Country VaR", "Market Cap VaR" tbls]
+    graph.add(
+        "VaR_structuring",
+        VaR_structured,
+        ["VaR_filtered", "position_book"],
+        [
+            "VaR_structured_position_top10",
+            "VaR_structured_position_bottom10",
+            "VaR_structured_strat",
+            "VaR_structured_sector",
+            "VaR_structured_industry",
+            "VaR_structured_country",
+            "VaR_structured_mcap",
+        ],
+    )
+    # 1.c. stress tests, Excel equivalent ["Options&Stress; "Beta & Volatility
+    # Stress Test P&L tbl", "Price & Volatility Stress Test P&L tbl", "Price &
+    # Volatility Stress Test Net Exposure tbl"]
+    graph.add(
+        "stress_test_beta_price_vol",
+        VaR.filter_stress_test_beta_price_vol,
+        [
+            "filters_dict", "factor_prices", "position_book", "factor_betas",
+            "price_vol_shock_range",
+        ],
+        ["stress_test_beta_price_vol_calc"],
+        kw_inputs={"beta_index": "beta_index"},
+        cache_key=["model_inputs", "price_vol_shock_range"],
+        workers=workers,
+    )
+    graph.add(
+        "stress_test_price_vol",
+        VaR.filter_stress_test_price_vol,
+        ["filters_dict", "factor_prices", "position_book", "price_vol_shock_range"],
+        ["stress_test_price_vol_calc", "stress_test_price_vol_exposure_calc"],
+        cache_key=["input_digests", "code_digest", "price_vol_shock_range"],
+        workers=workers,
+    )
+    graph.add(
+        "stress_test_structuring",
+        stress_structured,
+        [
+            "stress_test_beta_price_vol_calc",
+            "stress_test_price_vol_calc",
+            "stress_test_price_vol_exposure_calc",
+            "position_book",
+            "price_vol_shock_range",
+        ],
+        [
+            "stress_test_beta_price_vol_results_df",
+            "stress_test_price_vol_results_df",
+            "stress_test_price_vol_exposure_results_df",
+        ],
+    )
+    # 1.d. exposures, Excel equivalent ["ExpReport"]
+    graph.add(
+        "exposure",
+        Exposures.filter_exposure_calc,
+        ["filters_dict", "position_book", "firm_NAV"],
+        [
+            "strat_exposure_df",
+            "sector_exposure_df",
+            "industry_exposure_df",
+            "country_exposure_df",
+            "mktcap_exposure_df",
+        ],
+    )
+    graph.add(
+        "beta_adj_exposure",
+        Exposures.filter_beta_adj_exposure_calc,
+        ["filters_dict", "position_book", "factor_betas", "firm_NAV"],
+        [
+            "strat_beta_adj_exposure_df",
+            "sector_beta_adj_exposure_df",
+            "industry_beta_adj_exposure_df",
+            "country_beta_adj_exposure_df",
+            "mktcap_beta_adj_exposure_df",
+        ],
+        kw_inputs={"beta_index": "beta_index"},
+    )
+    # Excel equivalent ["Options&Stress"; "Option Exposure", "Option Notional",
+    # "Premium", "Greek Sensitivity" tbls]
+    graph.add(
+        "options_analytics",
+        Exposures.options_analytics,
+        ["position_book"],
+        [
+            "options_delta_adj_exposure_calc",
+            "options_delta1_exposure_calc",
+            "options_premium_calc",
+            "greek_sensitivities_calc",
+        ],
+    )
+    # Excel equivalent ["FactorExposures"; "Macro Factor Sensitivity" tbl &
+    # "Sector Sensitivities" tbl, "Top10" & "Bottom10" tbls by Factor Exposure
+    # by Position], ["FactorHeatMap"]
+    graph.add(
+        "factor_decomp",
+        Exposures.factor_decomp_filtered,
+        [
+            "position_book", "factor_betas", "factor_prices", "factor",
+            "matrix_cov", "firm_NAV",
+        ],
+        ["macro_factor_decomp_df", "sector_factor_decomp_df"],
+        kw_inputs={"beta_index": "beta_index"},
+    )
+    graph.add(
+        "factor_exposure_matrix",
+        Exposures.factor_exposure_matrix,
+        ["position_book", "factor_betas", "factor", "firm_NAV"],
+        ["factor_exposure_matrix"],
+    )
+    graph.add(
+        "factor_decomp_by_factor_position",
+        Exposures.factor_decomp_by_factor_position,
+        ["position_book", "factor_betas", "factor", "firm_NAV"],
+        ["risk_factor_exposure_top_N_list", "risk_factor_exposure_bottom_N_list"],
+        kw_inputs={"exposure_matrix": "factor_exposure_matrix"},
+    )
+    graph.add(
+        "factor_heat_map",
+        Exposures.factor_heat_map,
+        ["position_book", "factor_betas", "factor", "firm_NAV"],
+        ["factor_heat_map"],
+        kw_inputs={"exposure_matrix": "factor_exposure_matrix"},
+    )
+    # Excel equivalents ["PositionsBreakdown"]; ["PositionsSummary"]
+    graph.add(
+        "position_breakdown",
+        Exposures.stress_test_beta_price_vol_exposure_by_position,
+        [
+            "position_book", "factor_betas", "matrix_cov", "position_returns",
+            "factor", "firm_NAV",
+        ],
+        ["position_breakdown", "position_summary"],
+    )
+    # 1.e. pnl estimation, Excel equivalents ["PNLReport"]
+    graph.add(
+        "pnl_analysis",
+        pnl_analysis,
+        ["AUM_clean", "factor_prices"],
+        ["pnl_data", "return_analysis_stats", "comparative_analysis_stats"],
+    )
+    # Excel equivalent ["FundPNLReport"]
+    graph.add(
+        "fund_pnl_analysis",
+        fund_pnl_analysis,
+        ["AUM", "factor_prices"],
+        ["fund_return_analysis_stats", "fund_comparative_analysis_stats"],
+    )
+
+    return graph
@@ -4,6 +4,7 @@ from .exposure_report_sheet import generate_exp_report_sheet  # noqa: F401
 from .factor_correlations_sheet import generate_factor_correlations_sheet  # noqa: F401
 from .factor_exposures import generate_factor_exposures_sheet  # noqa: F401
 from .factor_heatmap import generate_factor_heatmap_sheet  # noqa: F401
+from .fund_pnlreport_sheet import generate_fund_pnlreport_sheet  # noqa: F401
 from .options_stress_sheet import generate_options_stress_sheet  # noqa: F401
 from .pnldata_sheet import generate_pnldata_sheet  # noqa: F401
 from .pnlreport_sheet import generate_pnlreport_sheet  # noqa: F401
@@ -0,0 +1,45 @@
+'''creates per fund pnl report sheet'''
+from typing import Dict
+
+import pandas as pd
+
+import src.excel_utils.excel_utils as eu
+from src.excel_utils.header import insert_header
+from src.excel_utils.set_up_workbook import set_up_workbook
+from src.excel_utils.sheet_format import format_dashboard_worksheet
+from src.layouts.layouts import DashboardLayout
+
+from ..report_items.report_table import ReportTable
+from ..report_items.snap_operations import SnapType
+
+FUND_PNLREPORT_SHEET_NAME = 'FundPNLReport'
+
+
+def generate_fund_pnlreport_sheet(
+    writer,
+    data_dict: Dict[str, pd.DataFrame]
+) -> None:
+    '''generates the return and comparative statistics of every fund'''
+
+    layout = DashboardLayout()
+    styles, worksheet = set_up_workbook(writer, sheet_name=FUND_PNLREPORT_SHEET_NAME)
+    insert_header(worksheet, styles, layout)
+
+    fund_return_analysis_stats = ReportTable(
+        data=data_dict.get('fund_return_analysis_stats'),  # type: ignore
+        values_format=styles.get('percentage'),
+        table_name='fund_return_analysis_stats',
+        initial_position=(1, 4),
+    )
+    eu.insert_table(worksheet, fund_return_analysis_stats)
+
+    fund_comparative_analysis_stats = ReportTable(
+        data=data_dict.get('fund_comparative_analysis_stats'),  # type: ignore
+        values_format=styles.get('percentage'),
+        table_name='fund_comparative_analysis_stats',
+        snap_element=fund_return_analysis_stats,
+        snap_mode=SnapType.DOWN,
+        margin=2,
+    )
+    eu.insert_table(worksheet, fund_comparative_analysis_stats)
+    format_dashboard_worksheet(worksheet, layout)